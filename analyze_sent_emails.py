@@ -1,9 +1,8 @@
-import sqlite3
-import re
-from collections import Counter
-from textblob import TextBlob
 import os
 from dotenv import load_dotenv
+from database import ensure_schema, parse_address
+from storage import get_connection
+from style_profile import StyleAggregate, email_style_stats, update_style_profile
 load_dotenv()
 
 DB_NAME = "emails.db"
@@ -13,67 +12,49 @@ if not YOUR_EMAIL:
     raise ValueError("❌ USER_EMAIL is not set in .env file")
 def fetch_sent_emails(limit=40):
     """Fetches last 40 emails sent by the user."""
-    conn = sqlite3.connect(DB_NAME)
+    ensure_schema(DB_NAME)
+    conn = get_connection(DB_NAME)
     cursor = conn.cursor()
 
+    # Index seek on (sender_address, sent_at); sent_at is the parsed Date header
     cursor.execute("""
     SELECT body FROM emails 
-    WHERE sender LIKE ? AND label NOT IN ('Trash', 'Spam') 
-    ORDER BY timestamp DESC 
+    WHERE sender_address = ? AND label NOT IN ('Trash', 'Spam') 
+    ORDER BY sent_at DESC 
     LIMIT ?
-""", (f"%{YOUR_EMAIL}%", limit))
+""", (parse_address(YOUR_EMAIL), limit))
 
     emails = [row[0] for row in cursor.fetchall()]
-    conn.close()
     
     return emails if emails else []
 
+def print_style_profile(profile):
+    """Prints a profile returned by analyze_writing_style() or style_profile."""
+    print("\n✅ Writing Style Analysis (Sent Emails Only):")
+    print(f"- **Tone:** {profile['tone']}")
+    print(f"- **Average Sentence Length:** {profile['avg_sentence_length']:.1f} words")
+    print(f"- **Common Phrases:** {profile['common_phrases']}")
+    print(f"- **Uses Emojis/Special Formatting?** {'Yes' if profile['uses_emojis'] else 'No'}")
+    print(f"- **Uses Bullet Points?** {'Yes' if profile['uses_bullets'] else 'No'}")
+
 def analyze_writing_style(emails):
     """Analyzes tone, sentence structure, common phrases, and formatting."""
-    all_text = " ".join(emails)
-
-    # 1️⃣ Determine Tone (Sentiment Analysis)
-    sentiment = TextBlob(all_text).sentiment.polarity
-    if sentiment > 0.3:
-        tone = "Positive & Friendly"
-    elif sentiment < -0.3:
-        tone = "Serious & Formal"
-    else:
-        tone = "Neutral & Professional"
-
-    # 2️⃣ Sentence Structure (Average Sentence Length)
-    sentences = re.split(r'[.!?]', all_text)
-    avg_sentence_length = sum(len(s.split()) for s in sentences) / len(sentences) if sentences else 0
-
-    # 3️⃣ Common Phrases (Most Frequent 3-Word Phrases)
-    words = re.findall(r'\b\w+\b', all_text.lower())
-    phrases = [" ".join(words[i:i+3]) for i in range(len(words) - 2)]
-    common_phrases = Counter(phrases).most_common(5)
-
-    # 4️⃣ Formatting & Special Characters
-    has_emojis = bool(re.search(r'[^\w\s,]', all_text))  # Detect special characters like emojis
-    has_bullets = "•" in all_text or "-" in all_text
-
-    # Print Analysis
-    print("\n✅ Writing Style Analysis (Sent Emails Only):")
-    print(f"- **Tone:** {tone}")
-    print(f"- **Average Sentence Length:** {avg_sentence_length:.1f} words")
-    print(f"- **Common Phrases:** {[p[0] for p in common_phrases]}")
-    print(f"- **Uses Emojis/Special Formatting?** {'Yes' if has_emojis else 'No'}")
-    print(f"- **Uses Bullet Points?** {'Yes' if has_bullets else 'No'}")
+    # One email at a time, with a bounded trigram sketch: memory doesn't grow with the corpus
+    aggregate = StyleAggregate()
+    for body in emails:
+        if body:
+            aggregate.add(*email_style_stats(body))
 
-    return {
-        "tone": tone,
-        "avg_sentence_length": avg_sentence_length,
-        "common_phrases": [p[0] for p in common_phrases],
-        "uses_emojis": has_emojis,
-        "uses_bullets": has_bullets
-    }
+    profile = aggregate.summary()
+    print_style_profile(profile)
+    return profile
 
 # Run the analysis
 if __name__ == "__main__":
-    past_emails = fetch_sent_emails()
-    if past_emails:
-        analyze_writing_style(past_emails)
+    # Only sent mail newer than the stored profile is analyzed
+    profile = update_style_profile(YOUR_EMAIL, DB_NAME)
+    if profile and profile["emails_analyzed"]:
+        print_style_profile(profile)
+        print(f"- **Emails Analyzed:** {profile['emails_analyzed']}")
     else:
         print("⚠️ No sent emails found. Make sure your email database is updated!")
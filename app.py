@@ -1,24 +1,289 @@
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, BackgroundTasks, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import asyncio
-from mail_gen1 import generate_email
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from mail_gen1 import (
+    INFERENCE_PROFILE,
+    generate_batch_item,
+    generate_email,
+    plan_batch,
+    stream_email,
+    system_prompt_cache,
+)
+from browsing_index import get_index_manager
+from faiss_browsing_ai import recommend_for_queries
+from email_search import SEARCH_PAGE_SIZE, search_emails
+from embedding_service import embedding_service
+from metrics import elapsed_ms, metrics, request_seconds
+from model_registry import registry
+from response_cache import response_cache
+from style_profile import style_profile_cache
+from inference_worker import (
+    InferenceExecutor,
+    QueueFullError,
+    QueueTimeoutError,
+    run_until_disconnected,
+    until_disconnected,
+)
 
-app = FastAPI()
+# Load models in the background once the server is up (set WARMUP_MODELS=0 to load on first use)
+WARMUP_MODELS = os.getenv("WARMUP_MODELS", "1") != "0"
+# Largest number of prompts accepted by /generate-emails in one call
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "256"))
+# Models that must be loaded before /health/ready reports ready
+READY_MODELS = ["email_llm"]
+
+@asynccontextmanager
+async def lifespan(app):
+    if WARMUP_MODELS:
+        registry.warm_up()
+        # Keep the browsing index resident so the first /recommend doesn't pay for loading it
+        asyncio.get_running_loop().run_in_executor(None, get_index_manager().ensure_loaded)
+        # Load the writing-style profile so the first draft is personalized from memory
+        asyncio.get_running_loop().run_in_executor(None, style_profile_cache.get)
+    yield
+
+app = FastAPI(lifespan=lifespan)
+
+# Generation runs on dedicated worker threads so the event loop keeps serving requests
+inference_executor = InferenceExecutor()
+
+# Point-in-time values read on every /metrics scrape
+metrics.gauge("inference_running", "Generations currently running", lambda: inference_executor.running)
+metrics.gauge("inference_waiting", "Requests waiting for an inference slot", lambda: inference_executor.waiting)
+metrics.counter_func("response_cache_hits_total", "Response cache hits", lambda: response_cache.hits)
+metrics.counter_func("response_cache_misses_total", "Response cache misses", lambda: response_cache.misses)
+metrics.counter_func("embedding_cache_hits_total", "Embedding cache hits", lambda: embedding_service.cache_hits)
+metrics.counter_func("embedding_cache_misses_total", "Embedding cache misses", lambda: embedding_service.cache_misses)
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    """
+    Observes every request's latency, labelled by route (not raw path) and status.
+
+    call_next returns as soon as the headers are ready, so the observation is made when
+    the body has been sent; for /generate-email/stream that is the end of generation.
+    """
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    labels = {"endpoint": getattr(route, "path", "unmatched"), "status": response.status_code}
+    body = response.body_iterator
+
+    async def observed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            # Also runs when the client disconnects mid-stream
+            request_seconds.observe(time.perf_counter() - started, **labels)
+
+    response.body_iterator = observed_body()
+    return response
 
 ### 🔹 Feature 1: AI Email Drafting from Prompt ###
 class EmailPrompt(BaseModel):
     prompt: str
     context: dict = None
+    use_cache: bool = True
 
 @app.post("/generate-email")
-async def generate_email_endpoint(prompt: EmailPrompt, background_tasks: BackgroundTasks):
+async def generate_email_endpoint(prompt: EmailPrompt, request: Request, background_tasks: BackgroundTasks):
     """Generate an email based on the user's prompt."""
+    # Filled by the worker: queue wait, context assembly, retrieval and generation stats
+    timings = {}
+    started = time.perf_counter()
+    try:
+        email_content, disconnected = await run_until_disconnected(
+            request, inference_executor, generate_email, prompt.prompt, prompt.context,
+            use_cache=prompt.use_cache, timings=timings,
+        )
+        if disconnected:
+            return JSONResponse(status_code=499, content={"status": "error", "message": "Client disconnected"})
+        timings["total_ms"] = elapsed_ms(started)
+        return {"status": "success", "email": email_content, "timings": timings}
+    except QueueFullError as e:
+        return JSONResponse(status_code=429, content={"status": "error", "message": str(e)})
+    except QueueTimeoutError as e:
+        return JSONResponse(status_code=503, content={"status": "error", "message": str(e)})
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+class EmailBatch(BaseModel):
+    requests: list[EmailPrompt]
+
+@app.post("/generate-emails")
+async def generate_emails_endpoint(batch: EmailBatch, request: Request):
+    """Generate a batch of emails, e.g. for bulk follow-up drafting.
+
+    Identical requests are generated once. Every other item goes through the inference
+    queue on its own, so a batch shares the replicas fairly with single requests and
+    can't bypass the queue limits. Results come back in request order, each with its
+    own status.
+    """
+    if len(batch.requests) > MAX_BATCH_SIZE:
+        return JSONResponse(status_code=413, content={
+            "status": "error", "message": f"Batch too large (max {MAX_BATCH_SIZE} requests)"
+        })
     try:
-        email_content = generate_email(prompt.prompt, prompt.context)
-        return {"status": "success", "email": email_content}
+        items, groups = plan_batch([item.model_dump() for item in batch.requests])
+        cancel_event = threading.Event()
+        outcomes, disconnected = await until_disconnected(request, inference_executor.map(
+            generate_batch_item, [items[positions[0]] for positions in groups], cancel_event=cancel_event,
+        ))
+        if disconnected:
+            cancel_event.set()
+            return JSONResponse(status_code=499, content={"status": "error", "message": "Client disconnected"})
+        rejected = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+        if rejected and len(rejected) == len(outcomes):
+            # Nothing was admitted: answer like a single request would
+            status_code = 429 if isinstance(rejected[0], QueueFullError) else 503
+            return JSONResponse(status_code=status_code, content={"status": "error", "message": str(rejected[0])})
+
+        results = [None] * len(items)
+        for outcome, positions in zip(outcomes, groups):
+            if isinstance(outcome, Exception):
+                outcome = {"status": "error", "message": str(outcome)}
+            for position in positions:
+                results[position] = outcome
+        return {"status": "success", "results": results}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+def _sse(event, data):
+    """Formats one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/generate-email/stream")
+async def generate_email_stream_endpoint(prompt: EmailPrompt):
+    """Stream the generated email token by token as Server-Sent Events.
+
+    Emits `token` events as the model produces text, then a single `done` event with the
+    full email and timing stats (or an `error` event if generation fails midway).
+    """
+    started = time.perf_counter()
+    timings = {}
+    try:
+        tokens = await inference_executor.stream(
+            stream_email, prompt.prompt, prompt.context, use_cache=prompt.use_cache, timings=timings
+        )
+    except QueueFullError as e:
+        return JSONResponse(status_code=429, content={"status": "error", "message": str(e)})
+    except QueueTimeoutError as e:
+        return JSONResponse(status_code=503, content={"status": "error", "message": str(e)})
+    queue_wait = time.perf_counter() - started
+
+    async def events():
+        chunks = []
+        first_token_at = None
+        try:
+            async for token in tokens:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                chunks.append(token)
+                yield _sse("token", {"token": token})
+        except Exception as e:
+            yield _sse("error", {"status": "error", "message": str(e)})
+            return
+        finally:
+            # Runs on client disconnect too, which cancels the worker
+            await tokens.aclose()
+
+        finished = time.perf_counter()
+        decode_time = finished - first_token_at if first_token_at else 0.0
+        stats = {
+            "queue_wait": round(queue_wait, 4),
+            "time_to_first_token": round(first_token_at - started, 4) if first_token_at else None,
+            "tokens": len(chunks),
+            # The first token closes prefill, so decode speed counts the ones after it
+            "tokens_per_second": round((len(chunks) - 1) / decode_time, 2) if decode_time > 0 else None,
+            "total_time": round(finished - started, 4),
+            "timings": timings,
+        }
+        yield _sse("done", {"status": "success", "email": "".join(chunks), "stats": stats})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+### 🔹 Feature 2: Browsing-History Recommendations ###
+class RecommendRequest(BaseModel):
+    query: str = None
+    queries: list[str] = None
+    top_n: int = 5
+    similarity_threshold: float = 0.2
+    backfill: bool = True
+    nprobe: int = None
+    ef_search: int = None
+
+@app.post("/recommend")
+async def recommend_endpoint(req: RecommendRequest):
+    """Recommend related searches from browsing history for one query or a batch."""
+    queries = req.queries if req.queries is not None else ([req.query] if req.query else [])
+    if not queries:
+        return JSONResponse(status_code=422, content={"status": "error", "message": "Provide 'query' or 'queries'"})
+    timings = {}
+    started = time.perf_counter()
+    try:
+        # Runs on the threadpool, not the inference executor, so it never queues behind the LLM
+        results = await run_in_threadpool(
+            recommend_for_queries, queries, req.top_n, req.similarity_threshold, req.backfill,
+            req.nprobe, req.ef_search, timings,
+        )
+        timings["total_ms"] = elapsed_ms(started)
+        if req.queries is None:
+            return {"status": "success", "recommendations": results[0], "timings": timings}
+        return {"status": "success", "results": results, "timings": timings}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+### 🔹 Feature 3: Email Archive Search ###
+class SearchRequest(BaseModel):
+    query: str
+    limit: int = SEARCH_PAGE_SIZE
+    offset: int = 0
+    direction: str = None  # "sent" or "received"
+
+@app.post("/search-emails")
+async def search_emails_endpoint(req: SearchRequest):
+    """Ranked full-text search over stored mail, with snippets and offset pagination."""
+    if req.direction not in (None, "sent", "received"):
+        return JSONResponse(status_code=422, content={"status": "error", "message": "direction must be 'sent' or 'received'"})
+    try:
+        page = await run_in_threadpool(search_emails, req.query, req.limit, req.offset, req.direction)
+        return {"status": "success", **page}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Latency histograms and counters in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health")
+@app.get("/health/live")
+async def health():
+    """Liveness check; answers even while models load or generations run."""
+    return {
+        "status": "ok",
+        "inference": inference_executor.stats(),
+        "response_cache": response_cache.stats(),
+        "prefix_cache": system_prompt_cache.stats(),
+        "inference_profile": INFERENCE_PROFILE,
+    }
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness check; 503 until the models needed to serve requests are loaded."""
+    ready = registry.ready(READY_MODELS)
+    content = {"status": "ready" if ready else "loading", "models": registry.status()}
+    return JSONResponse(status_code=200 if ready else 503, content=content)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=5002)
@@ -0,0 +1,215 @@
+"""
+Finds the fastest llama.cpp settings for this machine and writes them as the
+inference profile the server loads at startup (inference_profile.json).
+
+Each setting is swept in turn against a fixed set of email prompts, keeping the
+best value found so far for the others: thread count, batch size, mmap/mlock,
+then context size. Every trial loads the model fresh and records prefill and
+decode tokens/second. Thread counts never exceed the CPUs available to this
+process divided by the number of replicas, so the tuned replicas don't
+oversubscribe the cores when they run together.
+
+    python autotune.py                                 # default model, INFERENCE_CONCURRENCY replicas
+    python autotune.py --model-path tiny.gguf --replicas 2 --ctx 4096 8192
+"""
+import argparse
+import gc
+import json
+import statistics
+import time
+from inference_profile import (
+    INFERENCE_PROFILE_FILE,
+    available_cpus,
+    default_profile,
+    physical_cores,
+    save_profile,
+)
+from inference_worker import INFERENCE_CONCURRENCY
+from mail_gen1 import SAMPLING_PARAMS, build_messages
+from model_registry import registry
+
+# Fixed prompt set: short requests plus one carrying retrieved mail, as drafts with context do
+TUNING_PROMPTS = [
+    ("Invite Tom to dinner on Friday", None),
+    ("Write a formal email to the client about the project delay", None),
+    ("Thank Anna for the budget review and propose a follow-up call", None),
+    ("Reply to Anna about the Q3 budget numbers",
+     "\n\n".join(
+         f"From: anna@example.com\nSubject: Q3 budget, revision {i}\n"
+         f"Hi, attached is revision {i} of the Q3 budget. Travel is down 4%, hardware is up 12% "
+         "because of the laptop refresh, and the contractor line moved to Q4. Could you confirm "
+         "the totals before Thursday's review so finance can lock the forecast?"
+         for i in range(1, 9)
+     )),
+]
+# Treated as equal when within this fraction of the best; the cheaper setting then wins
+TOLERANCE = 0.03
+
+
+def prompt_texts():
+    texts = []
+    for prompt, retrieved in TUNING_PROMPTS:
+        messages = build_messages(prompt, {"style_profile": None, "retrieved_context": retrieved})
+        texts.append("\n\n".join(content for _, content in messages))
+    return texts
+
+
+def thread_candidates(limit, replicas):
+    """Powers of two up to the per-replica CPU limit, plus the per-replica physical cores and the limit."""
+    candidates = {limit, max(1, min(limit, physical_cores() // max(1, replicas)))}
+    count = 1
+    while count < limit:
+        candidates.add(count)
+        count *= 2
+    return sorted(candidates)
+
+
+def run_trial(model_path, params, texts, decode_tokens, repeats):
+    """Loads the model with params and times prefill and decode on every prompt."""
+    from llama_cpp import Llama
+
+    started = time.perf_counter()
+    llm = Llama(model_path=model_path, verbose=False, **params)
+    load_seconds = time.perf_counter() - started
+    try:
+        prompts = [llm.tokenize(text.encode("utf-8")) for text in texts]
+        llm.reset()
+        llm.eval(prompts[0][:32])  # Faults in the weights so the first measurement isn't a page-in
+
+        prefill_rates, decode_rates, prefill_ms = [], [], []
+        for _ in range(repeats):
+            for tokens in prompts:
+                tokens = tokens[:params["n_ctx"] - decode_tokens]
+                llm.reset()
+                started = time.perf_counter()
+                llm.eval(tokens)
+                seconds = time.perf_counter() - started
+                prefill_rates.append(len(tokens) / seconds)
+                prefill_ms.append(seconds * 1000)
+
+                started = time.perf_counter()
+                for _ in range(decode_tokens):
+                    llm.eval([llm.sample(temp=0.0)])  # Greedy and past EOS: a fixed amount of work
+                decode_rates.append(decode_tokens / (time.perf_counter() - started))
+    finally:
+        getattr(llm, "close", lambda: None)()
+        del llm
+        gc.collect()
+    return {
+        "load_seconds": round(load_seconds, 3),
+        "prompt_tokens": [len(tokens) for tokens in prompts],
+        "prefill_tokens_per_second": round(statistics.median(prefill_rates), 2),
+        "decode_tokens_per_second": round(statistics.median(decode_rates), 2),
+        "prefill_ms": round(statistics.mean(prefill_ms), 1),
+    }
+
+
+def request_ms(result, email_tokens):
+    """Expected time for one draft: the prompt set's mean prefill plus a typical email's decode."""
+    return result["prefill_ms"] + email_tokens / result["decode_tokens_per_second"] * 1000
+
+
+def pick(trials, key, maximize, cost):
+    """Best trial by key, preferring the lowest cost among those within TOLERANCE of it."""
+    best = max(trial[key] for trial in trials) if maximize else min(trial[key] for trial in trials)
+    close = [trial for trial in trials
+             if (trial[key] >= best * (1 - TOLERANCE) if maximize else trial[key] <= best * (1 + TOLERANCE))]
+    return min(close, key=cost)
+
+
+def autotune(model_path, replicas, batch_sizes, context_sizes, decode_tokens, email_tokens, repeats):
+    """
+    Coordinate sweep over the llama.cpp settings.
+
+    Returns:
+        tuple: (best params, measurements for them, every trial)
+    """
+    texts = prompt_texts()
+    limit = max(1, available_cpus() // max(1, replicas))
+    params = default_profile(replicas)
+    params["n_ctx"] = max(context_sizes)  # Room for every prompt while the other settings are swept
+    trials = []
+
+    def measure(stage, changes):
+        candidate = {**params, **changes}
+        try:
+            result = run_trial(model_path, candidate, texts, decode_tokens, repeats)
+        except Exception as error:  # e.g. mlock beyond RLIMIT_MEMLOCK, or n_ctx beyond the model
+            print(f"❌ {stage} {changes}: {error}")
+            return None
+        result.update({"stage": stage, "params": candidate})
+        result["request_ms"] = round(request_ms(result, email_tokens), 1)
+        trials.append(result)
+        print(f"✅ {stage} {changes}: prefill {result['prefill_tokens_per_second']} tok/s, "
+              f"decode {result['decode_tokens_per_second']} tok/s, ~{result['request_ms']} ms per draft")
+        return result
+
+    def sweep(stage, variants):
+        results = [measure(stage, changes) for changes in variants]
+        return [result for result in results if result]
+
+    # 🔹 Threads: decode is memory-bound and often peaks below the core count, prefill scales further
+    stage = sweep("threads", [{"n_threads": t, "n_threads_batch": t} for t in thread_candidates(limit, replicas)])
+    if stage:
+        fewest_threads = lambda r: r["params"]["n_threads"]
+        params["n_threads"] = pick(stage, "decode_tokens_per_second", True, fewest_threads)["params"]["n_threads"]
+        params["n_threads_batch"] = pick(stage, "prefill_tokens_per_second", True,
+                                         fewest_threads)["params"]["n_threads"]
+
+    # 🔹 Batch size: only affects prefill; smaller batches need less scratch memory
+    stage = sweep("n_batch", [{"n_batch": n} for n in batch_sizes])
+    if stage:
+        params["n_batch"] = pick(stage, "prefill_tokens_per_second", True,
+                                 lambda r: r["params"]["n_batch"])["params"]["n_batch"]
+
+    # 🔹 Memory mapping: mmap lets replicas share the weights; mlock pins them against swapping.
+    # Listed in order of preference when their speed is the same.
+    memory_modes = [(True, False), (True, True), (False, False)]
+    stage = sweep("memory", [{"use_mmap": mmap, "use_mlock": mlock} for mmap, mlock in memory_modes])
+    if stage:
+        best = pick(stage, "request_ms", False,
+                    lambda r: memory_modes.index((r["params"]["use_mmap"], r["params"]["use_mlock"])))
+        params["use_mmap"], params["use_mlock"] = best["params"]["use_mmap"], best["params"]["use_mlock"]
+
+    # 🔹 Context size: larger windows cost KV-cache memory per replica (and leave more room for retrieval)
+    stage = sweep("n_ctx", [{"n_ctx": n} for n in sorted(context_sizes)])
+    if not stage:
+        raise RuntimeError("every trial failed; check the model path and available memory")
+    best = pick(stage, "request_ms", False, lambda r: r["params"]["n_ctx"])
+    params["n_ctx"] = best["params"]["n_ctx"]
+
+    measured = {key: best[key] for key in (
+        "prefill_tokens_per_second", "decode_tokens_per_second", "request_ms", "load_seconds", "prompt_tokens")}
+    return params, measured, trials
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-path", help="GGUF to tune (default: the server's model, downloaded if needed)")
+    parser.add_argument("--replicas", type=int, default=INFERENCE_CONCURRENCY,
+                        help="replicas that will run concurrently (default: INFERENCE_CONCURRENCY)")
+    parser.add_argument("--batch", type=int, nargs="+", default=[64, 128, 256, 512, 1024])
+    parser.add_argument("--ctx", type=int, nargs="+", default=[4096, 8192],
+                        help=f"context sizes; keep them above max_tokens ({SAMPLING_PARAMS['max_tokens']}) "
+                             "plus the prompt and retrieved mail")
+    parser.add_argument("--decode-tokens", type=int, default=32, help="tokens generated per measurement")
+    parser.add_argument("--email-tokens", type=int, default=250, help="typical draft length, for scoring")
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--output", default=INFERENCE_PROFILE_FILE, help="profile file the server loads")
+    parser.add_argument("--dry-run", action="store_true", help="print the profile without writing it")
+    args = parser.parse_args()
+
+    model_path = args.model_path or registry.get("email_llm_weights")
+    print(f"🔹 Tuning {model_path} for {args.replicas} replica(s) on {available_cpus()} available CPUs "
+          f"({physical_cores()} physical cores)")
+    params, measured, trials = autotune(model_path, args.replicas, args.batch, args.ctx,
+                                        args.decode_tokens, args.email_tokens, args.repeats)
+    print(json.dumps({"params": params, "measured": measured}, indent=2))
+    if args.dry_run:
+        return
+    save_profile(params, measured, args.replicas, model_path, args.output, trials)
+    print(f"✅ Wrote {args.output}; restart the server to use it")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Every script prints one JSON report (and optionally writes it with --output) of the form
+{"benchmark", "environment", "params", "results"}, where `environment` records the git
+commit so reports from different commits can be diffed with compare.py.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def percentiles(samples_ms):
+    """p50/p90/p99/mean/max of a list of millisecond timings."""
+    if not samples_ms:
+        return {"p50_ms": None, "p90_ms": None, "p99_ms": None, "mean_ms": None, "max_ms": None}
+    ordered = sorted(samples_ms)
+
+    def pick(fraction):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 3)
+
+    return {
+        "p50_ms": pick(0.50),
+        "p90_ms": pick(0.90),
+        "p99_ms": pick(0.99),
+        "mean_ms": round(sum(ordered) / len(ordered), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def rate(count, seconds):
+    return round(count / seconds, 2) if seconds > 0 else None
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    """What the numbers were measured on: commit, interpreter and machine."""
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def write_report(name, params, results, output=None):
+    """Prints the JSON report and writes it to `output` if given; returns the report."""
+    report = {"benchmark": name, "environment": environment(), "params": params, "results": results}
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def log(result):
+    """Progress line on stderr, so stdout stays valid JSON."""
+    print(json.dumps(result), file=sys.stderr)
@@ -0,0 +1,121 @@
+"""
+Compares approximate FAISS backends against the exact flat index.
+
+Builds every backend from browsing_index.build_index over a synthetic corpus and
+reports build time, single-query latency (p50/p95) and recall@k against the flat
+index's exact neighbours. Results are printed (and optionally written) as JSON.
+
+    python benchmarks/ann_index_benchmark.py --sizes 10000 100000 1000000
+    python benchmarks/ann_index_benchmark.py --sizes 10000 --embed   # real MiniLM titles
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+from _common import log, write_report
+
+from browsing_index import BACKENDS, build_index, set_search_params
+
+TITLE_WORDS = [
+    "transformer", "models", "python", "react", "tutorial", "stocks", "crypto", "quantum",
+    "guide", "learning", "deep", "performance", "javascript", "css", "trading", "news",
+    "release", "notes", "benchmark", "llm", "fine-tuning", "qiskit", "investment", "docs",
+]
+
+
+def synthetic_vectors(n, d, clusters, seed):
+    """Clustered unit vectors, a rough stand-in for sentence embeddings of titles."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((clusters, d)).astype("float32")
+    vectors = centroids[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, d)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def synthetic_titles(n, seed):
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(TITLE_WORDS, k=rng.randint(3, 7))) for _ in range(n)]
+
+
+def embedded_vectors(n, seed):
+    from model_registry import registry
+
+    model = registry.get("sentence_encoder")
+    titles = synthetic_titles(n, seed)
+    return np.asarray(model.encode(titles, batch_size=256, normalize_embeddings=True), dtype="float32")
+
+
+def latency_percentiles(index, queries, k):
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query[None, :], k)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "p50_ms": round(timings[len(timings) // 2], 4),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 4),
+    }
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return round(hits / truth.size, 4)
+
+
+def run(sizes, backends, k, n_queries, nprobe, ef_search, embed, seed):
+    results = []
+    for n in sizes:
+        vectors = embedded_vectors(n, seed) if embed else synthetic_vectors(n, 384, max(16, n // 500), seed)
+        ids = np.arange(1, n + 1, dtype=np.int64)
+        rng = np.random.default_rng(seed + 1)
+        queries = vectors[rng.integers(0, n, n_queries)] + 0.05 * rng.standard_normal(
+            (n_queries, vectors.shape[1])).astype("float32")
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        truth = None
+        for backend in ["flat"] + [b for b in backends if b != "flat"]:
+            started = time.perf_counter()
+            index = build_index(backend, vectors, ids)
+            build_time = time.perf_counter() - started
+            set_search_params(index, nprobe, ef_search)
+
+            _, found = index.search(queries, k)
+            if backend == "flat":
+                truth = found
+            result = {
+                "corpus_size": n,
+                "backend": backend,
+                "k": k,
+                "build_seconds": round(build_time, 3),
+                "recall_at_k": recall_at_k(found, truth),
+                **latency_percentiles(index, queries, k),
+            }
+            results.append(result)
+            log(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, default=None)
+    parser.add_argument("--ef-search", type=int, default=None)
+    parser.add_argument("--embed", action="store_true", help="embed synthetic titles with the real model")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.backends, args.k, args.queries, args.nprobe, args.ef_search,
+                  args.embed, args.seed)
+    params = vars(args).copy()
+    params.pop("output")
+    write_report("ann_index", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
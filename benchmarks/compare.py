@@ -0,0 +1,98 @@
+"""
+Diffs two benchmark reports (single-benchmark or run_all.py suite files).
+
+Results are matched on their configuration fields (corpus size, backend,
+concurrency, ...). Timings (`*_ms`, `*seconds`) are better when lower, rates
+(`*per_second`) and recall when higher; any change worse than --threshold percent
+is listed as a regression and makes the exit status 1.
+
+    python benchmarks/compare.py bench-old.json bench-new.json --threshold 15
+"""
+import argparse
+import json
+import sys
+
+# Fields that identify a result rather than measure it
+IDENTITY_FIELDS = (
+    "operation", "method", "query", "engine", "connections", "parse_workers", "backend", "encoder",
+    "corpus_size", "rows", "k", "concurrency", "requests",
+)
+
+
+def load(path):
+    """{benchmark name: report} from a single report or a suite file."""
+    with open(path) as f:
+        report = json.load(f)
+    if report.get("benchmark") == "suite":
+        return {name: sub for name, sub in report["reports"].items() if "results" in sub}
+    return {report["benchmark"]: report}
+
+
+def identity(result):
+    return tuple((field, result[field]) for field in IDENTITY_FIELDS if field in result)
+
+
+def metrics(result, prefix=""):
+    """Flattens numeric measurements, e.g. {"total": {"p50_ms": 3}} → {"total.p50_ms": 3}."""
+    found = {}
+    for key, value in result.items():
+        if key in IDENTITY_FIELDS:
+            continue
+        if isinstance(value, dict):
+            found.update(metrics(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            found[prefix + key] = value
+    return found
+
+
+def direction(metric):
+    """+1 if higher is better, -1 if lower is better, 0 if it's not a performance figure."""
+    name = metric.rsplit(".", 1)[-1]
+    if "per_second" in name or name.startswith("recall"):
+        return 1
+    if name.endswith("_ms") or name.endswith("seconds"):
+        return -1
+    return 0
+
+
+def compare(old, new, threshold):
+    rows, regressions = [], []
+    for name in sorted(set(old) & set(new)):
+        old_results = {identity(result): result for result in old[name]["results"]}
+        for result in new[name]["results"]:
+            before = old_results.get(identity(result))
+            if before is None:
+                continue
+            before_metrics = metrics(before)
+            for metric, value in metrics(result).items():
+                sign = direction(metric)
+                previous = before_metrics.get(metric)
+                if not sign or not previous:
+                    continue
+                change = (value - previous) / abs(previous) * 100
+                label = ", ".join(f"{k}={v}" for k, v in identity(result))
+                row = f"{name:<11} {label:<55} {metric:<32} {previous:>12g} → {value:<12g} {change:+7.1f}%"
+                rows.append(row)
+                if change * sign < -threshold:
+                    regressions.append(row)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change counted as a regression")
+    args = parser.parse_args()
+
+    rows, regressions = compare(load(args.old), load(args.new), args.threshold)
+    print("\n".join(rows) or "No comparable results.")
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {args.threshold:g}%:")
+        print("\n".join(regressions))
+        sys.exit(1)
+    print(f"\n✅ No regressions beyond {args.threshold:g}%")
+
+
+if __name__ == "__main__":
+    main()
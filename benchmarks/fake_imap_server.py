@@ -0,0 +1,311 @@
+"""
+A local IMAP4rev1 server over synthetic mailboxes, for ingest benchmarks.
+
+Speaks the subset the sync code uses (CAPABILITY, LOGIN, LIST, SELECT/EXAMINE,
+UID SEARCH, UID FETCH with UID/RFC822.SIZE/BODYSTRUCTURE/BODY.PEEK[...]<o.n>,
+NOOP, LOGOUT) over plain TCP. Messages are generated deterministically: plain
+text, text+HTML alternatives and mails with base64 attachments, in INBOX and a
+\\Sent folder. `--latency-ms` delays every command to mimic a network round trip.
+
+    python benchmarks/fake_imap_server.py --messages 5000 --port 1143
+"""
+import argparse
+import random
+import re
+import socketserver
+import threading
+import time
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.parser import BytesParser
+from email.policy import compat32
+from email.utils import formatdate, make_msgid
+
+WORDS = [
+    "meeting", "budget", "project", "invoice", "launch", "review", "contract", "travel", "dinner",
+    "schedule", "report", "update", "team", "client", "deadline", "proposal", "design", "release",
+    "quarter", "numbers", "feedback", "draft", "agenda", "call", "thanks", "please", "attached",
+]
+
+_COMMAND = re.compile(rb"^(\S+) (\S+)(?: (.*))?$")
+_BODY_SECTION = re.compile(r"BODY(?:\.PEEK)?\[([\d.]*)\](?:<(\d+)\.(\d+)>)?")
+
+
+# 🔹 Synthetic mail
+
+def _sentences(rng, count):
+    return " ".join(
+        " ".join(rng.choices(WORDS, k=rng.randint(6, 14))).capitalize() + "." for _ in range(count)
+    )
+
+
+def synthetic_message(rng, index, owner, sent, attachment_kb):
+    """One raw RFC 822 message; the kind (plain, alternative, attachment) is random."""
+    contact = f"contact{rng.randint(1, 200)}@example.com"
+    text = "Hi,\n\n" + "\n\n".join(_sentences(rng, rng.randint(2, 5)) for _ in range(rng.randint(1, 4)))
+    kind = rng.random()
+    if kind < 0.5:
+        msg = MIMEText(text, "plain", "utf-8")
+    elif kind < 0.8:
+        msg = MIMEMultipart("alternative")
+        msg.attach(MIMEText(text, "plain", "utf-8"))
+        msg.attach(MIMEText("<html><body><p>" + text.replace("\n\n", "</p><p>") + "</p></body></html>",
+                            "html", "utf-8"))
+    else:
+        msg = MIMEMultipart("mixed")
+        msg.attach(MIMEText(text, "plain", "utf-8"))
+        attachment = MIMEApplication(rng.randbytes(attachment_kb * 1024), "pdf")
+        attachment.add_header("Content-Disposition", "attachment", filename=f"file{index}.pdf")
+        msg.attach(attachment)
+    msg["From"] = owner if sent else f"Contact <{contact}>"
+    msg["To"] = contact if sent else owner
+    msg["Subject"] = " ".join(rng.choices(WORDS, k=rng.randint(2, 6))).capitalize()
+    msg["Date"] = formatdate(1_600_000_000 + index * 600)
+    msg["Message-ID"] = make_msgid(domain="example.com")
+    return msg.as_bytes()
+
+
+def synthetic_mailboxes(messages, owner="me@example.com", sent_share=0.2, attachment_kb=64, seed=0):
+    """{"INBOX": [raw, ...], "Sent Items": [raw, ...]} with `messages` mails in total."""
+    rng = random.Random(seed)
+    folders = {"INBOX": [], "Sent Items": []}
+    for index in range(messages):
+        sent = rng.random() < sent_share
+        folders["Sent Items" if sent else "INBOX"].append(
+            synthetic_message(rng, index, owner, sent, attachment_kb))
+    return folders
+
+
+# 🔹 Message model (precomputed so the server is never the bottleneck)
+
+def _quote(value):
+    return "NIL" if value is None else '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _bodystructure(part):
+    if part.is_multipart():
+        children = "".join(_bodystructure(child) for child in part.get_payload())
+        return f"({children} {_quote(part.get_content_subtype().upper())})"
+    params = [(key, value) for key, value in part.get_params(header="content-type")[1:]]
+    param_list = "(" + " ".join(f"{_quote(k.upper())} {_quote(v)}" for k, v in params) + ")" if params else "NIL"
+    payload = _payload(part)
+    encoding = (part.get("Content-Transfer-Encoding") or "7bit").upper()
+    disposition = part.get_content_disposition()
+    disposition = f"({_quote(disposition.upper())} NIL)" if disposition else "NIL"
+    fields = [_quote(part.get_content_maintype().upper()), _quote(part.get_content_subtype().upper()),
+              param_list, "NIL", "NIL", _quote(encoding), str(len(payload))]
+    if part.get_content_maintype() == "text":
+        fields.append(str(payload.count(b"\n")))
+    fields += ["NIL", disposition, "NIL"]
+    return "(" + " ".join(fields) + ")"
+
+
+def _payload(part):
+    payload = part.get_payload()
+    return payload.encode("utf-8", "surrogateescape") if isinstance(payload, str) else b""
+
+
+class StoredMessage:
+    def __init__(self, uid, raw):
+        self.uid = uid
+        self.raw = raw
+        self.message = BytesParser(policy=compat32).parsebytes(raw)
+        self.bodystructure = _bodystructure(self.message)
+        self._sections = {}
+
+    def header_fields(self, names):
+        lines = [f"{key}: {value}\r\n" for key, value in self.message.items() if key.upper() in names]
+        return "".join(lines).encode("utf-8", "surrogateescape") + b"\r\n"
+
+    def section(self, path):
+        """Raw bytes of BODY[path] ("" = whole message, "1.2" = a nested part)."""
+        if not path:
+            return self.raw
+        if path not in self._sections:
+            part = self.message
+            for number in path.split("."):
+                if part.is_multipart():
+                    part = part.get_payload()[int(number) - 1]
+            self._sections[path] = _payload(part)
+        return self._sections[path]
+
+
+class Mailbox:
+    def __init__(self, name, raws, flags="", uidvalidity=1):
+        self.name = name
+        self.flags = flags
+        self.uidvalidity = uidvalidity
+        self.messages = []
+        self.by_uid = {}
+        self.append(raws)
+
+    def append(self, raws):
+        """Delivers new messages with the next UIDs, as arriving mail would."""
+        for raw in raws:
+            uid = self.messages[-1].uid + 1 if self.messages else 1
+            self.messages.append(StoredMessage(uid, raw))
+            self.by_uid[uid] = (len(self.messages), self.messages[-1])
+
+    def uids_in(self, sequence_set):
+        top = self.messages[-1].uid if self.messages else 0
+        found = set()
+        for item in sequence_set.split(","):
+            low, _, high = item.partition(":")
+            low = top if low == "*" else int(low)
+            high = low if not high else (top if high == "*" else int(high))
+            low, high = min(low, high), max(low, high)
+            # "n:*" with n above the top UID still matches the top UID, as on real servers
+            found.update(uid for uid in range(low, high + 1) if uid in self.by_uid)
+        return sorted(found)
+
+
+# 🔹 Protocol
+
+class ImapHandler(socketserver.StreamRequestHandler):
+    def send(self, data):
+        self.wfile.write(data if isinstance(data, bytes) else data.encode("utf-8"))
+
+    def handle(self):
+        self.selected = None
+        self.send("* OK [CAPABILITY IMAP4rev1] fake IMAP ready\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            match = _COMMAND.match(line.rstrip(b"\r\n"))
+            if not match:
+                self.send("* BAD unparseable command\r\n")
+                continue
+            tag, command, args = match.group(1).decode(), match.group(2).decode().upper(), (match.group(3) or b"").decode()
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            try:
+                if self.dispatch(tag, command, args) is False:
+                    return
+            except Exception as error:
+                self.send(f"{tag} BAD {error}\r\n")
+            self.wfile.flush()
+
+    def dispatch(self, tag, command, args):
+        if command == "CAPABILITY":
+            self.send("* CAPABILITY IMAP4rev1\r\n" + f"{tag} OK CAPABILITY completed\r\n")
+        elif command == "LOGIN":
+            self.send(f"{tag} OK LOGIN completed\r\n")
+        elif command == "NOOP":
+            self.send(f"{tag} OK NOOP completed\r\n")
+        elif command == "LOGOUT":
+            self.send("* BYE logging out\r\n" + f"{tag} OK LOGOUT completed\r\n")
+            self.wfile.flush()
+            return False
+        elif command == "LIST":
+            for box in self.server.mailboxes.values():
+                self.send(f'* LIST ({box.flags}) "/" {_quote(box.name)}\r\n')
+            self.send(f"{tag} OK LIST completed\r\n")
+        elif command in ("SELECT", "EXAMINE"):
+            box = self.server.mailboxes.get(args.strip().strip('"'))
+            if box is None:
+                self.send(f"{tag} NO no such mailbox\r\n")
+                return
+            self.selected = box
+            uidnext = box.messages[-1].uid + 1 if box.messages else 1
+            self.send(f"* {len(box.messages)} EXISTS\r\n* 0 RECENT\r\n"
+                      f"* OK [UIDVALIDITY {box.uidvalidity}] UIDs valid\r\n* OK [UIDNEXT {uidnext}] next UID\r\n"
+                      f"{tag} OK [{'READ-ONLY' if command == 'EXAMINE' else 'READ-WRITE'}] {command} completed\r\n")
+        elif command == "UID":
+            self.uid_command(tag, args)
+        else:
+            self.send(f"{tag} BAD unsupported command {command}\r\n")
+
+    def uid_command(self, tag, args):
+        if self.selected is None:
+            self.send(f"{tag} NO no mailbox selected\r\n")
+            return
+        sub, _, rest = args.partition(" ")
+        sub = sub.upper()
+        if sub == "SEARCH":
+            # Only "UID <set>" searches are needed
+            sequence_set = rest.split()[-1]
+            uids = self.selected.uids_in(sequence_set)
+            self.send("* SEARCH" + "".join(f" {uid}" for uid in uids) + f"\r\n{tag} OK SEARCH completed\r\n")
+        elif sub == "FETCH":
+            sequence_set, _, items = rest.partition(" ")
+            for uid in self.selected.uids_in(sequence_set):
+                seq, message = self.selected.by_uid[uid]
+                self.send(self.fetch_response(seq, message, items.upper()))
+            self.send(f"{tag} OK FETCH completed\r\n")
+        else:
+            self.send(f"{tag} BAD unsupported UID command {sub}\r\n")
+
+    @staticmethod
+    def fetch_response(seq, message, items):
+        attributes = [f"UID {message.uid}".encode()]
+        if "RFC822.SIZE" in items:
+            attributes.append(f"RFC822.SIZE {len(message.raw)}".encode())
+        if "BODYSTRUCTURE" in items:
+            attributes.append(f"BODYSTRUCTURE {message.bodystructure}".encode())
+        fields = re.search(r"HEADER\.FIELDS \(([^)]*)\)", items)
+        if fields:
+            literal = message.header_fields(set(fields.group(1).split()))
+            attributes.append(f"BODY[HEADER.FIELDS ({fields.group(1)})] {{{len(literal)}}}\r\n".encode() + literal)
+        else:
+            section = _BODY_SECTION.search(items)
+            if section:
+                data = message.section(section.group(1))
+                origin = ""
+                if section.group(2) is not None:
+                    start, length = int(section.group(2)), int(section.group(3))
+                    data = data[start:start + length]
+                    origin = f"<{start}>"
+                attributes.append(f"BODY[{section.group(1)}]{origin} {{{len(data)}}}\r\n".encode() + data)
+        return f"* {seq} FETCH (".encode() + b" ".join(attributes) + b")\r\n"
+
+
+class FakeImapServer(socketserver.ThreadingTCPServer):
+    """Threaded server; every connection sees the same read-only mailboxes."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, folders, host="127.0.0.1", port=0, latency_ms=0.0):
+        self.mailboxes = {
+            name: Mailbox(name, raws, "\\HasNoChildren \\Sent" if name.lower().startswith("sent") else "\\HasNoChildren")
+            for name, raws in folders.items()
+        }
+        self.latency = latency_ms / 1000
+        super().__init__((host, port), ImapHandler)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """Serves on a daemon thread; returns self."""
+        threading.Thread(target=self.serve_forever, name="fake-imap", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--attachment-kb", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=1143)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeImapServer(synthetic_mailboxes(args.messages, attachment_kb=args.attachment_kb, seed=args.seed),
+                            port=args.port, latency_ms=args.latency_ms)
+    print(f"✅ Fake IMAP server on 127.0.0.1:{server.port} ({args.messages} messages)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
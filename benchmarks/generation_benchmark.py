@@ -0,0 +1,197 @@
+"""
+/generate-email latency and throughput under increasing client concurrency.
+
+Starts the real FastAPI app (uvicorn, on a free local port) and drives it with
+blocking HTTP clients. The model is a stub that sleeps like llama.cpp would
+(per prompt token for prefill, per generated token for decode), so the numbers
+isolate queueing, replica scheduling and request-path overhead; pass
+--model-path with a small GGUF to measure real inference instead. Response
+caching is off; retrieval runs against a synthetic archive with --retrieval.
+
+    python benchmarks/generation_benchmark.py --concurrency 1 2 4 8 --replicas 2
+    python benchmarks/generation_benchmark.py --model-path tiny.gguf --concurrency 1 2
+"""
+import argparse
+import contextlib
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import types
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from _common import log, percentiles, rate, write_report
+
+PROMPTS = [
+    "Invite Tom to dinner on Friday",
+    "Write a formal email to the client about the project delay",
+    "Ask the team for feedback on the launch plan",
+    "Thank Anna for the budget review and propose a follow-up call",
+    "Remind everyone that the contract needs signing by Monday",
+    "Decline the meeting politely and suggest next week instead",
+    "Send the quarterly numbers to finance with a short summary",
+    "Follow up with the recruiter about the hiring timeline",
+]
+STUB_REPLY = ("Hi Tom,\n\nI hope you are well. I wanted to follow up on our conversation and share a quick "
+              "update on where things stand. Let me know what works for you.\n\nBest regards,\nAlex").split(" ")
+
+
+class StubChatModel:
+    """Stands in for ChatLlamaCpp: same stream()/invoke() shape, llama.cpp-like timing."""
+
+    def __init__(self, prefill_ms_per_token, decode_tokens_per_second, output_tokens):
+        self.prefill = prefill_ms_per_token / 1000
+        self.decode = 1 / decode_tokens_per_second
+        self.output_tokens = output_tokens
+        self.client = types.SimpleNamespace(tokenize=lambda data, add_bos=True: data.split())
+
+    def stream(self, messages, **kwargs):
+        prompt = "\n".join(content for _, content in messages)
+        time.sleep(self.prefill * len(self.client.tokenize(prompt.encode("utf-8"))))
+        for index in range(self.output_tokens):
+            time.sleep(self.decode)  # time.sleep releases the GIL, as llama.cpp's decode does
+            yield types.SimpleNamespace(content=(" " if index else "") + STUB_REPLY[index % len(STUB_REPLY)])
+
+    def invoke(self, messages, **kwargs):
+        return types.SimpleNamespace(content="".join(chunk.content for chunk in self.stream(messages)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args):
+    """Configures the model and environment, then serves app.py on a daemon thread."""
+    os.environ.update({
+        "WARMUP_MODELS": "0",
+        "RESPONSE_CACHE_MODE": "off",
+        "RETRIEVAL_ENABLED": "1" if args.retrieval else "0",
+        "INFERENCE_CONCURRENCY": str(args.replicas),
+        "INFERENCE_MAX_QUEUE": str(max(args.concurrency) * 2),
+        "INFERENCE_MAX_WAIT": "600",
+    })
+    from model_registry import registry
+
+    if args.model_path:
+        registry.register("email_llm_weights", lambda: args.model_path)
+    else:
+        os.environ["PREFIX_CACHE"] = "0"  # The stub has no KV state to snapshot
+
+        def stub():
+            return StubChatModel(args.prefill_ms_per_token, args.decode_tokens_per_second, args.output_tokens)
+
+        # Registered before mail_gen1 is imported, so it takes the place of the real model
+        registry.register("email_llm", stub)
+
+    import uvicorn
+    import mail_gen1
+    from app import app
+
+    if not args.model_path:
+        mail_gen1._create_llm = stub  # Extra replicas
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=free_port(), log_level="warning"))
+    threading.Thread(target=server.run, name="bench-server", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def post(url, payload, timeout):
+    request = urllib.request.Request(url, json.dumps(payload).encode("utf-8"),
+                                     {"Content-Type": "application/json"})
+    started = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        body = json.loads(response.read())
+    return (time.perf_counter() - started) * 1000, body
+
+
+def median_of(bodies, field):
+    values = [body["timings"][field] for body in bodies if body.get("timings", {}).get(field) is not None]
+    return round(statistics.median(values), 3) if values else None
+
+
+def run_level(url, concurrency, requests, timeout):
+    payloads = [{"prompt": PROMPTS[i % len(PROMPTS)], "context": {"style_profile": None}, "use_cache": False}
+                for i in range(requests)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        outcomes = list(clients.map(lambda payload: post(url, payload, timeout), payloads))
+    seconds = time.perf_counter() - started
+
+    ok = [body for _, body in outcomes if body.get("status") == "success"]
+    tokens = sum(body["timings"].get("decode_tokens") or 0 for body in ok)
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": requests - len(ok),
+        "seconds": round(seconds, 3),
+        "requests_per_second": rate(len(ok), seconds),
+        "generated_tokens_per_second": rate(tokens, seconds),
+        **percentiles([latency for latency, _ in outcomes]),
+        "server_median": {field: median_of(ok, field) for field in (
+            "queue_wait_ms", "context_ms", "prompt_tokens", "prefill_ms", "decode_tokens_per_second",
+            "generation_ms")},
+    }
+
+
+def seed_archive(rows):
+    """Synthetic emails.db in the working directory, for --retrieval runs."""
+    from database import ensure_schema
+    from imap_sync import INSERT_EMAIL_SQL
+    from sqlite_benchmark import synthetic_rows
+    from storage import executemany_batched
+
+    ensure_schema("emails.db")
+    executemany_batched("emails.db", INSERT_EMAIL_SQL, synthetic_rows(rows, seed=0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=32, help="requests per concurrency level")
+    parser.add_argument("--replicas", type=int, default=2, help="INFERENCE_CONCURRENCY for the server")
+    parser.add_argument("--model-path", help="small GGUF to benchmark real inference instead of the stub")
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.2)
+    parser.add_argument("--decode-tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--output-tokens", type=int, default=64)
+    parser.add_argument("--retrieval", action="store_true", help="enable retrieval over a synthetic archive")
+    parser.add_argument("--archive-rows", type=int, default=20_000)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+
+    # Caches and databases the server creates stay out of the working tree
+    os.chdir(tempfile.mkdtemp(prefix="generation-bench-"))
+    results = []
+    # Model loading and the server print progress; keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.retrieval:
+            seed_archive(args.archive_rows)
+        server = start_server(args)
+        url = f"http://127.0.0.1:{server.config.port}/generate-email"
+        try:
+            # Loads the model, so the first level doesn't include it
+            post(url, {"prompt": PROMPTS[0], "context": {"style_profile": None}, "use_cache": False}, args.timeout)
+            for concurrency in args.concurrency:
+                result = run_level(url, concurrency, args.requests, args.timeout)
+                results.append(result)
+                log(result)
+        finally:
+            server.should_exit = True
+
+    params = vars(args).copy()
+    params.pop("output")
+    write_report("generation", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
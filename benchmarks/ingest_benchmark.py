@@ -0,0 +1,119 @@
+"""
+IMAP ingest throughput against the local fake server (no network, no credentials).
+
+Runs the single-connection ImapSyncEngine and the parallel MailIngestPipeline over
+the same synthetic mailbox into a fresh database per run, and reports messages/s
+and wall time. `--latency-ms` adds a per-command delay to model a remote server,
+which is where extra connections pay off.
+
+    python benchmarks/ingest_benchmark.py --messages 5000 --connections 1 4 8 --latency-ms 20
+"""
+import argparse
+import contextlib
+import imaplib
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from _common import log, rate, write_report
+from fake_imap_server import FakeImapServer, synthetic_mailboxes
+
+from imap_sync import ImapSyncEngine
+from mail_ingest import MailIngestPipeline
+from storage import close_connections
+
+OWNER = "me@example.com"
+
+
+def local_connector(port):
+    """Same shape as mail_ingest.imap_connector, but plain IMAP to 127.0.0.1."""
+    def connector(account):
+        def connect():
+            conn = imaplib.IMAP4("127.0.0.1", port)
+            conn.login(account["user"], account["password"])
+            return conn
+        return connect
+    return connector
+
+
+def stored_counts(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*), COUNT(body) FROM emails").fetchone()
+    finally:
+        conn.close()
+
+
+def run_once(name, port, batch_size, work_dir, **pipeline_args):
+    db_path = os.path.join(work_dir, f"{name}.db")
+    account = {"user": OWNER, "password": "x", "folders": ["INBOX", "SENT"]}
+    started = time.perf_counter()
+    # The sync code reports progress with print(); keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        if name == "sync_engine":
+            ImapSyncEngine(local_connector(port)(account), OWNER, db_path, account["folders"], batch_size).sync()
+        else:
+            MailIngestPipeline([account], db_path, batch_size=batch_size, connector=local_connector(port),
+                               **pipeline_args).run()
+    seconds = time.perf_counter() - started
+    close_connections()
+    messages, bodies = stored_counts(db_path)
+    return {
+        "seconds": round(seconds, 3),
+        "messages": messages,
+        "bodies": bodies,
+        "messages_per_second": rate(messages, seconds),
+    }
+
+
+def run(messages, attachment_kb, latency_ms, connections, parse_workers, batch_size, seed):
+    folders = synthetic_mailboxes(messages, OWNER, attachment_kb=attachment_kb, seed=seed)
+    mailbox_mb = sum(len(raw) for raws in folders.values() for raw in raws) / 1e6
+    server = FakeImapServer(folders, latency_ms=latency_ms).start()
+    work_dir = tempfile.mkdtemp(prefix="ingest-bench-")
+    results = []
+    try:
+        result = {"engine": "sync_engine", "connections": 1, "parse_workers": 0,
+                  **run_once("sync_engine", server.port, batch_size, work_dir)}
+        results.append(result)
+        log(result)
+        for count in connections:
+            for workers in parse_workers:
+                name = f"pipeline_c{count}_w{workers}"
+                result = {"engine": "pipeline", "connections": count, "parse_workers": workers,
+                          **run_once(name, server.port, batch_size, work_dir,
+                                     connections_per_account=count, parse_workers=workers)}
+                results.append(result)
+                log(result)
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    for result in results:
+        result["mailbox_mb"] = round(mailbox_mb, 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--attachment-kb", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--parse-workers", type=int, nargs="+", default=[0, 2])
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    params = vars(args).copy()
+    params.pop("output")
+    results = run(args.messages, args.attachment_kb, args.latency_ms, args.connections, args.parse_workers,
+                  args.batch_size, args.seed)
+    write_report("ingest", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Embedding + FAISS query latency for /recommend on growing synthetic title corpora.
+
+Grows a browsing-history table in a temporary directory step by step, indexes it
+with BrowsingIndexManager.sync() (bulk embedding throughput), then times single
+recommend_for_queries() calls with unique query strings, split into embedding and
+FAISS search time. ann_index_benchmark.py compares index backends in isolation;
+this measures the whole query path.
+
+    python benchmarks/recommend_benchmark.py --sizes 1000 10000 50000
+    python benchmarks/recommend_benchmark.py --stub-encoder --backend hnsw   # no model download
+"""
+import argparse
+import contextlib
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+from _common import log, percentiles, rate, write_report
+
+TITLE_WORDS = [
+    "transformer", "models", "python", "react", "tutorial", "stocks", "crypto", "quantum", "guide",
+    "learning", "deep", "performance", "javascript", "css", "trading", "news", "release", "notes",
+    "benchmark", "llm", "fine-tuning", "qiskit", "investment", "docs", "recipe", "travel", "flights",
+    "hotel", "football", "weather", "kubernetes", "docker", "rust", "golang", "sql", "index",
+]
+
+
+class HashingEncoder:
+    """Deterministic bag-of-words vectors with the MiniLM shape, for offline runs."""
+
+    dim = 384
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=True, **kwargs):
+        import numpy as np
+
+        vectors = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+                vectors[row, int.from_bytes(digest[:4], "little") % self.dim] += 1.0
+                vectors[row, int.from_bytes(digest[4:], "little") % self.dim] += 0.5
+        if normalize_embeddings:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+
+def synthetic_titles(rng, start, count):
+    return [f"{' '.join(rng.choices(TITLE_WORDS, k=rng.randint(3, 7)))} {start + i}" for i in range(count)]
+
+
+def run(sizes, backend, n_queries, top_n, stub_encoder, seed):
+    # Every database and index file lives in a scratch directory
+    os.chdir(tempfile.mkdtemp(prefix="recommend-bench-"))
+    os.environ["BROWSING_INDEX_BACKEND"] = backend
+    from model_registry import registry
+
+    if stub_encoder:
+        registry.register("sentence_encoder", HashingEncoder)
+
+    from browsing_index import get_index_manager
+    from extract_browsing_history import DB_NAME, create_table
+    from faiss_browsing_ai import recommend_for_queries
+    from storage import executemany_batched
+
+    create_table()
+    manager = get_index_manager()
+    rng = random.Random(seed)
+    loaded = 0
+    results = []
+    for size in sorted(sizes):
+        titles = synthetic_titles(rng, loaded, size - loaded)
+        executemany_batched(DB_NAME, "INSERT INTO history (url, title, timestamp) VALUES (?, ?, ?)",
+                            ((f"https://example.com/{loaded + i}", title, "2024-01-01 00:00:00")
+                             for i, title in enumerate(titles)))
+        started = time.perf_counter()
+        manager.sync()
+        index_seconds = time.perf_counter() - started
+        loaded = size
+
+        embedding, search, total = [], [], []
+        for query in synthetic_titles(rng, 10_000_000 + size, n_queries):  # Unique, so never cached
+            timings = {}
+            started = time.perf_counter()
+            recommend_for_queries([query], top_n, backfill=False, timings=timings)
+            total.append((time.perf_counter() - started) * 1000)
+            embedding.append(timings["embedding_ms"])
+            search.append(timings["faiss_search_ms"])
+
+        result = {
+            "corpus_size": size,
+            "backend": backend,
+            "encoder": "hashing_stub" if stub_encoder else "sentence_encoder",
+            "index_seconds": round(index_seconds, 3),
+            "titles_indexed_per_second": rate(len(titles), index_seconds),
+            "embedding": percentiles(embedding),
+            "faiss_search": percentiles(search),
+            "total": percentiles(total),
+        }
+        results.append(result)
+        log(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 50_000])
+    parser.add_argument("--backend", default="flat", choices=["flat", "ivf_flat", "ivf_pq", "hnsw"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--stub-encoder", action="store_true", help="hashing encoder instead of MiniLM")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run(args.sizes, args.backend, args.queries, args.top_n, args.stub_encoder, args.seed)
+    params = vars(args).copy()
+    params.pop("output")
+    write_report("recommend", params, results, output)
+
+
+if __name__ == "__main__":
+    main()
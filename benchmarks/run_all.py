@@ -0,0 +1,68 @@
+"""
+Runs the benchmark suite and writes one combined JSON report.
+
+Each benchmark runs in its own process (they configure models and environment at
+import time). The default sizes finish in a few minutes on a laptop and need no
+network: generation uses the stub model and recommendations the hashing encoder
+unless --real-models is given.
+
+    python benchmarks/run_all.py --output bench-$(git rev-parse --short HEAD).json
+    python benchmarks/compare.py bench-old.json bench-new.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from _common import environment, log
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# name → (script, quick arguments)
+SUITE = {
+    "sqlite": ("sqlite_benchmark.py", ["--rows", "10000", "50000", "--insert-rows", "5000"]),
+    "ingest": ("ingest_benchmark.py", ["--messages", "2000", "--connections", "1", "4", "--latency-ms", "5"]),
+    "recommend": ("recommend_benchmark.py", ["--sizes", "1000", "10000", "--queries", "100"]),
+    "ann_index": ("ann_index_benchmark.py", ["--sizes", "10000", "50000", "--queries", "100"]),
+    "generation": ("generation_benchmark.py", ["--concurrency", "1", "2", "4", "--requests", "16"]),
+}
+
+
+def run_benchmark(name, real_models, extra_args=()):
+    script, arguments = SUITE[name]
+    arguments = list(arguments) + list(extra_args)
+    if name == "recommend" and not real_models:
+        arguments.append("--stub-encoder")
+    completed = subprocess.run([sys.executable, os.path.join(HERE, script), *arguments],
+                               stdout=subprocess.PIPE, text=True)
+    if completed.returncode != 0:
+        return {"benchmark": name, "error": f"exited with status {completed.returncode}"}
+    return json.loads(completed.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=list(SUITE), help="run just these benchmarks")
+    parser.add_argument("--real-models", action="store_true", help="use the sentence encoder instead of the stub")
+    parser.add_argument("--model-path", help="small GGUF for the generation benchmark (default: stub model)")
+    parser.add_argument("--output", help="also write the combined JSON report to this file")
+    args = parser.parse_args()
+
+    reports = {}
+    for name in args.only or SUITE:
+        extra = ["--model-path", args.model_path] if name == "generation" and args.model_path else []
+        reports[name] = run_benchmark(name, args.real_models, extra)
+        log({"benchmark": name, "done": "error" not in reports[name]})
+
+    suite = {"benchmark": "suite", "environment": environment(), "reports": reports}
+    print(json.dumps(suite, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(suite, f, indent=2)
+    if any("error" in report for report in reports.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
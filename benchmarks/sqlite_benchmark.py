@@ -0,0 +1,145 @@
+"""
+SQLite insert and query rates on a synthetic `emails` table of increasing size.
+
+Inserts go through the real schema (migrations, FTS5 triggers, indexes) three ways:
+one commit per row (the old store_email path), executemany_batched and BatchWriter.
+Queries cover the request-path lookups: FTS search (search_emails), the retrieval
+stage (mail_retrieval) and the sent-mail scan behind the style profile.
+
+    python benchmarks/sqlite_benchmark.py --rows 10000 100000
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from _common import log, percentiles, rate, write_report
+
+from database import correspondent_address, ensure_schema, parse_address
+from email_search import search_emails
+from imap_sync import INSERT_EMAIL_SQL
+from mail_retrieval import build_retrieval_context
+from storage import BatchWriter, close_connections, executemany_batched, get_connection
+
+OWNER = "me@example.com"
+VOCABULARY = [f"term{i}" for i in range(5000)] + [
+    "budget", "project", "dinner", "invoice", "meeting", "launch", "contract", "travel", "hiring", "review",
+]
+QUERIES = ["budget review", "dinner", "invoice contract", "launch meeting", "travel", "hiring plan"]
+
+
+def synthetic_rows(count, seed, start=0):
+    """Rows for INSERT_EMAIL_SQL with Zipf-like word frequencies, like real mail."""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+    rows = []
+    for i in range(start, start + count):
+        contact = f"contact{rng.randint(1, 500)}@example.com"
+        sent = rng.random() < 0.2
+        sender = OWNER if sent else f"Contact <{contact}>"
+        recipient = contact if sent else OWNER
+        direction = "sent" if sent else "received"
+        sender_address = parse_address(sender)
+        body = " ".join(rng.choices(VOCABULARY, weights, k=rng.randint(40, 200)))
+        rows.append((
+            f"bench:{i}", sender, recipient, " ".join(rng.choices(VOCABULARY[-10:], k=3)), body,
+            "", "SENT" if sent else "INBOX", OWNER, "INBOX", i, 1, f"<{i}@example.com>", None,
+            sender_address, 1_600_000_000 + i * 60, direction,
+            correspondent_address(direction, sender_address, recipient),
+        ))
+    return rows
+
+
+def timed_queries(fn, args_list, repeat):
+    samples = []
+    for _ in range(repeat):
+        for args in args_list:
+            started = time.perf_counter()
+            fn(*args)
+            samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def bench_inserts(work_dir, rows):
+    results = []
+    for method in ("per_row_commit", "executemany_batched", "batch_writer"):
+        db_path = os.path.join(work_dir, f"insert_{method}.db")
+        ensure_schema(db_path)
+        started = time.perf_counter()
+        if method == "per_row_commit":
+            conn = get_connection(db_path)
+            for row in rows:
+                conn.execute(INSERT_EMAIL_SQL, row)
+                conn.commit()
+        elif method == "executemany_batched":
+            executemany_batched(db_path, INSERT_EMAIL_SQL, rows)
+        else:
+            with BatchWriter(db_path, INSERT_EMAIL_SQL) as writer:
+                for row in rows:
+                    writer.add(row)
+        seconds = time.perf_counter() - started
+        result = {"operation": "insert", "method": method, "rows": len(rows),
+                  "seconds": round(seconds, 3), "rows_per_second": rate(len(rows), seconds)}
+        results.append(result)
+        log(result)
+    return results
+
+
+def bench_queries(db_path, size, repeat):
+    conn = get_connection(db_path)
+    contacts = [row[0] for row in conn.execute(
+        "SELECT correspondent FROM emails WHERE correspondent IS NOT NULL GROUP BY correspondent LIMIT 20")]
+    cases = {
+        "search_emails": (lambda q: search_emails(q, db_path=db_path), [(q,) for q in QUERIES]),
+        "retrieval": (lambda q, c: build_retrieval_context(f"Write to {c} about {q}", c, db_path=db_path),
+                      [(q, c) for q, c in zip(QUERIES * 4, contacts)]),
+        "sent_mail_scan": (lambda: conn.execute(
+            "SELECT body FROM emails WHERE sender_address = ? ORDER BY sent_at DESC LIMIT 500", (OWNER,)
+        ).fetchall(), [()]),
+    }
+    results = []
+    for name, (fn, args_list) in cases.items():
+        samples = timed_queries(fn, args_list, repeat)
+        result = {"operation": "query", "query": name, "rows": size,
+                  "queries_per_second": rate(len(samples), sum(samples) / 1000), **percentiles(samples)}
+        results.append(result)
+        log(result)
+    return results
+
+
+def run(sizes, insert_rows, repeat, seed):
+    work_dir = tempfile.mkdtemp(prefix="sqlite-bench-")
+    try:
+        results = bench_inserts(work_dir, synthetic_rows(insert_rows, seed))
+        db_path = os.path.join(work_dir, "queries.db")
+        ensure_schema(db_path)
+        loaded = 0
+        for size in sorted(sizes):
+            executemany_batched(db_path, INSERT_EMAIL_SQL, synthetic_rows(size - loaded, seed + 1, loaded))
+            loaded = size
+            get_connection(db_path).execute("ANALYZE")
+            results += bench_queries(db_path, size, repeat)
+    finally:
+        close_connections()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 50_000], help="table sizes for queries")
+    parser.add_argument("--insert-rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    params = vars(args).copy()
+    params.pop("output")
+    write_report("sqlite", params, run(args.rows, args.insert_rows, args.repeat, args.seed), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import os
+import re
+import threading
+import numpy as np
+from model_registry import registry
+
+# Categorization rules (first matching category wins)
+CATEGORIES = {
+    "AI": ["machine learning", "deep learning", "GPT", "transformer", "LLM"],
+    "Web Dev": ["JavaScript", "React", "Next.js", "Tailwind", "CSS"],
+    "Finance": ["stocks", "crypto", "trading", "investment"],
+    "Quantum Computing": ["quantum", "Qiskit", "superposition"]
+}
+
+# Fall back to embedding similarity with category centroids when no rule matches
+CATEGORY_EMBEDDING_FALLBACK = os.getenv("CATEGORY_EMBEDDING_FALLBACK", "0") == "1"
+# Minimum cosine similarity to a centroid for the fallback to pick a category
+CATEGORY_SIMILARITY_THRESHOLD = float(os.getenv("CATEGORY_SIMILARITY_THRESHOLD", "0.35"))
+# Extract and store KeyBERT keywords per title (off: KeyBERT is never loaded)
+BROWSING_STORE_KEYWORDS = os.getenv("BROWSING_STORE_KEYWORDS", "0") == "1"
+
+DEFAULT_CATEGORY = "Other"
+
+
+def _load_keyword_model():
+    from keybert import KeyBERT
+    # Reuse the already-loaded sentence encoder instead of a second copy
+    return KeyBERT(model=registry.get("sentence_encoder"))
+
+
+registry.register("keyword_model", _load_keyword_model)
+
+
+class TitleCategorizer:
+    """
+    Assigns a category to batches of titles.
+
+    All rule terms are compiled into one case-insensitive regex, so each title is
+    scanned once no matter how many terms there are. Terms match at the start of a
+    word ("LLM" matches "LLMs", "CSS" no longer matches "access"). Titles no rule
+    matches can optionally be compared with per-category embedding centroids, which
+    are computed once from the rule terms; titles are embedded through the cached
+    embedding service, so titles that are also indexed cost no extra model calls.
+    """
+
+    def __init__(self, categories=CATEGORIES, embedding_fallback=CATEGORY_EMBEDDING_FALLBACK,
+                 similarity_threshold=CATEGORY_SIMILARITY_THRESHOLD):
+        self.categories = list(categories)
+        self.rules = categories
+        self.embedding_fallback = embedding_fallback
+        self.similarity_threshold = similarity_threshold
+        self._term_category = {}
+        for category, terms in categories.items():
+            for term in terms:
+                self._term_category.setdefault(term.lower(), category)
+        # Longest terms first so "deep learning" wins over a shorter overlapping term
+        alternation = "|".join(re.escape(term) for term in sorted(self._term_category, key=len, reverse=True))
+        self._pattern = re.compile(rf"(?<!\w)(?:{alternation})", re.IGNORECASE) if alternation else None
+        self._priority = {category: i for i, category in enumerate(self.categories)}
+        self._centroids = None
+        self._centroid_lock = threading.Lock()
+
+    def match(self, title):
+        """The highest-priority category whose terms appear in `title`, or None."""
+        if not self._pattern or not title:
+            return None
+        best = None
+        for found in self._pattern.finditer(title):
+            category = self._term_category[found.group(0).lower()]
+            if best is None or self._priority[category] < self._priority[best]:
+                best = category
+                if self._priority[best] == 0:
+                    break
+        return best
+
+    def _category_centroids(self):
+        with self._centroid_lock:
+            if self._centroids is None:
+                from embedding_service import embedding_service
+                centroids = []
+                for category in self.categories:
+                    vectors = embedding_service.embed_many(self.rules[category])
+                    centroid = vectors.mean(axis=0)
+                    centroids.append(centroid / (np.linalg.norm(centroid) or 1.0))
+                self._centroids = np.stack(centroids).astype(np.float32)
+            return self._centroids
+
+    def categorize(self, titles):
+        """Returns one category per title, in order."""
+        results = [self.match(title) for title in titles]
+
+        unmatched = [i for i, category in enumerate(results) if category is None and titles[i]]
+        if self.embedding_fallback and unmatched and self.categories:
+            from embedding_service import embedding_service
+            vectors = embedding_service.embed_many([titles[i] for i in unmatched])
+            similarities = vectors @ self._category_centroids().T
+            best = similarities.argmax(axis=1)
+            for i, column, score in zip(unmatched, best, similarities[np.arange(len(unmatched)), best]):
+                if score >= self.similarity_threshold:
+                    results[i] = self.categories[column]
+
+        return [category or DEFAULT_CATEGORY for category in results]
+
+
+def extract_keywords(titles, top_n=3):
+    """KeyBERT keyphrases per title, as comma-separated strings (one batched model call)."""
+    if not titles:
+        return []
+    keywords = registry.get("keyword_model").extract_keywords(
+        list(titles), keyphrase_ngram_range=(1, 2), stop_words="english", top_n=top_n
+    )
+    # A single document comes back as a flat list
+    if len(titles) == 1:
+        keywords = [keywords]
+    return [", ".join(phrase for phrase, _ in found) for found in keywords]
+
+
+_default_categorizer = None
+
+
+def categorize_titles(titles):
+    """Categorizes a batch of titles with the default rules."""
+    global _default_categorizer
+    if _default_categorizer is None:
+        _default_categorizer = TitleCategorizer()
+    return _default_categorizer.categorize(list(titles))
@@ -0,0 +1,365 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import faiss
+import numpy as np
+from embedding_service import embedding_service
+from metrics import faiss_search_seconds
+from storage import get_connection, transaction
+
+DB_NAME = os.getenv("BROWSING_DB", "browsing_history.db")
+INDEX_PATH = os.getenv("BROWSING_INDEX", "browsing_history.index")
+
+# Index type: "flat" (exact scan), "ivf_flat", "ivf_pq" or "hnsw" (approximate)
+INDEX_BACKEND = os.getenv("BROWSING_INDEX_BACKEND", "flat").lower()
+# Approximate backends only pay off (and IVF can only be trained) on larger corpora;
+# below this many vectors the index stays flat and is converted once it grows past it
+ANN_TRAIN_THRESHOLD = int(os.getenv("BROWSING_INDEX_ANN_THRESHOLD", "10000"))
+# Default per-query search breadth for IVF (lists probed) and HNSW (candidate list size)
+DEFAULT_NPROBE = int(os.getenv("BROWSING_INDEX_NPROBE", "16"))
+DEFAULT_EF_SEARCH = int(os.getenv("BROWSING_INDEX_EF_SEARCH", "64"))
+HNSW_M = int(os.getenv("BROWSING_INDEX_HNSW_M", "32"))
+
+BACKENDS = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+
+def _ivf_list_count(n):
+    # ~4·sqrt(n) lists, while keeping ≥39 training points per list as FAISS recommends
+    return max(1, min(int(4 * np.sqrt(n)), n // 39, 65536))
+
+
+def _pq_subquantizers(d):
+    # 8-dim sub-vectors (48 bytes per vector for MiniLM's 384 dims)
+    for m in (d // 8, d // 12, d // 16, 1):
+        if m >= 1 and d % m == 0:
+            return m
+    return 1
+
+
+def build_index(backend, vectors, ids):
+    """
+    Builds an ID-mapped inner-product index of the given backend over `vectors`.
+
+    IVF backends are trained on the vectors themselves, so they need at least a few
+    thousand of them; `vectors` must be L2-normalized float32.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown index backend '{backend}' (expected one of {', '.join(BACKENDS)})")
+    d = vectors.shape[1]
+    if backend == "flat":
+        inner = faiss.IndexFlatIP(d)
+    elif backend == "hnsw":
+        inner = faiss.IndexHNSWFlat(d, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    else:
+        nlist = _ivf_list_count(len(vectors))
+        if backend == "ivf_flat":
+            inner = faiss.index_factory(d, f"IVF{nlist},Flat", faiss.METRIC_INNER_PRODUCT)
+        else:
+            inner = faiss.index_factory(d, f"IVF{nlist},PQ{_pq_subquantizers(d)}", faiss.METRIC_INNER_PRODUCT)
+        inner.train(vectors)
+
+    index = faiss.IndexIDMap(inner)
+    if len(vectors):
+        index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    return index
+
+
+def index_backend(index):
+    """Names the backend of an ID-mapped index."""
+    inner = faiss.downcast_index(index.index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """Applies per-query search breadth to an ID-mapped index."""
+    inner = faiss.downcast_index(index.index)
+    if isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = nprobe or DEFAULT_NPROBE
+    elif isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = ef_search or DEFAULT_EF_SEARCH
+
+
+def ensure_delete_tracking(conn):
+    """Records deleted history ids so the index can drop their vectors on the next sync."""
+    conn.execute("CREATE TABLE IF NOT EXISTS history_deleted (id INTEGER PRIMARY KEY)")
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS history_track_deletes AFTER DELETE ON history
+    BEGIN
+        INSERT OR IGNORE INTO history_deleted (id) VALUES (old.id);
+    END
+    """)
+
+
+class BrowsingIndexManager:
+    """
+    Keeps the FAISS index of history titles resident and up to date.
+
+    Vectors are stored in an `IndexIDMap` under their SQLite `history.id`. New rows are
+    added incrementally above a watermark (the last indexed id), deleted rows are removed
+    via the `history_deleted` tombstone table, and the index is written atomically with
+    its watermark. Other processes pick up a newer index file on their next query.
+
+    With an approximate `backend`, the index starts flat and is rebuilt as that backend
+    (trained on the indexed vectors) once it holds `train_threshold` vectors.
+    """
+
+    def __init__(self, db_path=DB_NAME, index_path=INDEX_PATH, backend=INDEX_BACKEND,
+                 train_threshold=ANN_TRAIN_THRESHOLD):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown index backend '{backend}' (expected one of {', '.join(BACKENDS)})")
+        self.db_path = db_path
+        self.index_path = index_path
+        self.backend = backend
+        self.train_threshold = train_threshold
+        self.meta_path = f"{index_path}.meta.json"
+        self.index = None
+        self.id_to_title = {}
+        self.watermark = 0
+        self._mtime = None
+        self._dirty = False
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    # 🔹 Loading & persistence
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def load(self):
+        """Loads the index file, its watermark and the id → title mapping."""
+        with self._lock:
+            mtime = self._file_mtime()
+            if mtime is not None:
+                self.index = faiss.read_index(self.index_path)
+                try:
+                    with open(self.meta_path) as f:
+                        self.watermark = json.load(f).get("watermark", 0)
+                except FileNotFoundError:
+                    self.watermark = int(faiss.vector_to_array(self.index.id_map).max(initial=0))
+            else:
+                self.index = None
+                self.watermark = 0
+
+            try:
+                rows = get_connection(self.db_path).execute(
+                    "SELECT id, title FROM history WHERE id <= ? AND title IS NOT NULL AND title != ''",
+                    (self.watermark,),
+                ).fetchall()
+            except sqlite3.OperationalError:
+                rows = []  # History table not created yet
+
+            self.id_to_title = dict(rows)
+            self._mtime = mtime
+            self._dirty = False
+            self._loaded = True
+
+    def ensure_loaded(self):
+        """Loads on first use, and reloads if another process rewrote the index file."""
+        with self._lock:
+            if not self._loaded or (not self._dirty and self._file_mtime() != self._mtime):
+                self.load()
+
+    def save(self):
+        """Writes the index and watermark atomically (temp file + rename)."""
+        with self._lock:
+            if self.index is None or not self._dirty:
+                return
+            tmp_index = f"{self.index_path}.tmp"
+            faiss.write_index(self.index, tmp_index)
+            os.replace(tmp_index, self.index_path)
+
+            tmp_meta = f"{self.meta_path}.tmp"
+            with open(tmp_meta, "w") as f:
+                json.dump({
+                    "watermark": self.watermark,
+                    "count": self.index.ntotal,
+                    "backend": index_backend(self.index),
+                }, f)
+            os.replace(tmp_meta, self.meta_path)
+
+            self._mtime = self._file_mtime()
+            self._dirty = False
+
+    # 🔹 Incremental updates
+
+    def _embed(self, titles):
+        # Cached by content hash, so rebuilds never re-encode unchanged titles
+        return embedding_service.embed_many(titles)
+
+    def add(self, rows):
+        """Adds (id, title) rows that are not indexed yet."""
+        with self._lock:
+            self.ensure_loaded()
+            rows = [(row_id, title) for row_id, title in rows
+                    if title and row_id not in self.id_to_title]
+            if not rows:
+                return 0
+
+            ids, titles = zip(*rows)
+            embeddings = self._embed(titles)
+            if self.index is None:
+                self.index = build_index("flat", embeddings[:0], [])
+            self.index.add_with_ids(embeddings, np.array(ids, dtype=np.int64))
+
+            self.id_to_title.update(rows)
+            self.watermark = max(self.watermark, max(ids))
+            self._dirty = True
+            self._maybe_convert()
+            return len(rows)
+
+    def _stored_vectors(self):
+        """Vectors and ids currently in the index, in storage order."""
+        inner = faiss.downcast_index(self.index.index)
+        if isinstance(inner, faiss.IndexIVF):
+            inner.make_direct_map()
+        vectors = inner.reconstruct_n(0, inner.ntotal)
+        return vectors, faiss.vector_to_array(self.index.id_map)
+
+    def _maybe_convert(self):
+        """Switches a flat index to the configured approximate backend once it is big enough."""
+        if (self.backend == "flat" or self.index.ntotal < self.train_threshold
+                or index_backend(self.index) != "flat"):
+            return
+        vectors, ids = self._stored_vectors()
+        print(f"🔹 Training {self.backend} index on {len(ids)} vectors...")
+        self.index = build_index(self.backend, vectors, ids)
+
+    def remove(self, ids):
+        """Removes the vectors of deleted history rows."""
+        with self._lock:
+            self.ensure_loaded()
+            if self.index is None:
+                return 0
+            # Check against the index itself: after a reload id_to_title only holds rows
+            # still in `history`, so deleted rows are never in it
+            ids = np.intersect1d(np.array(list(ids), dtype=np.int64), faiss.vector_to_array(self.index.id_map))
+            if not len(ids):
+                return 0
+            if index_backend(self.index) == "hnsw":
+                # HNSW graphs cannot drop nodes, so rebuild from the remaining vectors
+                vectors, stored_ids = self._stored_vectors()
+                keep = ~np.isin(stored_ids, ids)
+                self.index = build_index("hnsw", vectors[keep], stored_ids[keep])
+            else:
+                self.index.remove_ids(ids)
+            for row_id in ids.tolist():
+                self.id_to_title.pop(row_id, None)
+            self._dirty = True
+            return len(ids)
+
+    def sync(self, batch_size=1024):
+        """Indexes rows above the watermark and drops deleted ones, then saves."""
+        with self._lock:
+            self.ensure_loaded()
+            with transaction(self.db_path) as conn:
+                ensure_delete_tracking(conn)
+            deleted = [row[0] for row in conn.execute("SELECT id FROM history_deleted")]
+            removed = self.remove(deleted)
+
+            cursor = conn.execute(
+                "SELECT id, title FROM history WHERE id > ? ORDER BY id", (self.watermark,)
+            )
+            added = 0
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                added += self.add(rows)
+                # Rows without a title are skipped but still move the watermark
+                self.watermark = max(self.watermark, rows[-1][0])
+                self._dirty = True
+
+            self.save()
+            # Only forget tombstones once the removal is on disk
+            if deleted:
+                with transaction(self.db_path) as conn:
+                    conn.executemany("DELETE FROM history_deleted WHERE id = ?", [(i,) for i in deleted])
+            return {"added": added, "removed": removed, "total": self.index.ntotal if self.index else 0}
+
+    def rebuild(self):
+        """Drops the index and re-embeds every titled row (using the configured backend)."""
+        with self._lock:
+            self.index = None
+            self.id_to_title = {}
+            self.watermark = 0
+            self._loaded = True
+            self._dirty = True
+            return self.sync()
+
+    # 🔹 Queries
+
+    def search(self, query_embeddings, k, nprobe=None, ef_search=None):
+        """
+        Returns FAISS (scores, ids) for already-normalized float32 query embeddings.
+
+        `nprobe` (IVF) and `ef_search` (HNSW) trade recall for speed per query; they are
+        ignored by the flat index.
+        """
+        with self._lock:
+            self.ensure_loaded()
+            if self.index is None or self.index.ntotal == 0:
+                empty = np.empty((len(query_embeddings), 0))
+                return empty, empty.astype(np.int64)
+            set_search_params(self.index, nprobe, ef_search)
+            with faiss_search_seconds.time(backend=index_backend(self.index)):
+                return self.index.search(query_embeddings, k)
+
+    def title(self, row_id):
+        return self.id_to_title.get(int(row_id))
+
+    def random_titles(self, count, exclude=(), max_attempts=20):
+        """
+        Picks up to `count` distinct random titles not in `exclude`.
+
+        Samples ids between 1 and the watermark and keeps the ones still indexed, which
+        costs O(count) lookups instead of sorting the whole table with ORDER BY RANDOM().
+        """
+        with self._lock:
+            self.ensure_loaded()
+            if not self.id_to_title or count <= 0:
+                return []
+            picked = []
+            seen = set(exclude)
+            for _ in range(count * max_attempts):
+                title = self.id_to_title.get(random.randint(1, self.watermark))
+                if title and title not in seen:
+                    seen.add(title)
+                    picked.append(title)
+                    if len(picked) >= count:
+                        break
+            return picked
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_index_manager():
+    """Process-wide index manager shared by ingest and recommendation code."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = BrowsingIndexManager()
+        return _manager
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Usage: python browsing_index.py [--rebuild] [--backend flat|ivf_flat|ivf_pq|hnsw]
+    manager = get_index_manager()
+    if "--backend" in sys.argv:
+        manager.backend = sys.argv[sys.argv.index("--backend") + 1]
+    stats = manager.rebuild() if "--rebuild" in sys.argv else manager.sync()
+    print(f"✅ FAISS index synced: {stats}")
@@ -0,0 +1,146 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime
+from browsing_index import get_index_manager
+from extract_browsing_history import DB_NAME, create_table, store_browsing_batch
+from storage import get_connection, transaction
+
+# Chrome's History database (close Chrome or rely on the copy taken below)
+if sys.platform == "darwin":
+    _DEFAULT_HISTORY = "~/Library/Application Support/Google/Chrome/Default/History"
+elif sys.platform.startswith("win"):
+    _DEFAULT_HISTORY = os.path.join(os.getenv("LOCALAPPDATA", ""), "Google/Chrome/User Data/Default/History")
+else:
+    _DEFAULT_HISTORY = "~/.config/google-chrome/Default/History"
+CHROME_HISTORY_PATH = os.path.expanduser(os.getenv("CHROME_HISTORY_PATH", _DEFAULT_HISTORY))
+# Visits read and stored per transaction
+CHROME_IMPORT_BATCH = int(os.getenv("CHROME_IMPORT_BATCH", "2000"))
+
+# WebKit timestamps count microseconds since 1601-01-01 (UTC)
+_WEBKIT_EPOCH_OFFSET = 11644473600
+
+
+def webkit_to_unix(webkit_time):
+    """Converts a Chrome/WebKit timestamp to Unix seconds (None for 0/empty)."""
+    if not webkit_time:
+        return None
+    return webkit_time / 1_000_000 - _WEBKIT_EPOCH_OFFSET
+
+
+def webkit_to_timestamp(webkit_time):
+    """Formats a WebKit timestamp like the rest of `history.timestamp` (local time)."""
+    unix = webkit_to_unix(webkit_time)
+    return datetime.fromtimestamp(unix).strftime("%Y-%m-%d %H:%M:%S") if unix is not None else None
+
+
+def ensure_import_state(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS import_state (
+        source TEXT PRIMARY KEY,
+        last_visit_id INTEGER
+    )
+    """)
+
+
+def copy_history(path):
+    """Copies the History file (and its journal) so a running Chrome's lock doesn't matter."""
+    tmp_dir = tempfile.mkdtemp(prefix="chrome-history-")
+    copy = os.path.join(tmp_dir, "History")
+    shutil.copy2(path, copy)
+    for suffix in ("-journal", "-wal"):
+        if os.path.exists(path + suffix):
+            shutil.copy2(path + suffix, copy + suffix)
+    return copy
+
+
+def iter_visits(history_path, after_visit_id=0, batch_size=CHROME_IMPORT_BATCH):
+    """
+    Yields lists of (visit_id, url, title, webkit_time) in visit-id order.
+
+    Reads keyset-paginated chunks, so memory stays flat for any history size.
+    """
+    source = sqlite3.connect(f"file:{history_path}?mode=ro", uri=True)
+    try:
+        last_id = after_visit_id
+        while True:
+            rows = source.execute("""
+            SELECT v.id, u.url, u.title, v.visit_time
+            FROM visits v JOIN urls u ON u.id = v.url
+            WHERE v.id > ?
+            ORDER BY v.id
+            LIMIT ?
+            """, (last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+    finally:
+        source.close()
+
+
+def import_chrome_history(history_path=CHROME_HISTORY_PATH, batch_size=CHROME_IMPORT_BATCH, copy=True):
+    """
+    Imports new visits from a Chrome History database into browsing_history.db.
+
+    Continues from the last imported visit id; each chunk (rows, refreshed timestamps
+    and the new watermark) is committed in one transaction.
+
+    Returns:
+        dict: {"visits": visits read, "added": new history rows, "last_visit_id": watermark}
+    """
+    if not os.path.exists(history_path):
+        raise FileNotFoundError(f"Chrome History database not found at {history_path}")
+    create_table()
+    conn = get_connection(DB_NAME)
+    ensure_import_state(conn)
+    source = os.path.abspath(history_path)
+    row = conn.execute("SELECT last_visit_id FROM import_state WHERE source = ?", (source,)).fetchone()
+    last_visit_id = row[0] if row else 0
+
+    read_path = copy_history(history_path) if copy else history_path
+    visits = added = 0
+    try:
+        for chunk in iter_visits(read_path, last_visit_id, batch_size):
+            visits += len(chunk)
+            # Latest visit per URL within the chunk (visit ids don't follow visit times)
+            latest = {}
+            for _, url, title, visit_time in chunk:
+                if url.startswith(("http://", "https://")) and title:
+                    if url not in latest or visit_time > latest[url][0]:
+                        latest[url] = (visit_time, title)
+            rows = [(url, title, webkit_to_timestamp(visit_time)) for url, (visit_time, title) in latest.items()]
+
+            with transaction(DB_NAME):
+                new_rows = store_browsing_batch(rows)
+                # URLs already stored keep their row (and vector) but move to the newest visit
+                conn.executemany(
+                    "UPDATE history SET timestamp = ? WHERE url = ? AND (timestamp IS NULL OR timestamp < ?)",
+                    [(timestamp, url, timestamp) for url, _, timestamp in rows],
+                )
+                last_visit_id = chunk[-1][0]
+                conn.execute(
+                    "INSERT OR REPLACE INTO import_state (source, last_visit_id) VALUES (?, ?)",
+                    (source, last_visit_id),
+                )
+            # Index the new titles only once they are committed (in memory; saved after the import)
+            if new_rows:
+                get_index_manager().add(new_rows)
+            added += len(new_rows)
+    finally:
+        if copy:
+            shutil.rmtree(os.path.dirname(read_path), ignore_errors=True)
+
+    get_index_manager().save()
+    return {"visits": visits, "added": added, "last_visit_id": last_visit_id}
+
+
+if __name__ == "__main__":
+    try:
+        path = sys.argv[1] if len(sys.argv) > 1 else CHROME_HISTORY_PATH
+        stats = import_chrome_history(path)
+        print(f"✅ Chrome history imported: {stats}")
+    except Exception as e:
+        print(f"❌ Error importing Chrome history: {e}")
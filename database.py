@@ -1,11 +1,204 @@
+import os
 import sqlite3
+from datetime import datetime, timezone
+from email.utils import getaddresses, parseaddr, parsedate_to_datetime
+from storage import get_connection
 
 # Database file name
 DB_NAME = "emails.db"
 
-def create_email_table():
-    """Creates the emails table if it doesn't exist."""
-    conn = sqlite3.connect(DB_NAME)
+
+# 🔹 Normalized columns (computed once at ingest)
+
+def parse_address(header):
+    """Lower-cased bare address from a From/To header ("Ann <ann@x.com>" → "ann@x.com")."""
+    return parseaddr(header or "")[1].strip().lower() or None
+
+
+def parse_timestamp(header):
+    """Unix epoch seconds from an RFC 2822 Date header (or ISO timestamp), or None."""
+    if not header:
+        return None
+    try:
+        parsed = parsedate_to_datetime(header)
+    except (TypeError, ValueError, IndexError):
+        try:
+            parsed = datetime.fromisoformat(header)
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def email_direction(sender_address, label, account=None):
+    """"sent" for mail from the account owner (or stored under the SENT label), else "received"."""
+    owner = (account or os.getenv("USER_EMAIL") or os.getenv("EMAIL_USER") or "").strip().lower()
+    if (label or "").upper() == "SENT" or (owner and sender_address == owner):
+        return "sent"
+    return "received"
+
+
+def correspondent_address(direction, sender_address, recipient):
+    """The other party of an email: the first To address of sent mail, else the sender."""
+    if direction == "sent":
+        for _, address in getaddresses([recipient or ""]):
+            if address:
+                return address.strip().lower()
+        return None
+    return sender_address
+
+
+# 🔹 Migrations
+
+def _migrate_imap_sync(cursor):
+    # IMAP sync columns (ignore if they already exist)
+    for column in ("account TEXT", "folder TEXT", "uid INTEGER", "uidvalidity INTEGER",
+                   "message_id TEXT", "body_part TEXT"):
+        try:
+            cursor.execute(f"ALTER TABLE emails ADD COLUMN {column};")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
+    # Per-folder UID watermark used by imap_sync for incremental, resumable syncs
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS sync_state (
+        account TEXT,
+        folder TEXT,
+        uidvalidity INTEGER,
+        last_uid INTEGER,
+        PRIMARY KEY (account, folder)
+    )
+    """)
+
+
+def _migrate_typed_columns(cursor):
+    for column in ("sender_address TEXT", "sent_at INTEGER", "direction TEXT"):
+        try:
+            cursor.execute(f"ALTER TABLE emails ADD COLUMN {column};")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
+    # Backfill rows stored before these columns existed
+    rows = cursor.execute("SELECT id, sender, timestamp, label, account FROM emails").fetchall()
+    updates = []
+    for row_id, sender, timestamp, label, account in rows:
+        address = parse_address(sender)
+        updates.append((address, parse_timestamp(timestamp), email_direction(address, label, account), row_id))
+    cursor.executemany("UPDATE emails SET sender_address = ?, sent_at = ?, direction = ? WHERE id = ?", updates)
+
+    # Newest-first lookups by sender or direction are index seeks; label is included
+    # so the Trash/Spam filter is checked without touching the table
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_emails_sender_sent_at ON emails (sender_address, sent_at DESC, label)
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_emails_direction_sent_at ON emails (direction, sent_at DESC, label)
+    """)
+
+
+def _migrate_full_text_search(cursor):
+    # External-content FTS5 index: stores only the index, reads text from `emails`
+    cursor.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts USING fts5(
+        subject, body, sender,
+        content='emails', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """)
+
+    # Keep it in sync with every write to emails (bodies are filled in by UPDATE)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS emails_fts_insert AFTER INSERT ON emails BEGIN
+        INSERT INTO emails_fts (rowid, subject, body, sender) VALUES (new.id, new.subject, new.body, new.sender);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS emails_fts_delete AFTER DELETE ON emails BEGIN
+        INSERT INTO emails_fts (emails_fts, rowid, subject, body, sender)
+        VALUES ('delete', old.id, old.subject, old.body, old.sender);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS emails_fts_update AFTER UPDATE OF subject, body, sender ON emails BEGIN
+        INSERT INTO emails_fts (emails_fts, rowid, subject, body, sender)
+        VALUES ('delete', old.id, old.subject, old.body, old.sender);
+        INSERT INTO emails_fts (rowid, subject, body, sender) VALUES (new.id, new.subject, new.body, new.sender);
+    END
+    """)
+
+    # Index the mail stored before this migration
+    cursor.execute("INSERT INTO emails_fts (emails_fts) VALUES ('rebuild')")
+
+
+def _migrate_style_profile(cursor):
+    # Per-email writing-style statistics, computed once per sent email (style_profile.py)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS email_style_stats (
+        email_id INTEGER PRIMARY KEY,
+        polarity REAL,
+        words INTEGER,
+        sentences INTEGER,
+        has_emoji INTEGER,
+        has_bullets INTEGER
+    )
+    """)
+
+    # Running aggregates per sender address, advanced past `watermark` (emails.id)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS style_profiles (
+        owner TEXT PRIMARY KEY,
+        watermark INTEGER,
+        emails INTEGER,
+        polarity_sum REAL,
+        words INTEGER,
+        sentences INTEGER,
+        emoji_emails INTEGER,
+        bullet_emails INTEGER,
+        trigrams TEXT,
+        updated_at REAL
+    )
+    """)
+
+
+def _migrate_correspondent(cursor):
+    # Who the mail was exchanged with, so a recipient's prior thread is an index seek
+    try:
+        cursor.execute("ALTER TABLE emails ADD COLUMN correspondent TEXT;")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
+    rows = cursor.execute("SELECT id, direction, sender_address, recipient FROM emails").fetchall()
+    cursor.executemany(
+        "UPDATE emails SET correspondent = ? WHERE id = ?",
+        [(correspondent_address(direction, sender_address, recipient), row_id)
+         for row_id, direction, sender_address, recipient in rows],
+    )
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_emails_correspondent_sent_at ON emails (correspondent, sent_at DESC)
+    """)
+
+
+# (version, migration) in order; each runs once per database
+MIGRATIONS = [
+    (1, _migrate_imap_sync),
+    (2, _migrate_typed_columns),
+    (3, _migrate_full_text_search),
+    (4, _migrate_style_profile),
+    (5, _migrate_correspondent),
+]
+# Stored in PRAGMA user_version once every migration has run
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+_migrated = set()
+
+
+def ensure_schema(db_path=DB_NAME):
+    """Creates the emails table if needed and applies pending migrations (once per process)."""
+    if db_path in _migrated:
+        return
+    conn = get_connection(db_path)
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -21,8 +214,20 @@ def create_email_table():
     )
     """)
 
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    for target, migrate in MIGRATIONS:
+        if version < target:
+            migrate(cursor)
+            cursor.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+
     conn.commit()
-    conn.close()
+    _migrated.add(db_path)
+
+
+def create_email_table(db_path=DB_NAME):
+    """Creates the emails table if it doesn't exist and applies pending migrations."""
+    ensure_schema(db_path)
     print("✅ Email table created successfully!")
 
 # Run the function to create the table
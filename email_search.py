@@ -0,0 +1,105 @@
+import os
+import re
+import time
+from database import DB_NAME, ensure_schema
+from metrics import elapsed_ms, sqlite_query_seconds
+from storage import get_connection
+
+# Results per page when the caller doesn't say
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "10"))
+# Hard cap on page size
+SEARCH_MAX_PAGE_SIZE = int(os.getenv("SEARCH_MAX_PAGE_SIZE", "100"))
+# Tokens of context around each match in snippets
+SEARCH_SNIPPET_TOKENS = int(os.getenv("SEARCH_SNIPPET_TOKENS", "16"))
+
+# bm25 weights for the subject, body and sender columns
+_BM25_WEIGHTS = (5.0, 1.0, 2.0)
+
+
+def to_fts_query(text):
+    """
+    Turns free text into a safe FTS5 query: every word must match.
+
+    Words are quoted so punctuation and FTS operators in user input can't cause syntax
+    errors; a trailing `*` is kept as a prefix match ("transf*").
+    """
+    terms = []
+    for word in re.findall(r"[\w@.'-]+\*?", text):
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', "")
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def search_emails(query, limit=SEARCH_PAGE_SIZE, offset=0, direction=None, db_path=DB_NAME):
+    """
+    Full-text search over subject, body and sender, best matches first.
+
+    Args:
+        query (str): Free-text query
+        limit (int): Page size (capped at SEARCH_MAX_PAGE_SIZE)
+        offset (int): Results to skip (for pagination)
+        direction (str, optional): Only "sent" or "received" mail
+        db_path (str): Email database
+
+    Returns:
+        dict: {"results": [...], "has_more": bool, "next_offset": int or None,
+               "timings": {"sqlite_ms": ...}}
+    """
+    limit = max(1, min(int(limit), SEARCH_MAX_PAGE_SIZE))
+    offset = max(0, int(offset))
+    match = to_fts_query(query or "")
+    timings = {"sqlite_ms": 0.0}
+    if not match:
+        # Nothing to search for, so no query ran
+        return {"results": [], "has_more": False, "next_offset": None, "timings": timings}
+
+    ensure_schema(db_path)
+    conn = get_connection(db_path)
+    sql = f"""
+    SELECT e.id, e.subject, e.sender, e.timestamp, e.sent_at, e.direction,
+           highlight(emails_fts, 0, '[', ']'),
+           snippet(emails_fts, 1, '[', ']', '…', ?),
+           bm25(emails_fts, {', '.join(map(str, _BM25_WEIGHTS))}) AS score
+    FROM emails_fts
+    JOIN emails e ON e.id = emails_fts.rowid
+    WHERE emails_fts MATCH ? {"AND e.direction = ?" if direction else ""}
+    ORDER BY score
+    LIMIT ? OFFSET ?
+    """
+    params = [SEARCH_SNIPPET_TOKENS, match] + ([direction] if direction else []) + [limit + 1, offset]
+    started = time.perf_counter()
+    with sqlite_query_seconds.time(query="search_emails"):
+        rows = conn.execute(sql, params).fetchall()
+    timings = {"sqlite_ms": elapsed_ms(started)}
+
+    # One extra row tells us whether there is another page without a COUNT(*)
+    has_more = len(rows) > limit
+    results = [
+        {
+            "id": row_id,
+            "subject": subject,
+            "sender": sender,
+            "timestamp": timestamp,
+            "sent_at": sent_at,
+            "direction": row_direction,
+            "subject_highlight": subject_highlight,
+            "snippet": snippet,
+            # bm25() is lower-is-better; flip it so larger means more relevant
+            "score": round(-score, 4),
+        }
+        for row_id, subject, sender, timestamp, sent_at, row_direction, subject_highlight, snippet, score
+        in rows[:limit]
+    ]
+    return {"results": results, "has_more": has_more, "next_offset": offset + limit if has_more else None,
+            "timings": timings}
+
+
+if __name__ == "__main__":
+    import sys
+
+    query = " ".join(sys.argv[1:]) or "meeting"
+    print(f"\n🔍 Emails matching '{query}'")
+    for idx, hit in enumerate(search_emails(query)["results"], 1):
+        print(f"{idx}. {hit['subject_highlight']} — {hit['sender']}\n   {hit['snippet']}")
@@ -0,0 +1,207 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+from metrics import embedding_seconds
+from model_registry import EMBEDDING_MODEL_NAME, registry
+from storage import executemany_batched, get_connection
+
+# Database file name
+EMBEDDING_CACHE_DB = os.getenv("EMBEDDING_CACHE_DB", "embeddings.db")
+# Concurrent embed() calls are grouped into batches of up to this many texts...
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# ...waiting at most this long (milliseconds) for a batch to fill up
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+# Batch size used by embed_many() for backfills
+EMBEDDING_BULK_BATCH_SIZE = int(os.getenv("EMBEDDING_BULK_BATCH_SIZE", "256"))
+# Query embeddings kept in memory (LRU); free-text queries never go to the SQLite cache
+EMBEDDING_QUERY_CACHE_SIZE = int(os.getenv("EMBEDDING_QUERY_CACHE_SIZE", "2048"))
+
+# SQLite's default limit on bound parameters is 999
+_SQL_CHUNK = 500
+
+
+def content_hash(text, model_name=EMBEDDING_MODEL_NAME):
+    """Cache key: the model name and the exact text."""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingService:
+    """
+    Normalized sentence embeddings with micro-batching and a persistent cache.
+
+    `embed()` calls from many threads are queued and encoded together by one worker
+    thread. Corpus embeddings (`embed_many()`, the bulk path for index builds and
+    backfills) are cached in SQLite by content hash (as float16), so a title is only
+    ever encoded once per model. Query embeddings (`embed()`, `embed_queries()`) only
+    go to a bounded in-memory LRU, so the request path never writes to SQLite.
+    """
+
+    def __init__(self, db_path=EMBEDDING_CACHE_DB, model_name=EMBEDDING_MODEL_NAME,
+                 batch_size=EMBEDDING_BATCH_SIZE, batch_wait_ms=EMBEDDING_BATCH_WAIT_MS):
+        self.db_path = db_path
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self._requests = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._table_ready = False
+        self._query_cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.batches = 0
+
+    # 🔹 Cache
+
+    def _connect(self):
+        conn = get_connection(self.db_path)
+        if not self._table_ready:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                content_hash TEXT PRIMARY KEY,
+                dim INTEGER,
+                vector BLOB
+            )
+            """)
+            conn.commit()
+            self._table_ready = True
+        return conn
+
+    def _load_cached(self, keys):
+        """Returns {content_hash: float32 vector} for the keys found in the cache."""
+        found = {}
+        conn = self._connect()
+        for start in range(0, len(keys), _SQL_CHUNK):
+            chunk = keys[start:start + _SQL_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT content_hash, vector FROM embeddings WHERE content_hash IN ({placeholders})",
+                chunk,
+            )
+            for key, blob in rows:
+                vector = np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+                # Renormalize to undo float16 rounding
+                found[key] = vector / (np.linalg.norm(vector) or 1.0)
+        return found
+
+    def _store(self, keys, vectors):
+        self._connect()
+        executemany_batched(
+            self.db_path,
+            "INSERT OR REPLACE INTO embeddings (content_hash, dim, vector) VALUES (?, ?, ?)",
+            ((key, len(vector), vector.astype(np.float16).tobytes()) for key, vector in zip(keys, vectors)),
+        )
+
+    def _recall_queries(self, keys):
+        with self._lock:
+            found = {}
+            for key in keys:
+                vector = self._query_cache.get(key)
+                if vector is not None:
+                    self._query_cache.move_to_end(key)
+                    found[key] = vector
+            return found
+
+    def _remember_queries(self, keys, vectors):
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._query_cache[key] = vector
+                self._query_cache.move_to_end(key)
+            while len(self._query_cache) > EMBEDDING_QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+
+    # 🔹 Encoding
+
+    def _encode_with_cache(self, texts, batch_size, persist=True):
+        """
+        Embeds `texts` (in order), encoding only the ones missing from the cache.
+
+        `persist` selects the SQLite cache (corpus text) or the in-memory LRU (queries).
+        """
+        keys = [content_hash(text, self.model_name) for text in texts]
+        unique_keys = list(dict.fromkeys(keys))
+        cached = self._load_cached(unique_keys) if persist else self._recall_queries(unique_keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        with self._lock:
+            self.cache_hits += len(unique_keys) - len(missing)
+            self.cache_misses += len(missing)
+
+        if missing:
+            model = registry.get("sentence_encoder")
+            missing_keys = list(missing)
+            with embedding_seconds.time():
+                encoded = model.encode([missing[key] for key in missing_keys], batch_size=batch_size,
+                                       normalize_embeddings=True)
+            encoded = np.asarray(encoded, dtype=np.float32)
+            if persist:
+                self._store(missing_keys, encoded)
+            else:
+                self._remember_queries(missing_keys, encoded)
+            cached.update(zip(missing_keys, encoded))
+
+        return np.stack([cached[key] for key in keys]) if keys else np.empty((0, 0), dtype=np.float32)
+
+    def embed_many(self, texts, batch_size=EMBEDDING_BULK_BATCH_SIZE):
+        """Bulk-embeds corpus texts; returns a float32 array of shape (len(texts), dim)."""
+        return self._encode_with_cache(list(texts), batch_size)
+
+    def embed_queries(self, texts):
+        """Embeds a batch of query texts (cached in memory only)."""
+        return self._encode_with_cache(list(texts), self.batch_size, persist=False)
+
+    def embed(self, text, timeout=None):
+        """Embeds one query text, sharing a model call with other concurrent requests."""
+        self._ensure_worker()
+        future = Future()
+        self._requests.put((text, future))
+        return future.result(timeout=timeout)
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run_batches, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _run_batches(self):
+        while True:
+            batch = [self._requests.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self.batches += 1
+            try:
+                vectors = self._encode_with_cache([text for text, _ in batch], self.batch_size, persist=False)
+                for (_, future), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
+
+    def stats(self):
+        return {
+            "query_cache_size": len(self._query_cache),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "batches": self.batches,
+            "queued": self._requests.qsize(),
+        }
+
+
+embedding_service = EmbeddingService()
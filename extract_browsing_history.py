@@ -1,37 +1,24 @@
 import sqlite3
-import time
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from urllib.parse import urlparse
-from keybert import KeyBERT
+from browsing_categories import BROWSING_STORE_KEYWORDS, categorize_titles, extract_keywords
+from browsing_index import ensure_delete_tracking, get_index_manager
+from storage import get_connection, transaction
+from url_filter import UrlFilter
 
 # Database setup
 DB_NAME = "browsing_history.db"
 
-# List of URLs to exclude
+# List of URLs to exclude (host suffixes, optionally with a path prefix); more deny/allow
+# rules can be added in url_filter.json
 EXCLUDE_DOMAINS = ["google.com/search", "mail.google.com", "facebook.com", "twitter.com"]
 
-# Initialize KeyBERT Model
-kw_model = KeyBERT()
+# Compiled once; matching cost doesn't grow with the number of rules
+url_filter = UrlFilter.from_config(EXCLUDE_DOMAINS)
 
-# Categorization rules
-CATEGORIES = {
-    "AI": ["machine learning", "deep learning", "GPT", "transformer", "LLM"],
-    "Web Dev": ["JavaScript", "React", "Next.js", "Tailwind", "CSS"],
-    "Finance": ["stocks", "crypto", "trading", "investment"],
-    "Quantum Computing": ["quantum", "Qiskit", "superposition"]
-}
-
-# Initialize Selenium WebDriver
-chrome_options = Options()
-chrome_options.add_argument("--headless")  # Run in headless mode
-service = Service("/opt/homebrew/bin/chromedriver")
-driver = webdriver.Chrome(service=service, options=chrome_options)
+INSERT_HISTORY_SQL = "INSERT OR IGNORE INTO history (url, title, timestamp, category, keywords) VALUES (?, ?, ?, ?, ?)"
 
 def create_table():
     """Creates a table for storing browsing history with category support."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection(DB_NAME)
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -43,57 +30,79 @@ def create_table():
     )
     ''')
     
-    # Add category column (ignore if exists)
-    try:
-        cursor.execute("ALTER TABLE history ADD COLUMN category TEXT;")
-    except sqlite3.OperationalError:
-        pass  # Column already exists
+    # Add category and keywords columns (ignore if they exist)
+    for column in ("category TEXT", "keywords TEXT"):
+        try:
+            cursor.execute(f"ALTER TABLE history ADD COLUMN {column};")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
+    # Let the FAISS index drop vectors of deleted rows
+    ensure_delete_tracking(conn)
     
     conn.commit()
-    conn.close()
 
 def categorize_title(title):
     """Categorizes a browsing history title using predefined rules."""
-    keywords = kw_model.extract_keywords(title, keyphrase_ngram_range=(1, 2), stop_words="english", top_n=3)
-    detected_category = "Other"
-    
-    for category, terms in CATEGORIES.items():
-        if any(term.lower() in title.lower() for term in terms):
-            detected_category = category
-            break
-    
-    return detected_category
+    return categorize_titles([title])[0]
+
+def is_excluded(url):
+    """True for URLs matching EXCLUDE_DOMAINS or the configured deny rules."""
+    return url_filter.is_blocked(url)
+
+def store_browsing_batch(rows):
+    """
+    Stores (url, title, timestamp) rows with one categorization pass and one commit.
+
+    The rows are not indexed here: the caller adds them to the FAISS index once its
+    enclosing transaction has committed, so a rollback leaves no orphan vectors.
+
+    Returns:
+        list: (id, title) of the new rows (duplicates and excluded URLs are skipped)
+    """
+    blocked = url_filter.blocked_mask([url for url, _, _ in rows])
+    rows = [row for row, skip in zip(rows, blocked) if not skip]
+    if not rows:
+        return []
+    titles = [title for _, title, _ in rows]
+    categories = categorize_titles(titles)
+    # KeyBERT only runs when its output is actually kept
+    keywords = extract_keywords(titles) if BROWSING_STORE_KEYWORDS else [None] * len(rows)
+
+    added = []
+    with transaction(DB_NAME) as conn:
+        for (url, title, timestamp), category, keyword_text in zip(rows, categories, keywords):
+            cursor = conn.execute(INSERT_HISTORY_SQL, (url, title, timestamp, category, keyword_text))
+            if cursor.rowcount:
+                added.append((cursor.lastrowid, title))
+    return added
 
 def store_browsing_data(url, title, timestamp):
     """Stores browsing history in the SQLite database with categorization."""
-    parsed_url = urlparse(url)
-    domain = f"{parsed_url.netloc}{parsed_url.path}"
-    
-    if any(exclude in domain for exclude in EXCLUDE_DOMAINS):
+    if is_excluded(url):
         return  # Skip unwanted domains
     
     category = categorize_title(title)
+    keyword_text = extract_keywords([title])[0] if BROWSING_STORE_KEYWORDS else None
 
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR IGNORE INTO history (url, title, timestamp, category) VALUES (?, ?, ?, ?)",
-                   (url, title, timestamp, category))
-    conn.commit()
-    conn.close()
+    # Commits now, or with the caller's enclosing transaction
+    with transaction(DB_NAME) as conn:
+        cursor = conn.execute(INSERT_HISTORY_SQL, (url, title, timestamp, category, keyword_text))
+        row_id = cursor.lastrowid if cursor.rowcount else None
+
+    # Index the new title right away (in memory; saved once the batch is done)
+    if row_id:
+        get_index_manager().add([(row_id, title)])
+    return row_id
 
 def extract_browsing_history():
     """Extract browsing history and store in the database."""
+    # Reads Chrome's History database directly (no browser process)
+    from chrome_history import import_chrome_history
+
     try:
-        history_data = [
-            ("https://arxiv.org/abs/2403.12345", "Latest Paper on Transformers", time.strftime('%Y-%m-%d %H:%M:%S')),
-            ("https://huggingface.co/blog/llm-performance", "Hugging Face LLM Performance Guide", time.strftime('%Y-%m-%d %H:%M:%S')),
-            ("https://google.com/search?q=best+python+frameworks", "Google Search", time.strftime('%Y-%m-%d %H:%M:%S'))
-        ]  # Mock data for testing
-        
-        for url, title, timestamp in history_data:
-            store_browsing_data(url, title, timestamp)
-        
-        print("✅ Browsing history extracted, categorized, and stored successfully!")
+        stats = import_chrome_history()
+        print(f"✅ Browsing history extracted, categorized, and stored successfully! {stats}")
     except Exception as e:
         print(f"❌ Error extracting browsing history: {e}")
     
@@ -1,8 +1,10 @@
 import imaplib
-import email
-import sqlite3
 import os
 from dotenv import load_dotenv
+from database import correspondent_address, email_direction, parse_address, parse_timestamp
+from imap_sync import ImapSyncEngine
+from storage import executemany_batched, transaction
+from style_profile import update_style_profile
 
 # Load environment variables
 load_dotenv()
@@ -12,55 +14,46 @@ IMAP_SERVER = os.getenv("IMAP_SERVER", "imap.gmail.com")
 EMAIL_USER = os.getenv("EMAIL_USER")
 EMAIL_PASS = os.getenv("EMAIL_PASS")
 
-if not EMAIL_USER or not EMAIL_PASS:
-    raise ValueError("❌ Missing email credentials. Set EMAIL_USER and EMAIL_PASS in .env")
+def connect_imap():
+    """Opens and logs in an IMAP connection using the .env credentials."""
+    if not EMAIL_USER or not EMAIL_PASS:
+        raise ValueError("❌ Missing email credentials. Set EMAIL_USER and EMAIL_PASS in .env")
+    mail = imaplib.IMAP4_SSL(IMAP_SERVER)
+    mail.login(EMAIL_USER, EMAIL_PASS)
+    return mail
+
+STORE_EMAIL_SQL = """
+INSERT OR IGNORE INTO emails (email_id, sender, recipient, subject, body, timestamp, label,
+                              sender_address, sent_at, direction, correspondent)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _email_row(email_id, sender, recipient, subject, body, timestamp, label="INBOX"):
+    """Adds the normalized sender address, epoch timestamp, direction and correspondent to a row."""
+    sender_address = parse_address(sender)
+    direction = email_direction(sender_address, label, EMAIL_USER)
+    return (email_id, sender, recipient, subject, body, timestamp, label, sender_address,
+            parse_timestamp(timestamp), direction, correspondent_address(direction, sender_address, recipient))
 
 def store_email(email_id, sender, recipient, subject, body, timestamp, label="INBOX"):
-    """Stores an email in the SQLite database."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-    INSERT OR IGNORE INTO emails (email_id, sender, recipient, subject, body, timestamp, label)
-    VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (email_id, sender, recipient, subject, body, timestamp, label))
-    
-    conn.commit()
-    conn.close()
+    """Stores an email in the SQLite database (wrap a loop in storage.transaction to commit once)."""
+    with transaction(DB_NAME) as conn:
+        conn.execute(STORE_EMAIL_SQL, _email_row(email_id, sender, recipient, subject, body, timestamp, label))
+
+def store_emails(rows):
+    """Bulk-stores (email_id, sender, recipient, subject, body, timestamp, label) rows."""
+    return executemany_batched(DB_NAME, STORE_EMAIL_SQL, (_email_row(*row) for row in rows))
 
 def fetch_emails():
-    """Fetches emails using IMAP and stores them in the database."""
+    """Incrementally syncs new emails (INBOX and Sent) over IMAP into the database."""
     try:
-        mail = imaplib.IMAP4_SSL(IMAP_SERVER)
-        mail.login(EMAIL_USER, EMAIL_PASS)
-        mail.select("inbox")
-
-        status, messages = mail.search(None, "ALL")
-        email_ids = messages[0].split()
-
-        for email_id in email_ids[-10:]:  # Fetch last 10 emails
-            status, msg_data = mail.fetch(email_id, "(RFC822)")
-            raw_email = msg_data[0][1]
-            msg = email.message_from_bytes(raw_email)
-
-            sender = msg["From"]
-            recipient = msg["To"]
-            subject = msg["Subject"]
-            timestamp = msg["Date"]
-
-            # Extract email body
-            body = "No Body"
-            if msg.is_multipart():
-                for part in msg.walk():
-                    if part.get_content_type() == "text/plain":
-                        body = part.get_payload(decode=True).decode(errors="ignore")
-                        break
-            else:
-                body = msg.get_payload(decode=True).decode(errors="ignore")
+        engine = ImapSyncEngine(connect_imap, account=EMAIL_USER, db_path=DB_NAME)
+        stats = engine.sync()
 
-            store_email(email_id.decode(), sender, recipient, subject, body, timestamp)  # ✅ FIXED
+        print(f"✅ Emails fetched and stored successfully! {stats}")
 
-        print("✅ Emails fetched and stored successfully!")
+        # Fold the newly synced sent mail into the stored writing-style profile
+        update_style_profile(os.getenv("USER_EMAIL") or EMAIL_USER, DB_NAME)
 
     except Exception as error:
         print(f"❌ Error fetching emails: {error}")
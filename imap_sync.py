@@ -0,0 +1,423 @@
+import email
+import email.policy
+import json
+import os
+import re
+from database import (DB_NAME, correspondent_address, create_email_table, email_direction, parse_address,
+                      parse_timestamp)
+from mime_stream import decode_part, extract_body, html_to_text
+from storage import get_connection, transaction
+
+# Folders to sync; "SENT" resolves to the server's \Sent special-use folder
+IMAP_FOLDERS = [f.strip() for f in os.getenv("IMAP_FOLDERS", "INBOX,SENT").split(",") if f.strip()]
+# UIDs per UID FETCH round trip
+FETCH_BATCH_SIZE = int(os.getenv("IMAP_FETCH_BATCH", "200"))
+# Bodies are fetched as partial BODY[section]<0.N> so huge parts never come down whole
+MAX_BODY_BYTES = int(os.getenv("IMAP_MAX_BODY_BYTES", str(256 * 1024)))
+# Without a usable BODYSTRUCTURE, this much of the raw message is fetched and parsed instead
+MAX_MESSAGE_BYTES = int(os.getenv("IMAP_MAX_MESSAGE_BYTES", str(1024 * 1024)))
+
+HEADER_FIELDS = "FROM TO SUBJECT DATE MESSAGE-ID"
+
+_SEXP_TOKEN = re.compile(rb'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()"]+')
+_UID = re.compile(rb"UID (\d+)")
+_LIST_LINE = re.compile(rb'\((?P<flags>[^)]*)\) (?:"[^"]*"|NIL) (?P<name>.+)$')
+
+
+# 🔹 IMAP response helpers
+
+def uid_ranges(uids):
+    """Compacts sorted UIDs into an IMAP sequence set, e.g. [1, 2, 3, 7] → "1:3,7"."""
+    ranges = []
+    start = prev = None
+    for uid in uids:
+        if start is None:
+            start = prev = uid
+        elif uid == prev + 1:
+            prev = uid
+        else:
+            ranges.append(f"{start}:{prev}" if prev != start else str(start))
+            start = prev = uid
+    if start is not None:
+        ranges.append(f"{start}:{prev}" if prev != start else str(start))
+    return ",".join(ranges)
+
+
+def quote_mailbox(name):
+    return '"' + name.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def parse_sexp(data):
+    """Parses an IMAP parenthesized list (e.g. a BODYSTRUCTURE) into nested lists."""
+    stack = [[]]
+    for token in _SEXP_TOKEN.findall(data):
+        if token == b"(":
+            stack.append([])
+        elif token == b")":
+            if len(stack) == 1:
+                break
+            done = stack.pop()
+            stack[-1].append(done)
+        elif token.startswith(b'"'):
+            stack[-1].append(token[1:-1].replace(b'\\"', b'"').decode("utf-8", "replace"))
+        elif token.upper() == b"NIL":
+            stack[-1].append(None)
+        else:
+            stack[-1].append(token.decode("utf-8", "replace"))
+    return stack[0][0] if stack[0] else None
+
+
+def _extract_parenthesized(data, keyword):
+    """Returns the balanced (...) group that follows `keyword` in a FETCH response."""
+    start = data.find(keyword)
+    if start < 0:
+        return None
+    start = data.find(b"(", start)
+    depth, in_quote, i = 0, False, start
+    while i < len(data):
+        char = data[i:i + 1]
+        if in_quote:
+            if char == b"\\":
+                i += 1
+            elif char == b'"':
+                in_quote = False
+        elif char == b'"':
+            in_quote = True
+        elif char == b"(":
+            depth += 1
+        elif char == b")":
+            depth -= 1
+            if depth == 0:
+                return data[start:i + 1]
+        i += 1
+    return None
+
+
+def iter_fetch_items(data):
+    """
+    Groups an imaplib FETCH response into (uid, metadata_bytes, literal_bytes).
+
+    imaplib returns a tuple (metadata, literal) per message followed by the rest of
+    the line as plain bytes; both metadata pieces are joined so attributes can appear
+    before or after the literal.
+    """
+    current = None
+    for item in data:
+        if isinstance(item, tuple):
+            if current:
+                yield current
+            meta, literal = item
+            match = _UID.search(meta)
+            current = [int(match.group(1)) if match else None, meta, literal]
+        elif isinstance(item, bytes) and current is not None:
+            current[1] += b" " + item
+            if current[0] is None:
+                match = _UID.search(item)
+                current[0] = int(match.group(1)) if match else None
+    if current:
+        yield current
+
+
+def find_text_part(structure, prefix=""):
+    """
+    Finds the best body part in a parsed BODYSTRUCTURE.
+
+    Returns {"section", "subtype", "encoding", "charset"} for the first text/plain
+    part (or the first text/html one if there is no plain text), skipping attachments
+    and nested messages, or None if the message has no text part.
+    """
+    if not structure:
+        return None
+    if isinstance(structure[0], list):
+        children = []
+        for item in structure:
+            if not isinstance(item, list):
+                break  # The multipart subtype ends the list of children
+            children.append(item)
+        html = None
+        for number, child in enumerate(children, 1):
+            part = find_text_part(child, f"{prefix}{number}.")
+            if part and part["subtype"] == "plain":
+                return part
+            html = html or part
+        return html
+
+    main_type = (structure[0] or "").lower()
+    subtype = (structure[1] or "").lower() if len(structure) > 1 else ""
+    if main_type != "text" or subtype not in ("plain", "html"):
+        return None
+    # Text parts: type, subtype, params, id, description, encoding, size, lines, md5, disposition
+    disposition = structure[9] if len(structure) > 9 else None
+    if isinstance(disposition, list) and disposition and str(disposition[0]).lower() == "attachment":
+        return None
+
+    params = structure[2] if isinstance(structure[2], list) else []
+    charset = None
+    for key, value in zip(params[::2], params[1::2]):
+        if str(key).lower() == "charset":
+            charset = value
+    return {
+        "section": prefix.rstrip(".") or "1",
+        "subtype": subtype,
+        "encoding": (structure[5] or "7bit").lower() if len(structure) > 5 else "7bit",
+        "charset": charset or "utf-8",
+    }
+
+
+# 🔹 Parsing (module-level so they can run in a process pool)
+
+INSERT_EMAIL_SQL = """
+INSERT OR IGNORE INTO emails (email_id, sender, recipient, subject, body, timestamp, label,
+                              account, folder, uid, uidvalidity, message_id, body_part,
+                              sender_address, sent_at, direction, correspondent)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# Positions in the rows parse_header_items() returns
+ROW_BODY, ROW_UID, ROW_BODY_PART = 4, 9, 12
+HEADER_FETCH_ITEMS = f"(UID RFC822.SIZE BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])"
+
+
+def parse_header_items(account, label, folder, uidvalidity, data):
+    """Turns a header UID FETCH response into `emails` rows (body left NULL if fetchable)."""
+    rows = []
+    for uid, meta, literal in iter_fetch_items(data):
+        if not uid:
+            continue
+        headers = email.message_from_bytes(literal or b"", policy=email.policy.default)
+        structure_raw = _extract_parenthesized(meta, b"BODYSTRUCTURE")
+        if structure_raw:
+            part = find_text_part(parse_sexp(structure_raw))
+        else:
+            # No structure from the server: stream-parse the raw message instead
+            part = {"section": "", "subtype": "rfc822", "encoding": None, "charset": None}
+        sender = str(headers["From"] or "")
+        date = str(headers["Date"] or "")
+        recipient = str(headers["To"] or "")
+        sender_address = parse_address(sender)
+        direction = email_direction(sender_address, label, account)
+        rows.append((
+            f"{account}:{folder}:{uidvalidity}:{uid}",
+            sender,
+            recipient,
+            str(headers["Subject"] or ""),
+            None if part else "No Body",
+            date,
+            label,
+            account,
+            folder,
+            uid,
+            uidvalidity,
+            str(headers["Message-ID"] or ""),
+            json.dumps(part) if part else None,
+            sender_address,
+            parse_timestamp(date),
+            direction,
+            correspondent_address(direction, sender_address, recipient),
+        ))
+    return rows
+
+
+def decode_body_items(data, parts):
+    """Decodes a body UID FETCH response; `parts` maps uid → find_text_part() result."""
+    bodies = []
+    for uid, _, literal in iter_fetch_items(data):
+        part = parts.get(uid)
+        if part is None:
+            continue
+        if part["subtype"] == "rfc822":
+            body = extract_body(literal or b"") or "No Body"
+        else:
+            body = decode_part(literal or b"", part["encoding"], part["charset"])
+            if part["subtype"] == "html":
+                body = html_to_text(body)
+        bodies.append((uid, body))
+    return bodies
+
+
+def body_fetch_items(section, max_bytes=MAX_BODY_BYTES):
+    if not section:
+        # Whole raw message, for extract_body(); attachments past the cap never download
+        return f"(UID BODY.PEEK[]<0.{max(max_bytes, MAX_MESSAGE_BYTES)}>)"
+    return f"(UID BODY.PEEK[{section}]<0.{max_bytes}>)"
+
+
+# 🔹 Sync engine
+
+class ImapSyncEngine:
+    """
+    Incremental, resumable IMAP → SQLite sync.
+
+    Each folder keeps a UID watermark and its UIDVALIDITY in `sync_state`. A sync
+    searches only for UIDs above the watermark, fetches headers, size and
+    BODYSTRUCTURE for them in batched UID FETCH ranges, and commits each batch
+    together with the new watermark, so an interrupted sync resumes where it
+    stopped. Bodies are fetched in a separate pass, only the chosen text part.
+
+    `connect` is any zero-argument callable returning a logged-in imaplib-style
+    connection, which lets a local IMAP stand-in replace the real server.
+    """
+
+    def __init__(self, connect, account, db_path=DB_NAME, folders=IMAP_FOLDERS,
+                 batch_size=FETCH_BATCH_SIZE, max_body_bytes=MAX_BODY_BYTES):
+        self.connect = connect
+        self.account = account
+        self.db_path = db_path
+        self.folders = folders
+        self.batch_size = batch_size
+        self.max_body_bytes = max_body_bytes
+
+    # State
+
+    def load_state(self, conn, folder):
+        row = conn.execute(
+            "SELECT uidvalidity, last_uid FROM sync_state WHERE account = ? AND folder = ?",
+            (self.account, folder),
+        ).fetchone()
+        return row if row else (None, 0)
+
+    def reset_folder(self, db, folder, uidvalidity):
+        """UIDVALIDITY changed: old UIDs are meaningless, so start the folder over."""
+        with transaction(self.db_path) as db:
+            db.execute("DELETE FROM emails WHERE account = ? AND folder = ?", (self.account, folder))
+            db.execute("""
+            INSERT OR REPLACE INTO sync_state (account, folder, uidvalidity, last_uid) VALUES (?, ?, ?, 0)
+            """, (self.account, folder, uidvalidity))
+
+    # Server helpers
+
+    @staticmethod
+    def resolve_folders(imap, folders):
+        """Maps the logical "SENT" folder to the mailbox flagged \\Sent (fallback "Sent")."""
+        if "SENT" not in [f.upper() for f in folders]:
+            return [(f, f) for f in folders]
+        sent = "Sent"
+        status, lines = imap.list()
+        if status == "OK":
+            for line in lines or []:
+                match = _LIST_LINE.match(line or b"")
+                if match and b"\\sent" in match.group("flags").lower():
+                    sent = match.group("name").strip().strip(b'"').decode("utf-8", "replace")
+                    break
+        return [("SENT", sent) if f.upper() == "SENT" else (f, f) for f in folders]
+
+    @staticmethod
+    def folder_uidvalidity(imap):
+        _, data = imap.response("UIDVALIDITY")
+        return int(data[0]) if data and data[0] else 0
+
+    @staticmethod
+    def new_uids(imap, last_uid):
+        status, data = imap.uid("SEARCH", None, f"UID {last_uid + 1}:*")
+        if status != "OK" or not data or not data[0]:
+            return []
+        # "n:*" always matches the highest UID, even when it is below n
+        return sorted(uid for uid in map(int, data[0].split()) if uid > last_uid)
+
+    # Header pass
+
+    def open_folder(self, imap, db, folder):
+        """
+        Selects `folder` and returns (uidvalidity, last_uid), resetting the folder's
+        rows and watermark if UIDVALIDITY changed. Returns None if it cannot be opened.
+        """
+        status, _ = imap.select(quote_mailbox(folder), readonly=True)
+        if status != "OK":
+            print(f"⚠️ Could not open folder {folder}")
+            return None
+
+        uidvalidity = self.folder_uidvalidity(imap)
+        stored_validity, last_uid = self.load_state(db, folder)
+        if stored_validity != uidvalidity:
+            self.reset_folder(db, folder, uidvalidity)
+            last_uid = 0
+        return uidvalidity, last_uid
+
+    def sync_folder(self, imap, db, label, folder):
+        """Fetches headers of new messages in one folder; returns how many were stored."""
+        opened = self.open_folder(imap, db, folder)
+        if opened is None:
+            return 0
+        uidvalidity, last_uid = opened
+
+        uids = self.new_uids(imap, last_uid)
+        stored = 0
+        for start in range(0, len(uids), self.batch_size):
+            batch = uids[start:start + self.batch_size]
+            status, data = imap.uid("FETCH", uid_ranges(batch), HEADER_FETCH_ITEMS)
+            if status != "OK":
+                raise RuntimeError(f"UID FETCH failed in {folder}: {data}")
+
+            rows = parse_header_items(self.account, label, folder, uidvalidity, data)
+            # Watermark moves in the same transaction as the rows it covers
+            with transaction(self.db_path) as db:
+                db.executemany(INSERT_EMAIL_SQL, rows)
+                db.execute("""
+                INSERT OR REPLACE INTO sync_state (account, folder, uidvalidity, last_uid) VALUES (?, ?, ?, ?)
+                """, (self.account, folder, uidvalidity, batch[-1]))
+            stored += len(rows)
+        return stored
+
+    # Body pass
+
+    def fetch_bodies(self, imap, db, folder, limit=None):
+        """Downloads the text part of messages whose body has not been fetched yet."""
+        status, _ = imap.select(quote_mailbox(folder), readonly=True)
+        if status != "OK":
+            return 0
+        uidvalidity = self.folder_uidvalidity(imap)
+        query = """
+        SELECT uid, body_part FROM emails
+        WHERE account = ? AND folder = ? AND uidvalidity = ? AND body IS NULL AND body_part IS NOT NULL
+        ORDER BY uid
+        """
+        params = [self.account, folder, uidvalidity]
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        # One UID FETCH per distinct body section, in batches
+        by_section = {}
+        for uid, body_part in db.execute(query, params).fetchall():
+            part = json.loads(body_part)
+            by_section.setdefault(part["section"], []).append((uid, part))
+
+        fetched = 0
+        for section, entries in by_section.items():
+            for start in range(0, len(entries), self.batch_size):
+                batch = dict(entries[start:start + self.batch_size])
+                status, data = imap.uid(
+                    "FETCH", uid_ranges(sorted(batch)), body_fetch_items(section, self.max_body_bytes)
+                )
+                if status != "OK":
+                    raise RuntimeError(f"Body fetch failed in {folder}: {data}")
+
+                updates = [(body, self.account, folder, uidvalidity, uid)
+                           for uid, body in decode_body_items(data, batch)]
+                with transaction(self.db_path) as db:
+                    db.executemany("""
+                    UPDATE emails SET body = ? WHERE account = ? AND folder = ? AND uidvalidity = ? AND uid = ?
+                    """, updates)
+                fetched += len(updates)
+        return fetched
+
+    # Entry point
+
+    def sync(self, fetch_bodies=True):
+        """Syncs every configured folder; returns {label: {"headers": n, "bodies": n}}."""
+        create_email_table(self.db_path)
+        imap = self.connect()
+        db = get_connection(self.db_path)
+        stats = {}
+        try:
+            folders = self.resolve_folders(imap, self.folders)
+            for label, folder in folders:
+                stats[label] = {"headers": self.sync_folder(imap, db, label, folder), "bodies": 0}
+            if fetch_bodies:
+                for label, folder in folders:
+                    stats[label]["bodies"] = self.fetch_bodies(imap, db, folder)
+        finally:
+            try:
+                imap.logout()
+            except Exception:
+                pass
+        return stats
@@ -0,0 +1,136 @@
+import json
+import os
+import time
+from inference_worker import INFERENCE_CONCURRENCY
+
+# Written by autotune.py and loaded by the server at startup
+INFERENCE_PROFILE_FILE = os.getenv("INFERENCE_PROFILE", "inference_profile.json")
+
+# llama.cpp settings a profile may set; LLAMA_<NAME> environment variables override it
+PROFILE_KEYS = ("n_threads", "n_threads_batch", "n_batch", "n_ctx", "n_gpu_layers", "use_mmap", "use_mlock")
+
+
+def available_cpus():
+    """CPUs this process may actually use: affinity mask and cgroup quota, not the host total."""
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1  # No affinity API (macOS, Windows)
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            count = min(count, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, count)
+
+
+def physical_cores():
+    """Physical cores (hyper-threads share one core's FPUs, so llama.cpp gains little from them)."""
+    try:
+        cores = set()
+        physical_id = None
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                key = key.strip()
+                if key == "physical id":
+                    physical_id = value.strip()
+                elif key == "core id":
+                    cores.add((physical_id, value.strip()))
+        if cores:
+            return len(cores)
+    except OSError:
+        pass
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def default_profile(replicas=INFERENCE_CONCURRENCY):
+    """CPU-only settings that never oversubscribe: usable cores split between the replicas."""
+    cores = min(available_cpus(), physical_cores())
+    threads = max(1, cores // max(1, replicas))
+    return {
+        "n_threads": threads,
+        "n_threads_batch": threads,
+        "n_batch": 512,
+        "n_ctx": 4096,
+        "n_gpu_layers": 0,
+        "use_mmap": True,
+        "use_mlock": False,
+    }
+
+
+def machine_fingerprint():
+    return {"available_cpus": available_cpus(), "physical_cores": physical_cores(), "os_cpu_count": os.cpu_count()}
+
+
+def _env_value(key, default):
+    raw = os.getenv(f"LLAMA_{key.upper()}")
+    if raw is None:
+        return default
+    if isinstance(default, bool):
+        return raw.lower() in ("1", "true", "yes", "on")
+    return int(raw)
+
+
+def load_profile(path=INFERENCE_PROFILE_FILE, replicas=INFERENCE_CONCURRENCY):
+    """
+    The llama.cpp settings to serve with: defaults, then the profile file, then env.
+
+    A profile tuned for a different replica count has its thread counts rescaled so
+    the replicas together use the same number of cores.
+
+    Returns:
+        dict: PROFILE_KEYS plus "source" ("default" or the profile path)
+    """
+    profile = default_profile(replicas)
+    profile["source"] = "default"
+    if path and os.path.exists(path):
+        try:
+            with open(path) as f:
+                stored = json.load(f)
+            profile.update({key: stored["params"][key] for key in PROFILE_KEYS if key in stored["params"]})
+            profile["source"] = path
+            tuned_replicas = stored.get("replicas", 1)
+            if tuned_replicas != replicas:
+                for key in ("n_threads", "n_threads_batch"):
+                    profile[key] = max(1, profile[key] * tuned_replicas // max(1, replicas))
+                print(f"⚠️ {path} was tuned for {tuned_replicas} replica(s), serving {replicas}: "
+                      f"using {profile['n_threads']} threads each")
+            if stored.get("machine", {}).get("available_cpus") not in (None, available_cpus()):
+                print(f"⚠️ {path} was tuned on a machine with different CPUs; re-run autotune.py")
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            print(f"⚠️ Ignoring unreadable inference profile {path}: {error}")
+    for key in PROFILE_KEYS:
+        profile[key] = _env_value(key, profile[key])
+    return profile
+
+
+def save_profile(params, measured, replicas, model, path=INFERENCE_PROFILE_FILE, trials=()):
+    """Writes a tuned profile atomically, with the trials it was chosen from."""
+    data = {
+        "params": {key: params[key] for key in PROFILE_KEYS},
+        "measured": measured,
+        "replicas": replicas,
+        "model": model,
+        "machine": machine_fingerprint(),
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "trials": list(trials),
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+    return data
+
+
+def llama_kwargs(profile):
+    """Keyword arguments for ChatLlamaCpp (n_threads_batch goes straight to llama_cpp.Llama)."""
+    kwargs = {key: profile[key] for key in PROFILE_KEYS if key != "n_threads_batch"}
+    kwargs["model_kwargs"] = {"n_threads_batch": profile["n_threads_batch"]}
+    return kwargs
+
+
+if __name__ == "__main__":
+    print(json.dumps({"profile": load_profile(), "machine": machine_fingerprint()}, indent=2))
@@ -0,0 +1,210 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from metrics import queue_wait_seconds
+
+# Number of generations allowed to run at the same time (one model replica each)
+INFERENCE_CONCURRENCY = max(1, int(os.getenv("INFERENCE_CONCURRENCY", "1")))
+# Requests allowed to wait for a free slot before new ones are rejected with 429
+INFERENCE_MAX_QUEUE = max(0, int(os.getenv("INFERENCE_MAX_QUEUE", "8")))
+# Seconds a request may wait for a slot before it is rejected with 503
+INFERENCE_MAX_WAIT = float(os.getenv("INFERENCE_MAX_WAIT", "30"))
+# How often (seconds) to check whether the HTTP client is still connected
+DISCONNECT_POLL_INTERVAL = float(os.getenv("INFERENCE_DISCONNECT_POLL", "0.5"))
+
+# Marks the end of a streamed generation on the hand-off queue
+_STREAM_END = object()
+
+
+class QueueFullError(Exception):
+    """Raised when the request queue is already at INFERENCE_MAX_QUEUE."""
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a request waited longer than INFERENCE_MAX_WAIT for a slot."""
+
+
+class InferenceExecutor:
+    """
+    Runs blocking model calls on dedicated worker threads so the event loop stays free.
+
+    Admission is bounded twice: at most `max_queue` requests may wait for one of the
+    `concurrency` slots, and no request waits longer than `max_wait` seconds. A slot is
+    only released once its worker thread has really finished, so cancelling a request
+    never lets more generations run than there are workers.
+    """
+
+    def __init__(self, concurrency=INFERENCE_CONCURRENCY, max_queue=INFERENCE_MAX_QUEUE,
+                 max_wait=INFERENCE_MAX_WAIT):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="inference")
+        self._slots = None
+        self.waiting = 0
+        self.running = 0
+
+    def _get_slots(self):
+        # Created lazily so the semaphore binds to the server's running loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        return self._slots
+
+    def _release(self, _future=None):
+        self.running -= 1
+        self._slots.release()
+
+    async def _acquire(self, timings=None):
+        started = time.perf_counter()
+        slots = self._get_slots()
+        if not slots.locked():
+            # A free slot is taken without suspending, so it counts before the next request
+            await slots.acquire()
+            self.running += 1
+            self._record_wait(started, timings)
+            return
+        if self.waiting >= self.max_queue:
+            raise QueueFullError(f"Inference queue is full ({self.waiting} waiting)")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            raise QueueTimeoutError(f"No inference slot became free within {self.max_wait:g}s")
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        self._record_wait(started, timings)
+
+    @staticmethod
+    def _record_wait(started, timings):
+        waited = time.perf_counter() - started
+        queue_wait_seconds.observe(waited)
+        if isinstance(timings, dict):
+            timings["queue_wait_ms"] = round(waited * 1000, 2)
+
+    async def run(self, fn, *args, cancel_event=None, **kwargs):
+        """
+        Run `fn(*args, **kwargs)` on a worker thread once a slot is free.
+
+        When `cancel_event` (a threading.Event) is given it is passed on to `fn`, which
+        should poll it; it is set if the awaiting task is cancelled so the worker can
+        stop early. A `timings` dict among the kwargs gets the queue wait ("queue_wait_ms").
+        """
+        await self._acquire(kwargs.get("timings"))
+        if cancel_event is not None:
+            kwargs["cancel_event"] = cancel_event
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if cancel_event is not None:
+                cancel_event.set()
+            raise
+        finally:
+            if future.done():
+                self._release()
+            else:
+                future.add_done_callback(self._release)
+
+    async def stream(self, gen_fn, *args, cancel_event=None, **kwargs):
+        """
+        Start iterating `gen_fn(*args, **kwargs)` on a worker thread once a slot is free.
+
+        Admission errors are raised here, before any item is produced, so callers can
+        still answer with 429/503. Returns an async iterator over the generator's items;
+        closing it early sets `cancel_event`, which is passed on to `gen_fn`.
+        """
+        await self._acquire(kwargs.get("timings"))
+        if cancel_event is None:
+            cancel_event = threading.Event()
+        kwargs["cancel_event"] = cancel_event
+
+        loop = asyncio.get_running_loop()
+        items = asyncio.Queue()
+
+        def produce():
+            try:
+                for item in gen_fn(*args, **kwargs):
+                    loop.call_soon_threadsafe(items.put_nowait, (item, None))
+                    if cancel_event.is_set():
+                        break
+            except Exception as error:
+                loop.call_soon_threadsafe(items.put_nowait, (_STREAM_END, error))
+            else:
+                loop.call_soon_threadsafe(items.put_nowait, (_STREAM_END, None))
+
+        future = loop.run_in_executor(self._pool, produce)
+        future.add_done_callback(self._release)
+        return self._drain(items, cancel_event)
+
+    @staticmethod
+    async def _drain(items, cancel_event):
+        try:
+            while True:
+                item, error = await items.get()
+                if item is _STREAM_END:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            cancel_event.set()
+
+    async def map(self, fn, items, cancel_event=None):
+        """
+        Run `fn(item, cancel_event=...)` for every item, each admitted like a single request.
+
+        At most `concurrency` items are queued or running at once, so a batch holds no
+        more than its share of the queue and single requests interleave with it.
+        Returns one result per item, in order; an item rejected by admission control
+        gets its QueueFullError or QueueTimeoutError instead of a result.
+        """
+        lanes = asyncio.Semaphore(self.concurrency)
+
+        async def run_item(item):
+            async with lanes:
+                try:
+                    return await self.run(fn, item, cancel_event=cancel_event)
+                except (QueueFullError, QueueTimeoutError) as error:
+                    return error
+
+        return await asyncio.gather(*(run_item(item) for item in items))
+
+    def stats(self):
+        """Current queue depth and utilisation, for health checks."""
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_queue": self.max_queue,
+            "max_wait": self.max_wait,
+        }
+
+
+async def run_until_disconnected(request, executor, fn, *args, **kwargs):
+    """
+    Run `fn` through `executor`, cancelling it if the HTTP client goes away.
+
+    `fn` receives a `cancel_event` keyword argument it can poll between tokens.
+    Returns (result, disconnected); result is None when the client disconnected.
+    """
+    cancel_event = threading.Event()
+    return await until_disconnected(request, executor.run(fn, *args, cancel_event=cancel_event, **kwargs))
+
+
+async def until_disconnected(request, awaitable):
+    """Awaits `awaitable`, cancelling it if the HTTP client goes away; returns (result, disconnected)."""
+    task = asyncio.ensure_future(awaitable)
+
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+        if done:
+            return task.result(), False
+        if await request.is_disconnected():
+            task.cancel()
+            return None, True
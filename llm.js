@@ -1,5 +1,7 @@
 const axios = require('axios');
 
+const API_URL = 'http://localhost:5002';
+
 class LLMService {
     constructor() {
         this.initialized = false;
@@ -7,16 +9,21 @@ class LLMService {
 
     async initialize() {
         if (this.initialized) return;
-        
+
         // Initialize any LLM-specific resources here
         this.initialized = true;
     }
 
-    async generateEmail(prompt) {
+    // Pass `options.onToken` to stream tokens as they are generated
+    async generateEmail(prompt, options = {}) {
         await this.initialize();
-        
+
+        if (options.onToken) {
+            return this.streamEmail(prompt, options.onToken);
+        }
+
         try {
-            const response = await axios.post('http://localhost:5002/generate-email', {
+            const response = await axios.post(`${API_URL}/generate-email`, {
                 prompt: prompt,
                 context: {}
             });
@@ -26,6 +33,63 @@ class LLMService {
             throw new Error('Failed to generate email');
         }
     }
+
+    async streamEmail(prompt, onToken) {
+        let response;
+        try {
+            response = await axios.post(`${API_URL}/generate-email/stream`, {
+                prompt: prompt,
+                context: {}
+            }, { responseType: 'stream' });
+        } catch (error) {
+            console.error('Error in LLM service:', error);
+            throw new Error('Failed to generate email');
+        }
+
+        return new Promise((resolve, reject) => {
+            let buffer = '';
+            let result = null;
+
+            const handleEvent = (raw) => {
+                let event = 'message';
+                let data = '';
+                for (const line of raw.split('\n')) {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                }
+                if (!data) return;
+
+                const payload = JSON.parse(data);
+                if (event === 'token') {
+                    onToken(payload.token);
+                } else if (event === 'done' || event === 'error') {
+                    result = payload;
+                }
+            };
+
+            response.data.on('data', (chunk) => {
+                buffer += chunk.toString('utf8');
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    handleEvent(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+                }
+            });
+
+            response.data.on('end', () => {
+                if (result && result.status === 'success') {
+                    resolve(result);
+                } else {
+                    reject(new Error(result ? result.message : 'Email stream ended unexpectedly'));
+                }
+            });
+
+            response.data.on('error', (error) => {
+                console.error('Error in LLM stream:', error);
+                reject(new Error('Failed to generate email'));
+            });
+        });
+    }
 }
 
-module.exports = new LLMService(); 
\ No newline at end of file
+module.exports = new LLMService();
@@ -1,51 +1,101 @@
-import multiprocessing
-from huggingface_hub import hf_hub_download
-from langchain_community.chat_models import ChatLlamaCpp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from inference_profile import llama_kwargs, load_profile
+from inference_worker import INFERENCE_CONCURRENCY
+from mail_retrieval import build_retrieval_context, estimate_tokens, recipient_from_prompt
+from metrics import decode_tokens_per_second, elapsed_ms, generated_tokens, prefill_seconds, prompt_tokens
+from model_registry import registry
+from prefix_cache import SystemPromptCache
+from response_cache import make_cache_key, response_cache
+from style_profile import style_profile_cache
 
 # Model configuration
 model_name = "lmstudio-community/Llama-3.2-3B-Instruct-GGUF"
 model_file = "Llama-3.2-3B-Instruct-Q4_K_M.gguf"
-model_path = hf_hub_download(model_name, filename=model_file)
-
-# LLM initialization with optimized parameters
-llm = ChatLlamaCpp(
-    temperature=0.7,
-    model_path=model_path,
-    n_ctx=4096,
-    n_gpu_layers=6,
-    n_batch=128,
-    max_tokens=1024,
-    n_threads=multiprocessing.cpu_count() - 1,
-    repeat_penalty=1.2,
-    top_p=0.9,
-    verbose=True,
-)
-
-def generate_email(user_input, user_context=None):
-    """
-    Generate a personalized email based on minimal user input
-    
-    Args:
-        user_input (str): The user's request, which could be as simple as "Write an email to Tom about dinner"
-        user_context (dict, optional): Additional context that might be available from the conversation
-                                      or user preferences (completely optional)
-    
-    Returns:
-        str: Generated email text
-    """
-    # Extract available context if provided
-    context = {}
-    if user_context:
-        context = {
-            "recipient": user_context.get("recipient", None),
-            "tone": user_context.get("tone", None),
-            "style": user_context.get("style", None),
-            "sender_name": user_context.get("sender_name", None),
-            "additional_info": user_context.get("additional_info", None),
-        }
-    
-    # Construct a system prompt that works with minimal information
-    system_prompt = """You are an expert email writer who crafts perfectly tailored messages based on even minimal instructions.
+
+# llama.cpp threads, batch size, mmap/mlock and context size: autotune.py's profile, else
+# CPU-only defaults that split the usable cores between replicas (LLAMA_* env overrides)
+INFERENCE_PROFILE = load_profile()
+# Context window of each replica (prompt + retrieved mail + generated email)
+N_CTX = INFERENCE_PROFILE["n_ctx"]
+# Inject relevant prior mail from emails.db into drafts (set RETRIEVAL_ENABLED=0 to turn off)
+RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "1") != "0"
+# Tokens kept free for chat-template overhead and estimation error
+RETRIEVAL_CONTEXT_MARGIN = 128
+# llama.cpp's own load/timing printouts (request timings are exported via /metrics instead)
+LLAMA_VERBOSE = os.getenv("LLAMA_VERBOSE", "0") == "1"
+
+# Sampling parameters (also part of the response cache key)
+SAMPLING_PARAMS = {
+    "temperature": 0.7,
+    "max_tokens": 1024,
+    "repeat_penalty": 1.2,
+    "top_p": 0.9,
+}
+
+def _download_model():
+    """Resolves the GGUF file, downloading it on first use."""
+    from huggingface_hub import hf_hub_download
+    return hf_hub_download(model_name, filename=model_file)
+
+def _create_llm():
+    """Builds one ChatLlamaCpp replica with the inference profile's settings."""
+    from langchain_community.chat_models import ChatLlamaCpp
+
+    instance = ChatLlamaCpp(
+        model_path=registry.get("email_llm_weights"),
+        **llama_kwargs(INFERENCE_PROFILE),
+        verbose=LLAMA_VERBOSE,
+        **SAMPLING_PARAMS,
+    )
+    # Prefill (or restore) the system prompt now rather than on the first request
+    system_prompt_cache.prepare(instance)
+    return instance
+
+# Models load on first use (or during server warm-up), never at import time
+registry.register("email_llm_weights", _download_model)
+registry.register("email_llm", _create_llm)
+
+# llama.cpp contexts are not thread-safe, so each concurrent generation borrows its own
+# replica. The GGUF weights are mmap'd, so extra replicas mostly cost KV-cache memory.
+# The first replica is the registry's shared "email_llm" instance.
+_llm_pool = queue.LifoQueue()
+_llm_replicas = 0
+_llm_pool_lock = threading.Lock()
+
+@contextmanager
+def checkout_llm():
+    """Borrows a model replica, creating one lazily up to INFERENCE_CONCURRENCY."""
+    global _llm_replicas
+    try:
+        instance = _llm_pool.get_nowait()
+    except queue.Empty:
+        with _llm_pool_lock:
+            replica = _llm_replicas
+            create = replica < INFERENCE_CONCURRENCY
+            if create:
+                _llm_replicas += 1
+        if not create:
+            instance = _llm_pool.get()
+        else:
+            try:
+                instance = registry.get("email_llm") if replica == 0 else _create_llm()
+            except Exception:
+                with _llm_pool_lock:
+                    _llm_replicas -= 1
+                raise
+    try:
+        system_prompt_cache.prepare(instance)
+        yield instance
+    finally:
+        _llm_pool.put(instance)
+
+# Construct a system prompt that works with minimal information
+SYSTEM_PROMPT = """You are an expert email writer who crafts perfectly tailored messages based on even minimal instructions.
 
 Your goal is to create appropriate emails that match the context and purpose implied by the user's request.
 
@@ -61,6 +111,36 @@ Always include:
 Generate only the email content without explanations unless specifically requested.
 """
 
+# The system prompt never changes, so its KV state is computed once and reused
+system_prompt_cache = SystemPromptCache(SYSTEM_PROMPT)
+
+def personalize_context(user_context):
+    """
+    Adds the cached writing-style profile of the sender as context["style_profile"].
+
+    Served from memory (see style_profile.StyleProfileCache). Callers can pass their own
+    "style_profile", or None to opt out; "sender_email" selects whose profile to use.
+    """
+    context = dict(user_context or {})
+    if "style_profile" not in context:
+        context["style_profile"] = style_profile_cache.get(context.get("sender_email"))
+    return context
+
+def build_messages(user_input, user_context=None):
+    """Builds the chat messages for an email request (see generate_email for arguments)."""
+    # Extract available context if provided
+    context = {}
+    if user_context:
+        context = {
+            "recipient": user_context.get("recipient", None),
+            "tone": user_context.get("tone", None),
+            "style": user_context.get("style", None),
+            "sender_name": user_context.get("sender_name", None),
+            "additional_info": user_context.get("additional_info", None),
+            "style_profile": user_context.get("style_profile", None),
+            "retrieved_context": user_context.get("retrieved_context", None),
+        }
+    
     # Create user prompt that incorporates any available context
     user_prompt = f"Write an email based on this request: {user_input}"
     
@@ -76,19 +156,222 @@ Generate only the email content without explanations unless specifically request
         context_hints.append(f"Include these details: {context['additional_info']}")
     if context.get("sender_name"):
         context_hints.append(f"Sign as: {context['sender_name']}")
+    if context.get("style_profile"):
+        # In the user prompt, so the system prompt (and its cached KV state) never changes
+        context_hints.append(_style_hint(context["style_profile"], explicit_tone=bool(context.get("tone"))))
     
     # Add context hints if available
     if context_hints:
         user_prompt += "\n\nAdditional context:\n" + "\n".join(context_hints)
+    if context.get("retrieved_context"):
+        user_prompt += ("\n\nRelevant earlier emails (for facts and continuity; do not quote them):\n"
+                        + context["retrieved_context"])
     
-    # Generate the email
+    # Assemble the chat messages
     messages = [
-        ("system", system_prompt),
+        ("system", SYSTEM_PROMPT),
         ("human", user_prompt),
     ]
+    return messages
+
+def retrieve_context(user_input, user_context, timings=None):
+    """
+    Adds excerpts of relevant prior mail as context["retrieved_context"].
+
+    The recipient comes from context["recipient"] or the request text. The excerpts
+    get whatever the context window leaves after the prompt and the reply
+    (N_CTX - max_tokens - prompt), capped at RETRIEVAL_MAX_TOKENS. Callers can pass
+    their own "retrieved_context", or "retrieval": False to opt out. Stage timings
+    are added to `timings`.
+    """
+    context = dict(user_context or {})
+    if not RETRIEVAL_ENABLED or "retrieved_context" in context or context.pop("retrieval", True) is False:
+        return context
+    prompt_tokens = sum(estimate_tokens(content) for _, content in build_messages(user_input, context))
+    budget = N_CTX - SAMPLING_PARAMS["max_tokens"] - prompt_tokens - RETRIEVAL_CONTEXT_MARGIN
+    recipient = context.get("recipient") or recipient_from_prompt(user_input)
+    try:
+        context["retrieved_context"], stage_timings = build_retrieval_context(user_input, recipient, budget)
+    except Exception as e:
+        # A draft without history beats no draft
+        print(f"⚠️ Mail retrieval failed: {e}")
+        context["retrieved_context"], stage_timings = None, {}
+    if timings is not None:
+        timings.update(stage_timings)
+    return context
+
+def _style_hint(profile, explicit_tone=False):
+    """One line describing the sender's usual style."""
+    traits = []
+    if not explicit_tone:
+        traits.append(f"{profile['tone']} tone")
+    if profile.get("avg_sentence_length"):
+        traits.append(f"about {profile['avg_sentence_length']} words per sentence")
+    traits.append("bullet points where useful" if profile.get("uses_bullets") else "no bullet points")
+    traits.append("emojis are fine" if profile.get("uses_emojis") else "no emojis")
+    hint = "Match the sender's usual writing style: " + ", ".join(traits)
+    if profile.get("common_phrases"):
+        hint += "; phrases they often use: " + ", ".join(f'"{p}"' for p in profile["common_phrases"])
+    return hint
+
+def _cache_lookup(user_input, user_context, use_cache):
+    """Returns (cache_key, cached_email, generation_overrides) for a request."""
+    if not (use_cache and response_cache.enabled):
+        return None, None, {}
+    overrides = response_cache.generation_overrides()
+    key = make_cache_key(user_input, user_context, model_file, {**SAMPLING_PARAMS, **overrides})
+    return key, response_cache.get(key), overrides
+
+def generate_email(user_input, user_context=None, cancel_event=None, use_cache=True, timings=None):
+    """
+    Generate a personalized email based on minimal user input
     
-    response = llm.invoke(messages)
-    return response.content
+    Args:
+        user_input (str): The user's request, which could be as simple as "Write an email to Tom about dinner"
+        user_context (dict, optional): Additional context that might be available from the conversation
+                                      or user preferences (completely optional)
+        cancel_event (threading.Event, optional): When set, generation stops after the
+                                      current token (e.g. the HTTP client disconnected)
+        use_cache (bool, optional): Set to False to bypass the response cache for this request
+        timings (dict, optional): Filled with per-stage timings (see stream_email)
+    
+    Returns:
+        str: Generated email text
+    """
+    # Always streamed: a cancelled request frees its replica without finishing all
+    # tokens, and the first token separates prefill from decode time
+    return "".join(stream_email(user_input, user_context, cancel_event, use_cache, timings))
+
+def stream_email(user_input, user_context=None, cancel_event=None, use_cache=True, timings=None):
+    """
+    Generate an email token by token.
+
+    Takes the same arguments as generate_email and yields text chunks as the model
+    produces them, stopping early once `cancel_event` is set. A cache hit is yielded
+    as a single chunk.
+
+    `timings` gets context_ms (profile, retrieval and cache lookup) and the retrieval
+    stages, then prompt_tokens, prefill_ms, decode_tokens, decode_tokens_per_second
+    and generation_ms once the model has run. The same values feed the /metrics histograms.
+    """
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+    user_context = retrieve_context(user_input, personalize_context(user_context), timings)
+    cache_key, cached, overrides = _cache_lookup(user_input, user_context, use_cache)
+    timings["cache_hit"] = cached is not None
+    if cached is not None:
+        timings["context_ms"] = elapsed_ms(started)
+        yield cached
+        return
+
+    messages = build_messages(user_input, user_context)
+    timings["context_ms"] = elapsed_ms(started)
+    chunks = []
+    with checkout_llm() as model:
+        timings["prompt_tokens"] = _count_prompt_tokens(model, messages)
+        generation_started = first_token_at = time.perf_counter()
+        for chunk in model.stream(messages, **overrides):
+            if cancel_event is not None and cancel_event.is_set():
+                # Never cache a truncated email
+                return
+            if chunk.content:
+                if not chunks:
+                    first_token_at = time.perf_counter()
+                chunks.append(chunk.content)
+                yield chunk.content
+    _record_generation(timings, generation_started, first_token_at, len(chunks))
+
+    if cache_key:
+        response_cache.put(cache_key, "".join(chunks))
+
+def _count_prompt_tokens(model, messages):
+    """Prompt length per the model's tokenizer (message text, without the chat template)."""
+    text = "\n".join(content for _, content in messages)
+    try:
+        return len(model.client.tokenize(text.encode("utf-8"), add_bos=False))
+    except Exception:
+        return estimate_tokens(text)
+
+def _record_generation(timings, started, first_token_at, tokens):
+    """Splits a finished generation into prefill and decode and records both."""
+    finished = time.perf_counter()
+    prefill = first_token_at - started
+    # Each streamed chunk is one token; the first one closes prefill
+    decode_time = finished - first_token_at
+    rate = (tokens - 1) / decode_time if tokens > 1 and decode_time > 0 else None
+
+    prompt_tokens.observe(timings["prompt_tokens"])
+    prefill_seconds.observe(prefill)
+    generated_tokens.observe(tokens)
+    if rate is not None:
+        decode_tokens_per_second.observe(rate)
+    timings.update({
+        "prefill_ms": round(prefill * 1000, 2),
+        "decode_tokens": tokens,
+        "decode_tokens_per_second": round(rate, 2) if rate is not None else None,
+        "generation_ms": round((finished - started) * 1000, 2),
+    })
+
+def plan_batch(requests):
+    """
+    Normalizes batch items and groups identical ones so each is generated once.
+
+    Args:
+        requests (list): Items are either a prompt string or a dict with "prompt" and
+                         optional "context" / "use_cache" keys
+
+    Returns:
+        tuple: (items as dicts, list of position lists sharing one generation)
+    """
+    items = [item if isinstance(item, dict) else {"prompt": item} for item in requests]
+    groups = {}
+    for position, item in enumerate(items):
+        if item.get("use_cache", True):
+            key = make_cache_key(item["prompt"], item.get("context"), model_file, SAMPLING_PARAMS)
+        else:
+            key = ("uncached", position)
+        groups.setdefault(key, []).append(position)
+    return items, list(groups.values())
+
+def generate_batch_item(item, cancel_event=None):
+    """Generates one batch item as a {"status", "email"} or {"status", "message"} dict."""
+    if cancel_event is not None and cancel_event.is_set():
+        return {"status": "error", "message": "Cancelled"}
+    try:
+        email = generate_email(item["prompt"], item.get("context"), cancel_event,
+                               use_cache=item.get("use_cache", True))
+        return {"status": "success", "email": email}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+def generate_emails(requests, cancel_event=None):
+    """
+    Generate many emails at once, sharing the loaded model replicas.
+
+    Identical requests (same normalized prompt and context) are generated only once,
+    cached drafts are returned without touching the model, and the rest run in parallel
+    on up to INFERENCE_CONCURRENCY replicas. For scripts; the server admits each item
+    through its inference queue instead (InferenceExecutor.map).
+
+    Args:
+        requests (list): See plan_batch
+        cancel_event (threading.Event, optional): When set, requests that have not
+                         started yet are skipped
+
+    Returns:
+        list: One {"status", "email"} or {"status", "message"} dict per request, in order
+    """
+    items, groups = plan_batch(requests)
+    results = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=INFERENCE_CONCURRENCY, thread_name_prefix="batch") as pool:
+        futures = {pool.submit(generate_batch_item, items[positions[0]], cancel_event): positions
+                   for positions in groups}
+        for future, positions in futures.items():
+            result = future.result()
+            for position in positions:
+                results[position] = result
+
+    return results
 
 # Example usage in an assistant context
 def ai_assistant_email(user_request):
@@ -0,0 +1,309 @@
+import imaplib
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from database import DB_NAME, create_email_table
+from imap_sync import (
+    FETCH_BATCH_SIZE,
+    HEADER_FETCH_ITEMS,
+    IMAP_FOLDERS,
+    MAX_BODY_BYTES,
+    INSERT_EMAIL_SQL,
+    ROW_BODY,
+    ROW_BODY_PART,
+    ROW_UID,
+    ImapSyncEngine,
+    body_fetch_items,
+    decode_body_items,
+    parse_header_items,
+    quote_mailbox,
+    uid_ranges,
+)
+from storage import close_connections, get_connection
+from style_profile import update_style_profile
+
+# Load environment variables
+load_dotenv()
+
+# JSON list of {"user", "password", "server", "folders": [...]}; falls back to the .env account
+MAIL_ACCOUNTS_FILE = os.getenv("MAIL_ACCOUNTS_FILE", "mail_accounts.json")
+# Concurrent IMAP connections per account (servers often cap this around 10-15)
+IMAP_CONNECTIONS_PER_ACCOUNT = int(os.getenv("IMAP_CONNECTIONS_PER_ACCOUNT", "4"))
+# Processes for MIME parsing and body decoding (0 = parse on a thread instead)
+MAIL_PARSE_WORKERS = int(os.getenv("MAIL_PARSE_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# Parsed batches waiting for the writer; fetchers block when it falls behind
+WRITER_QUEUE_SIZE = int(os.getenv("MAIL_WRITER_QUEUE", "32"))
+
+
+def load_accounts():
+    """Reads the account list from MAIL_ACCOUNTS_FILE, or the single .env account."""
+    if os.path.exists(MAIL_ACCOUNTS_FILE):
+        with open(MAIL_ACCOUNTS_FILE) as f:
+            return json.load(f)
+    user, password = os.getenv("EMAIL_USER"), os.getenv("EMAIL_PASS")
+    if not user or not password:
+        raise ValueError(f"❌ No accounts configured. Create {MAIL_ACCOUNTS_FILE} or set EMAIL_USER and EMAIL_PASS in .env")
+    return [{"user": user, "password": password, "server": os.getenv("IMAP_SERVER", "imap.gmail.com")}]
+
+
+def imap_connector(account):
+    """Returns a zero-argument function opening a logged-in IMAP4_SSL connection."""
+    def connect():
+        conn = imaplib.IMAP4_SSL(account.get("server", "imap.gmail.com"))
+        conn.login(account["user"], account["password"])
+        return conn
+    return connect
+
+
+class ImapConnectionPool:
+    """
+    A small pool of logged-in connections to one account, created on demand.
+
+    Waiters block on a condition rather than the idle list, so dropping a broken
+    connection wakes one of them to open a replacement.
+    """
+
+    def __init__(self, connect, size=IMAP_CONNECTIONS_PER_ACCOUNT):
+        self.connect = connect
+        self.size = size
+        self._idle = []
+        self._created = 0
+        self._available = threading.Condition()
+
+    def _acquire(self):
+        """Returns an idle connection, or None once the caller may create a new one."""
+        with self._available:
+            while not self._idle and self._created >= self.size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+            return None
+
+    def _discard(self):
+        with self._available:
+            self._created -= 1
+            self._available.notify()
+
+    @contextmanager
+    def checkout(self):
+        conn = self._acquire()
+        if conn is None:
+            try:
+                conn = self.connect()
+            except Exception:
+                self._discard()
+                raise
+        try:
+            yield conn
+        except Exception:
+            # The connection may be mid-response; drop it rather than reuse it
+            self._discard()
+            try:
+                conn.logout()
+            except Exception:
+                pass
+            raise
+        else:
+            with self._available:
+                self._idle.append(conn)
+                self._available.notify()
+
+    def close(self):
+        with self._available:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            try:
+                conn.logout()
+            except Exception:
+                pass
+
+
+class DatabaseWriter(threading.Thread):
+    """
+    The only stage that writes to emails.db.
+
+    Fetch workers finish UID chunks out of order, so each folder's watermark only
+    advances over the longest run of consecutive finished chunks, committed in the
+    same transaction as their rows. An interrupted ingest resumes after that point.
+    """
+
+    def __init__(self, db_path=DB_NAME, queue_size=WRITER_QUEUE_SIZE):
+        super().__init__(name="mail-writer", daemon=True)
+        self.db_path = db_path
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._folders = {}
+        self.error = None
+        self.stored = 0
+
+    def plan(self, account, folder, uidvalidity, chunk_ends):
+        """Announces the chunks a folder is split into, in UID order."""
+        self._queue.put(("plan", (account, folder), uidvalidity, list(chunk_ends)))
+
+    def submit(self, account, folder, chunk_end, rows):
+        self._queue.put(("rows", (account, folder), chunk_end, rows))
+
+    def stop(self):
+        self._queue.put(("stop",))
+
+    def _advance_watermark(self, db, key):
+        state = self._folders[key]
+        last_uid = None
+        while state["chunks"] and state["chunks"][0] in state["done"]:
+            last_uid = state["chunks"].pop(0)
+            state["done"].discard(last_uid)
+        if last_uid is not None:
+            db.execute("""
+            INSERT OR REPLACE INTO sync_state (account, folder, uidvalidity, last_uid) VALUES (?, ?, ?, ?)
+            """, (key[0], key[1], state["uidvalidity"], last_uid))
+
+    def run(self):
+        db = get_connection(self.db_path)
+        try:
+            while True:
+                message = self._queue.get()
+                if message[0] == "stop":
+                    return
+                if self.error:
+                    continue  # Drain so producers never block on a dead writer
+                try:
+                    if message[0] == "plan":
+                        _, key, uidvalidity, chunk_ends = message
+                        self._folders[key] = {"uidvalidity": uidvalidity, "chunks": chunk_ends, "done": set()}
+                    else:
+                        _, key, chunk_end, rows = message
+                        db.executemany(INSERT_EMAIL_SQL, rows)
+                        self._folders[key]["done"].add(chunk_end)
+                        self._advance_watermark(db, key)
+                        db.commit()
+                        self.stored += len(rows)
+                except Exception as error:
+                    db.rollback()
+                    self.error = error
+        finally:
+            close_connections()
+
+
+class MailIngestPipeline:
+    """
+    Parallel initial/incremental ingest for several accounts.
+
+    Stages: a planner per account lists new UIDs per folder (as ImapSyncEngine does)
+    and splits them into chunks; fetch threads pull header and body data for chunks
+    concurrently over each account's connection pool; MIME parsing and body decoding
+    run in a process pool; a single DatabaseWriter thread stores the results.
+    """
+
+    def __init__(self, accounts, db_path=DB_NAME, connections_per_account=IMAP_CONNECTIONS_PER_ACCOUNT,
+                 parse_workers=MAIL_PARSE_WORKERS, batch_size=FETCH_BATCH_SIZE, max_body_bytes=MAX_BODY_BYTES,
+                 connector=imap_connector):
+        self.accounts = accounts
+        self.db_path = db_path
+        self.connections_per_account = connections_per_account
+        self.parse_workers = parse_workers
+        self.batch_size = batch_size
+        self.max_body_bytes = max_body_bytes
+        self.connector = connector
+
+    def _fetch_chunk(self, pool, parse_pool, writer, account, label, folder, uidvalidity, chunk):
+        with pool.checkout() as imap:
+            imap.select(quote_mailbox(folder), readonly=True)
+            status, data = imap.uid("FETCH", uid_ranges(chunk), HEADER_FETCH_ITEMS)
+            if status != "OK":
+                raise RuntimeError(f"UID FETCH failed in {folder}: {data}")
+
+        # Parse while the connection serves other chunks
+        rows = parse_pool.submit(parse_header_items, account, label, folder, uidvalidity, data).result()
+
+        parts_by_section = {}
+        for row in rows:
+            if row[ROW_BODY] is None:
+                part = json.loads(row[ROW_BODY_PART])
+                parts_by_section.setdefault(part["section"], {})[row[ROW_UID]] = part
+
+        if parts_by_section:
+            responses = []
+            with pool.checkout() as imap:
+                imap.select(quote_mailbox(folder), readonly=True)
+                for section, parts in parts_by_section.items():
+                    status, data = imap.uid("FETCH", uid_ranges(sorted(parts)),
+                                            body_fetch_items(section, self.max_body_bytes))
+                    if status != "OK":
+                        raise RuntimeError(f"Body fetch failed in {folder}: {data}")
+                    responses.append((data, parts))
+
+            bodies = {}
+            for future in [parse_pool.submit(decode_body_items, data, parts) for data, parts in responses]:
+                bodies.update(future.result())
+            rows = [row[:ROW_BODY] + (bodies.get(row[ROW_UID]),) + row[ROW_BODY + 1:] for row in rows]
+
+        writer.submit(account, folder, chunk[-1], rows)
+        return len(rows)
+
+    def run(self):
+        """Ingests every account; returns {account: {label: messages stored}}."""
+        create_email_table(self.db_path)
+        writer = DatabaseWriter(self.db_path)
+        writer.start()
+
+        parse_pool = (ProcessPoolExecutor(self.parse_workers) if self.parse_workers > 0
+                      else ThreadPoolExecutor(1, thread_name_prefix="mail-parse"))
+        fetch_pool = ThreadPoolExecutor(max(1, len(self.accounts) * self.connections_per_account),
+                                        thread_name_prefix="mail-fetch")
+        pools = []
+        futures = {}
+        stats = {}
+        planner_db = get_connection(self.db_path)
+        try:
+            for account in self.accounts:
+                user = account["user"]
+                pool = ImapConnectionPool(self.connector(account), self.connections_per_account)
+                pools.append(pool)
+                engine = ImapSyncEngine(None, user, self.db_path, account.get("folders", IMAP_FOLDERS),
+                                        self.batch_size)
+                stats[user] = {}
+
+                with pool.checkout() as imap:
+                    for label, folder in engine.resolve_folders(imap, engine.folders):
+                        opened = engine.open_folder(imap, planner_db, folder)
+                        if opened is None:
+                            continue
+                        uidvalidity, last_uid = opened
+                        uids = engine.new_uids(imap, last_uid)
+                        chunks = [uids[i:i + self.batch_size] for i in range(0, len(uids), self.batch_size)]
+                        writer.plan(user, folder, uidvalidity, [chunk[-1] for chunk in chunks])
+                        stats[user][label] = 0
+                        for chunk in chunks:
+                            future = fetch_pool.submit(self._fetch_chunk, pool, parse_pool, writer,
+                                                       user, label, folder, uidvalidity, chunk)
+                            futures[future] = (user, label)
+
+            wait(futures)
+            for future, (user, label) in futures.items():
+                stats[user][label] += future.result()
+        finally:
+            fetch_pool.shutdown(wait=True, cancel_futures=True)
+            parse_pool.shutdown(wait=True)
+            writer.stop()
+            writer.join()
+            for pool in pools:
+                pool.close()
+
+        if writer.error:
+            raise writer.error
+        return stats
+
+
+if __name__ == "__main__":
+    try:
+        accounts = load_accounts()
+        stats = MailIngestPipeline(accounts).run()
+        print(f"✅ Mail ingest finished: {stats}")
+        for account in accounts:
+            update_style_profile(account["user"])
+    except Exception as error:
+        print(f"❌ Error ingesting mail: {error}")
@@ -0,0 +1,170 @@
+import os
+import re
+import time
+from datetime import datetime
+from database import DB_NAME, ensure_schema, parse_address
+from email_search import to_fts_query
+from metrics import sqlite_query_seconds
+from storage import get_connection
+
+# Prior messages injected into a draft prompt
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+# Upper bound on retrieved-context tokens, whatever room the context window leaves
+RETRIEVAL_MAX_TOKENS = int(os.getenv("RETRIEVAL_MAX_TOKENS", "1024"))
+# Characters per token used for budgeting (conservative for English with Llama tokenizers)
+CHARS_PER_TOKEN = float(os.getenv("RETRIEVAL_CHARS_PER_TOKEN", "3.5"))
+
+# Words that say nothing about which earlier mail is relevant
+_STOPWORDS = {
+    "a", "about", "an", "and", "are", "as", "ask", "at", "be", "by", "can", "draft", "email", "for",
+    "from", "give", "he", "her", "him", "his", "i", "in", "is", "it", "let", "mail", "me", "my", "of",
+    "on", "or", "our", "please", "reply", "say", "send", "she", "tell", "that", "the", "their",
+    "them", "they", "this", "to", "us", "we", "with", "write", "you", "your",
+}
+# Attribution line that starts a quoted reply ("On <date>, <name> wrote:", Outlook's
+# "-----Original Message-----" or its "From: ..." line followed by "Sent:"/"Date:")
+_QUOTE_HEADER = re.compile(
+    r"(?im)^[ \t]*(?:on\b[^\n]{0,200}\bwrote:[ \t]*$"
+    r"|-{2,}[ \t]*original message[ \t]*-{2,}[ \t]*$"
+    r"|from:[ \t][^\n]*\n[ \t]*(?:sent|date):[ \t])"
+)
+_SIGNATURE = re.compile(r"(?m)^--\s*$.*", re.S)
+_QUOTED_LINE = re.compile(r"(?m)^\s*>.*(\n|$)")
+_WHITESPACE = re.compile(r"\s+")
+# "... to Tom about ...", "reply to Anna Berg", or a bare address in the request
+_PROMPT_ADDRESS = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_PROMPT_NAME = re.compile(r"\b(?:to|for|with)\s+([A-Z][\w'-]+(?:\s+[A-Z][\w'-]+)?)")
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (no tokenizer call on the request path)."""
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def recipient_from_prompt(prompt):
+    """Best guess at the recipient named in a free-text request, or None."""
+    match = _PROMPT_ADDRESS.search(prompt) or _PROMPT_NAME.search(prompt)
+    return match.group(match.lastindex or 0) if match else None
+
+
+def relevance_query(prompt):
+    """FTS5 query matching any meaningful word of the prompt (bm25 ranks the overlap)."""
+    words = [w for w in re.findall(r"[\w@.'-]+", prompt.lower()) if w not in _STOPWORDS and len(w) > 1]
+    return " OR ".join(to_fts_query(word) for word in dict.fromkeys(words) if to_fts_query(word))
+
+
+def resolve_correspondent(conn, recipient):
+    """Maps a recipient (address or name) to the address it is stored under, or None."""
+    if not recipient:
+        return None
+    if "@" in recipient:
+        return parse_address(recipient)
+    name_query = to_fts_query(recipient)
+    if not name_query:
+        return None
+    # Name lookup goes through the FTS index on the sender column, not a LIKE scan
+    row = conn.execute("""
+    SELECT e.sender_address, COUNT(*) AS n
+    FROM emails_fts JOIN emails e ON e.id = emails_fts.rowid
+    WHERE emails_fts MATCH ?
+    GROUP BY e.sender_address
+    ORDER BY n DESC
+    LIMIT 1
+    """, (f"sender : ({name_query})",)).fetchone()
+    return row[0] if row else None
+
+
+def retrieve_messages(conn, prompt, correspondent=None, k=RETRIEVAL_TOP_K):
+    """
+    Top-k prior messages for a draft: best bm25 matches for the prompt (within the
+    thread with `correspondent` when known), topped up with that thread's latest mail.
+    """
+    columns = "e.id, e.subject, e.body, e.sender_address, e.direction, e.sent_at"
+    found = {}
+    match = relevance_query(prompt)
+    if match:
+        sql = f"""
+        SELECT {columns} FROM emails_fts JOIN emails e ON e.id = emails_fts.rowid
+        WHERE emails_fts MATCH ? {"AND e.correspondent = ?" if correspondent else ""}
+        ORDER BY bm25(emails_fts, 5.0, 1.0, 2.0)
+        LIMIT ?
+        """
+        params = [match] + ([correspondent] if correspondent else []) + [k]
+        for row in conn.execute(sql, params):
+            found[row[0]] = row
+    if correspondent and len(found) < k:
+        # Index seek on (correspondent, sent_at)
+        for row in conn.execute(f"""
+        SELECT {columns} FROM emails e WHERE e.correspondent = ? ORDER BY e.sent_at DESC LIMIT ?
+        """, (correspondent, k)):
+            if len(found) >= k:
+                break
+            found.setdefault(row[0], row)
+    return list(found.values())
+
+
+def clean_body(body):
+    """Drops quoted replies and signatures, collapses whitespace."""
+    body = body or ""
+    # Everything after the reply's attribution line is the quoted thread
+    quote = _QUOTE_HEADER.search(body)
+    if quote:
+        body = body[:quote.start()]
+    body = _SIGNATURE.sub("", body)
+    body = _QUOTED_LINE.sub("", body)
+    return _WHITESPACE.sub(" ", body).strip()
+
+
+def compress_messages(messages, budget_tokens):
+    """
+    Renders messages as compact excerpts within `budget_tokens`.
+
+    Every message gets an equal share of the budget; space a short message doesn't use
+    passes on to the next one. Excerpts are cut at a word boundary.
+    """
+    budget_chars = int(budget_tokens * CHARS_PER_TOKEN)
+    excerpts = []
+    for position, (_, subject, body, sender, direction, sent_at) in enumerate(messages):
+        remaining = budget_chars - sum(len(e) + 1 for e in excerpts)
+        share = remaining // (len(messages) - position)
+        date = datetime.fromtimestamp(sent_at).strftime("%Y-%m-%d") if sent_at else "undated"
+        who = "me" if direction == "sent" else (sender or "unknown")
+        header = f"[{date}] from {who}, subject: {subject or '(none)'}\n"
+        if len(header) + 20 > share:
+            continue
+        text = clean_body(body)
+        room = share - len(header)
+        if len(text) > room:
+            text = text[:room].rsplit(" ", 1)[0] + " …"
+        excerpts.append(header + text)
+    return "\n".join(excerpts)
+
+
+def build_retrieval_context(prompt, recipient=None, budget_tokens=RETRIEVAL_MAX_TOKENS,
+                            k=RETRIEVAL_TOP_K, db_path=DB_NAME):
+    """
+    Retrieves and compresses prior mail for a draft.
+
+    Returns:
+        tuple: (context text or None, {"retrieval_search_ms", "retrieval_compress_ms",
+                "retrieved_messages", "retrieved_tokens"})
+    """
+    timings = {}
+    start = time.perf_counter()
+    budget_tokens = min(budget_tokens, RETRIEVAL_MAX_TOKENS)
+    if budget_tokens <= 0:
+        return None, timings
+
+    ensure_schema(db_path)
+    conn = get_connection(db_path)
+    with sqlite_query_seconds.time(query="retrieval"):
+        correspondent = resolve_correspondent(conn, recipient)
+        messages = retrieve_messages(conn, prompt, correspondent, k)
+    searched = time.perf_counter()
+
+    text = compress_messages(messages, budget_tokens) if messages else ""
+    timings["retrieval_search_ms"] = round((searched - start) * 1000, 2)
+    timings["retrieval_compress_ms"] = round((time.perf_counter() - searched) * 1000, 2)
+    timings["retrieved_messages"] = len(messages)
+    timings["retrieved_tokens"] = estimate_tokens(text) if text else 0
+    return text or None, timings
@@ -308,7 +308,9 @@ ipcMain.handle('generate-email', async (event, prompt) => {
         }
 
         const llm = await initializeFeature('llm');
-        const result = await llm.generateEmail(prompt);
+        const result = await llm.generateEmail(prompt, {
+            onToken: (token) => event.sender.send('email-token', token)
+        });
 
         // Save to history if enabled
         const history = await initializeFeature('history');
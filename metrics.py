@@ -0,0 +1,162 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Bucket upper bounds; +Inf is always added
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (32, 64, 128, 256, 512, 768, 1024, 1536, 2048, 3072, 4096)
+RATE_BUCKETS = (1, 2, 4, 6, 8, 10, 15, 20, 30, 50, 75, 100, 200)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus data model.
+
+    Label values are passed as keyword arguments to observe()/time(); each distinct
+    combination is its own series. Keep label values to a small fixed set.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, labels=()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the `with` block in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = []
+        for key, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="{}"'.format("+Inf" if bound == float("inf") else _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Gauge:
+    """A value read from a callback whenever /metrics is scraped."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def render(self):
+        try:
+            value = self.read()
+        except Exception:
+            return []  # Source not ready (e.g. nothing loaded yet)
+        return [f"{self.name} {_format_value(value)}"] if value is not None else []
+
+
+class CounterFunc(Gauge):
+    """A monotonically increasing count kept elsewhere (e.g. cache hit counters)."""
+
+    kind = "counter"
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            # Modules can be imported more than once (e.g. scripts and the server)
+            return self._metrics.setdefault(metric.name, metric)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, labels=()):
+        return self._register(Histogram(name, help_text, buckets, labels))
+
+    def gauge(self, name, help_text, read):
+        return self._register(Gauge(name, help_text, read))
+
+    def counter_func(self, name, help_text, read):
+        return self._register(CounterFunc(name, help_text, read))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# 🔹 Request-path metrics (observed where the work happens)
+
+queue_wait_seconds = metrics.histogram(
+    "inference_queue_wait_seconds", "Time a generation waited for an inference slot")
+prompt_tokens = metrics.histogram(
+    "llm_prompt_tokens", "Prompt length in tokens", TOKEN_BUCKETS)
+prefill_seconds = metrics.histogram(
+    "llm_prefill_seconds", "Time from submitting the prompt to the first generated token")
+decode_tokens_per_second = metrics.histogram(
+    "llm_decode_tokens_per_second", "Generation speed after the first token", RATE_BUCKETS)
+generated_tokens = metrics.histogram(
+    "llm_generated_tokens", "Tokens generated per email", TOKEN_BUCKETS)
+request_seconds = metrics.histogram(
+    "http_request_duration_seconds", "End-to-end request latency", labels=("endpoint", "status"))
+embedding_seconds = metrics.histogram(
+    "embedding_encode_seconds", "Sentence-encoder time per batch of uncached texts")
+faiss_search_seconds = metrics.histogram(
+    "faiss_search_seconds", "FAISS index search time per batch of queries", labels=("backend",))
+sqlite_query_seconds = metrics.histogram(
+    "sqlite_query_seconds", "SQLite query time on the request path", labels=("query",))
+
+
+def elapsed_ms(started):
+    """Milliseconds since a time.perf_counter() reading, for per-request timing fields."""
+    return round((time.perf_counter() - started) * 1000, 2)
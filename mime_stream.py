@@ -0,0 +1,240 @@
+import base64
+import binascii
+import codecs
+import html
+import os
+import quopri
+import re
+from email.parser import BytesFeedParser
+from email.policy import compat32
+
+# Decoded text kept per body part; the rest of the part is skipped as it streams past
+MAX_PART_BYTES = int(os.getenv("MIME_MAX_PART_BYTES", str(256 * 1024)))
+# Header block size limit per part (protects against malformed, header-only garbage)
+MAX_HEADER_BYTES = int(os.getenv("MIME_MAX_HEADER_BYTES", str(64 * 1024)))
+
+# Lines longer than this can't be boundaries; they are handled without buffering them
+_MAX_LINE = 8192
+# Common mislabels and aliases Python doesn't know
+_CHARSET_ALIASES = {
+    "gb2312": "gb18030",
+    "gbk": "gb18030",
+    "ks_c_5601-1987": "cp949",
+    "iso-8859-8-i": "iso-8859-8",
+    "unknown-8bit": "cp1252",
+    "x-unknown": "cp1252",
+    "us-ascii": "cp1252",  # Many "ASCII" mails contain Windows-1252 bytes
+}
+
+_HTML_DROP = re.compile(r"(?is)<(script|style|head|title)\b.*?</\1\s*>|<!--.*?-->")
+_HTML_BREAK = re.compile(r"(?i)<\s*(br|/p|/div|/li|/tr|/h[1-6]|/blockquote|/table)\b[^>]*>")
+_HTML_ITEM = re.compile(r"(?i)<\s*li\b[^>]*>")
+_HTML_TAG = re.compile(r"(?s)<[^>]*>")
+_SPACES = re.compile(r"[ \t\r\f\v ]+")
+_BLANK_LINES = re.compile(r"\n\s*\n\s*(\n\s*)+")
+
+
+def html_to_text(markup):
+    """Fast HTML → text: drops scripts/styles, keeps paragraph breaks, unescapes entities."""
+    markup = _HTML_DROP.sub(" ", markup)
+    markup = _HTML_BREAK.sub("\n", markup)
+    markup = _HTML_ITEM.sub("\n• ", markup)
+    text = html.unescape(_HTML_TAG.sub(" ", markup))
+    text = "\n".join(_SPACES.sub(" ", line).strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def _codec(charset):
+    charset = (charset or "utf-8").strip().strip('"').lower()
+    charset = _CHARSET_ALIASES.get(charset, charset)
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return "utf-8"
+
+
+def decode_part(payload, encoding, charset):
+    """Undoes the transfer encoding and charset of a (possibly truncated) body part."""
+    encoding = (encoding or "7bit").lower()
+    if encoding == "base64":
+        # Drop line breaks, then any partial quantum a size cap may have cut off
+        payload = b"".join(payload.split())
+        payload = payload[: len(payload) - len(payload) % 4]
+        try:
+            payload = base64.b64decode(payload)
+        except binascii.Error:
+            payload = base64.b64decode(payload, validate=False) if payload else b""
+    elif encoding == "quoted-printable":
+        payload = quopri.decodestring(payload)
+    return payload.decode(_codec(charset), errors="replace")
+
+
+def _parse_headers(block):
+    """Parses one header block with the incremental feed parser."""
+    parser = BytesFeedParser(policy=compat32)
+    parser.feed(block)
+    parser.feed(b"\r\n\r\n")
+    return parser.close()
+
+
+class StreamingBodyExtractor:
+    """
+    Pulls the readable body out of a raw RFC 822 message fed in arbitrary chunks.
+
+    Only one line (up to 8 KB) and the kept text parts (up to `max_part_bytes` each)
+    are ever buffered: part headers are parsed as they arrive, attachments, images
+    and nested messages are skipped line by line without being stored or decoded,
+    and text/plain is preferred over text/html (converted to text) when both exist.
+
+        extractor = StreamingBodyExtractor()
+        for chunk in chunks:
+            extractor.feed(chunk)
+        body = extractor.close()
+    """
+
+    def __init__(self, max_part_bytes=MAX_PART_BYTES, max_header_bytes=MAX_HEADER_BYTES):
+        self.max_part_bytes = max_part_bytes
+        self.max_header_bytes = max_header_bytes
+        self._partial = b""
+        self._long_line = False
+        self._boundaries = []
+        self._state = "headers"
+        self._header_lines = []
+        self._header_size = 0
+        self._part = None
+        self._buffer = []
+        self._buffered = 0
+        self.plain = None
+        self.html = None
+        self.skipped_bytes = 0
+
+    # 🔹 Input
+
+    def feed(self, data):
+        data = self._partial + bytes(data)
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            if end < 0:
+                break
+            self._line(data[start:end + 1])
+            start = end + 1
+        rest = data[start:]
+        if len(rest) > _MAX_LINE:
+            # An over-long line is never a boundary or header; pass it on in pieces
+            self._line(rest, complete=False)
+            rest = b""
+        self._partial = rest
+
+    def close(self):
+        """Finishes parsing; returns the body text, or None if there was no text part."""
+        if self._partial:
+            self._line(self._partial)
+            self._partial = b""
+        self._end_part()
+        if self.plain is not None:
+            return self.plain
+        if self.html is not None:
+            return html_to_text(self.html)
+        return None
+
+    # 🔹 Line handling
+
+    def _boundary(self, line):
+        """Returns (index, closing) if the line is a boundary of an open multipart."""
+        if not self._boundaries or not line.startswith(b"--") or self._long_line:
+            return None
+        stripped = line.rstrip()
+        for index in range(len(self._boundaries) - 1, -1, -1):
+            marker = b"--" + self._boundaries[index]
+            if stripped == marker:
+                return index, False
+            if stripped == marker + b"--":
+                return index, True
+        return None
+
+    def _line(self, line, complete=True):
+        boundary = self._boundary(line)
+        self._long_line = not complete
+        if boundary is not None:
+            index, closing = boundary
+            self._end_part()
+            del self._boundaries[index + 1:]
+            if closing:
+                self._boundaries.pop()
+                self._state = "skip"  # Epilogue
+            else:
+                self._state = "headers"
+            return
+
+        if self._state == "headers":
+            if line.strip() == b"" and complete:
+                self._start_part()
+            elif self._header_size < self.max_header_bytes:
+                self._header_lines.append(line)
+                self._header_size += len(line)
+        elif self._state == "collect":
+            room = max(0, self.max_part_bytes - self._buffered)
+            if room:
+                self._buffer.append(line[:room])
+                self._buffered += min(len(line), room)
+            self.skipped_bytes += max(0, len(line) - room)
+        else:
+            self.skipped_bytes += len(line)
+
+    def _start_part(self):
+        headers = _parse_headers(b"".join(self._header_lines))
+        self._header_lines = []
+        self._header_size = 0
+
+        content_type = headers.get_content_type()
+        disposition = (headers.get("Content-Disposition") or "").split(";")[0].strip().lower()
+        if headers.get_content_maintype() == "multipart":
+            boundary = headers.get_param("boundary")
+            if boundary:
+                self._boundaries.append(str(boundary).encode("utf-8", "replace"))
+                self._state = "skip"  # Preamble
+                return
+
+        wanted = (content_type == "text/plain" and self.plain is None) or \
+                 (content_type == "text/html" and self.html is None and self.plain is None)
+        if wanted and disposition != "attachment":
+            self._part = {
+                "type": content_type,
+                "encoding": (headers.get("Content-Transfer-Encoding") or "7bit").strip(),
+                "charset": headers.get_content_charset() or "utf-8",
+            }
+            self._buffer = []
+            self._buffered = 0
+            self._state = "collect"
+        else:
+            self._state = "skip"
+
+    def _end_part(self):
+        if self._state == "collect" and self._part is not None:
+            payload = b"".join(self._buffer)
+            text = decode_part(payload, self._part["encoding"], self._part["charset"])
+            if self._part["type"] == "text/plain":
+                self.plain = text
+            else:
+                self.html = text
+        if self._state == "headers" and self._header_lines:
+            # Message ended inside a header block (e.g. a header-only message)
+            self._header_lines = []
+        self._part = None
+        self._buffer = []
+        self._buffered = 0
+        self._state = "skip"
+
+
+def extract_body(raw, chunk_size=64 * 1024, max_part_bytes=MAX_PART_BYTES):
+    """Body text of a raw message (bytes or an iterable of byte chunks), or None."""
+    extractor = StreamingBodyExtractor(max_part_bytes)
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        view = memoryview(raw)
+        for start in range(0, len(view), chunk_size):
+            extractor.feed(view[start:start + chunk_size])
+    else:
+        for chunk in raw:
+            extractor.feed(chunk)
+    return extractor.close()
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+
+# Sentence embedding model shared by the browsing-history recommenders
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+
+class ModelRegistry:
+    """
+    Loads each registered model at most once per process, on first use.
+
+    Modules register a zero-argument loader under a name at import time (which is
+    cheap) and call `get(name)` when they actually need the model. `warm_up()` loads
+    everything in a background thread so a server can accept requests immediately.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._errors = {}
+        self._load_times = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        """Registers `loader` under `name`; the first registration wins."""
+        with self._lock:
+            if name not in self._loaders:
+                self._loaders[name] = loader
+                self._locks[name] = threading.Lock()
+
+    def get(self, name):
+        """Returns the model, loading it first if this is the first call."""
+        if name in self._models:
+            return self._models[name]
+        if name not in self._loaders:
+            raise KeyError(f"No model registered under '{name}'")
+
+        with self._locks[name]:
+            # Another thread may have finished loading while we waited
+            if name not in self._models:
+                started = time.perf_counter()
+                try:
+                    self._models[name] = self._loaders[name]()
+                except Exception as error:
+                    self._errors[name] = str(error)
+                    raise
+                self._errors.pop(name, None)
+                self._load_times[name] = time.perf_counter() - started
+                print(f"✅ Loaded model '{name}' in {self._load_times[name]:.1f}s")
+        return self._models[name]
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def warm_up(self, names=None):
+        """Loads the given models (default: all registered) on a daemon thread."""
+        names = list(names or self._loaders)
+
+        def load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as error:
+                    print(f"❌ Failed to load model '{name}': {error}")
+
+        thread = threading.Thread(target=load_all, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def ready(self, names=None):
+        """True once every given model (default: all registered) is loaded."""
+        return all(self.is_loaded(name) for name in (names or self._loaders))
+
+    def status(self):
+        """Per-model load state, for readiness endpoints."""
+        states = {}
+        for name in self._loaders:
+            if name in self._models:
+                states[name] = {"state": "loaded", "load_time": round(self._load_times[name], 2)}
+            elif name in self._errors:
+                states[name] = {"state": "failed", "error": self._errors[name]}
+            elif self._locks[name].locked():
+                states[name] = {"state": "loading"}
+            else:
+                states[name] = {"state": "pending"}
+        return states
+
+
+registry = ModelRegistry()
+
+
+def _load_sentence_encoder():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+
+registry.register("sentence_encoder", _load_sentence_encoder)
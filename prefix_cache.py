@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Keep the evaluated system prompt in memory and restore it before each generation
+PREFIX_CACHE_ENABLED = os.getenv("PREFIX_CACHE", "1") != "0"
+# Also persist it next to the GGUF file so restarts skip the system-prompt prefill
+PREFIX_CACHE_DISK = os.getenv("PREFIX_CACHE_DISK", "1") != "0"
+
+# First line of a state file; bumped whenever the layout changes
+_STATE_FORMAT = "prefix-state/2"
+
+
+def write_state(path, state, fingerprint):
+    """
+    Writes a LlamaState as a JSON header line followed by raw bytes (no pickle).
+
+    The header carries the fingerprint and the size of each section, so a file from
+    another model, prompt or llama-cpp-python version is detected before use.
+    """
+    input_ids = state.input_ids.astype("intc").tobytes()
+    scores = state.scores.astype("single").tobytes()
+    header = {
+        "format": _STATE_FORMAT,
+        "fingerprint": fingerprint,
+        "n_tokens": int(state.n_tokens),
+        "input_ids_bytes": len(input_ids),
+        "scores_shape": list(state.scores.shape),
+        "scores_bytes": len(scores),
+        "llama_state_size": int(state.llama_state_size),
+        "seed": int(state.seed),
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(json.dumps(header).encode("utf-8") + b"\n")
+        f.write(input_ids)
+        f.write(scores)
+        f.write(bytes(state.llama_state))
+    os.replace(tmp_path, path)
+
+
+def read_state(path, fingerprint):
+    """Reads a state written by write_state; raises ValueError if it doesn't match `fingerprint`."""
+    import numpy as np
+    from llama_cpp import LlamaState
+
+    with open(path, "rb") as f:
+        header = json.loads(f.readline())
+        if header.get("format") != _STATE_FORMAT or header.get("fingerprint") != fingerprint:
+            raise ValueError("state was saved for another model, prompt or llama.cpp version")
+        input_ids = f.read(header["input_ids_bytes"])
+        scores = f.read(header["scores_bytes"])
+        llama_state = f.read(header["llama_state_size"])
+        if (len(input_ids), len(scores), len(llama_state)) != (
+                header["input_ids_bytes"], header["scores_bytes"], header["llama_state_size"]) or f.read(1):
+            raise ValueError("state file is truncated or has trailing data")
+    return LlamaState(
+        input_ids=np.frombuffer(input_ids, dtype=np.intc).copy(),
+        scores=np.frombuffer(scores, dtype=np.single).reshape(header["scores_shape"]).copy(),
+        n_tokens=header["n_tokens"],
+        llama_state=llama_state,
+        llama_state_size=header["llama_state_size"],
+        seed=header["seed"],
+    )
+
+
+class SystemPromptCache:
+    """
+    Reuses llama.cpp KV state for the fixed system prompt across requests.
+
+    The system prompt is evaluated once (or loaded from disk) and the resulting state is
+    snapshotted. Before a generation, a replica that does not already hold the system
+    prompt in its context gets the snapshot restored; llama.cpp then only evaluates the
+    tokens after the longest common prefix, i.e. the user's request.
+    """
+
+    def __init__(self, system_prompt, enabled=PREFIX_CACHE_ENABLED, persist=PREFIX_CACHE_DISK):
+        self.system_prompt = system_prompt
+        self.enabled = enabled
+        self.persist = persist
+        self._state = None
+        self._prefix_ids = None
+        self._min_shared = 0
+        self._lock = threading.Lock()
+        self.restores = 0
+
+    def _fingerprint(self, llama):
+        """Hash of everything the KV state depends on: model file, prompt, context and llama.cpp."""
+        import llama_cpp
+
+        model = os.stat(llama.model_path)
+        return hashlib.sha256(
+            f"{os.path.abspath(llama.model_path)}|{model.st_size}|{model.st_mtime_ns}|"
+            f"{self.system_prompt}|{llama.n_ctx()}|{llama_cpp.__version__}".encode("utf-8")
+        ).hexdigest()
+
+    def _state_path(self, llama, fingerprint):
+        return f"{llama.model_path}.prefix-{fingerprint[:16]}.state"
+
+    def _messages(self):
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": ""},
+        ]
+
+    def _build_state(self, llama):
+        """Loads the snapshot from disk, or evaluates the system prompt and saves one."""
+        fingerprint = self._fingerprint(llama) if self.persist else None
+        path = self._state_path(llama, fingerprint) if self.persist else None
+        if path and os.path.exists(path):
+            try:
+                return read_state(path, fingerprint)
+            except (OSError, ValueError, KeyError) as error:
+                print(f"⚠️ Ignoring unreadable prefix cache {path}: {error}")
+
+        started = time.perf_counter()
+        llama.create_chat_completion(messages=self._messages(), max_tokens=1)
+        state = llama.save_state()
+        print(f"✅ System prompt prefilled in {time.perf_counter() - started:.2f}s ({state.n_tokens} tokens)")
+
+        if path:
+            try:
+                write_state(path, state, fingerprint)
+            except OSError as error:
+                print(f"⚠️ Could not save prefix cache to {path}: {error}")
+        return state
+
+    def prepare(self, chat_model):
+        """Makes sure the replica's context starts with the evaluated system prompt."""
+        if not self.enabled:
+            return
+        llama = chat_model.client
+
+        if self._state is None:
+            with self._lock:
+                if self._state is None:
+                    state = self._build_state(llama)
+                    self._prefix_ids = state.input_ids[:state.n_tokens].tolist()
+                    # The system prompt text alone is a lower bound on the reusable prefix
+                    system_ids = llama.tokenize(self.system_prompt.encode("utf-8"), add_bos=False)
+                    self._min_shared = min(len(system_ids), len(self._prefix_ids))
+                    self._state = state
+
+        current_ids = llama.input_ids[:llama.n_tokens].tolist()
+        if llama.longest_token_prefix(current_ids, self._prefix_ids) < self._min_shared:
+            llama.load_state(self._state)
+            self.restores += 1
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "prefix_tokens": len(self._prefix_ids) if self._prefix_ids else 0,
+            "restores": self.restores,
+        }
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from metrics import sqlite_query_seconds
+from storage import get_connection, transaction
+
+# Database file name
+CACHE_DB = os.getenv("RESPONSE_CACHE_DB", "response_cache.db")
+
+# "sampled": identical requests reuse an earlier sampled draft
+# "deterministic": cacheable requests are generated greedily with a fixed seed, so a
+#                  cache hit is exactly what regenerating would produce
+# "off": never read or write the cache
+RESPONSE_CACHE_MODE = os.getenv("RESPONSE_CACHE_MODE", "sampled").lower()
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_SEED = int(os.getenv("RESPONSE_CACHE_SEED", "42"))
+
+
+def normalize_prompt(prompt):
+    """Collapses whitespace so re-submitted prompts map to the same key."""
+    return " ".join((prompt or "").split())
+
+
+def normalize_context(context):
+    """Drops empty values and trims strings so equivalent contexts compare equal."""
+    normalized = {}
+    for key, value in (context or {}).items():
+        if isinstance(value, str):
+            value = " ".join(value.split())
+        if value in (None, "", [], {}):
+            continue
+        normalized[key] = value
+    return normalized
+
+
+def make_cache_key(prompt, context, model_file, sampling_params):
+    """Hashes everything that influences the generated email."""
+    payload = json.dumps(
+        [normalize_prompt(prompt), normalize_context(context), model_file, sampling_params],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed cache of generated emails with TTL and LRU eviction."""
+
+    def __init__(self, db_path=CACHE_DB, mode=RESPONSE_CACHE_MODE, ttl=RESPONSE_CACHE_TTL,
+                 max_entries=RESPONSE_CACHE_MAX_ENTRIES, seed=RESPONSE_CACHE_SEED):
+        self.db_path = db_path
+        self.mode = mode
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.seed = seed
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._table_ready = False
+
+    @property
+    def enabled(self):
+        return self.mode in ("sampled", "deterministic")
+
+    def generation_overrides(self):
+        """Sampling overrides for requests that may be cached."""
+        if self.mode == "deterministic":
+            return {"temperature": 0.0, "seed": self.seed}
+        return {}
+
+    def _connect(self):
+        conn = get_connection(self.db_path)
+        if not self._table_ready:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                cache_key TEXT PRIMARY KEY,
+                response TEXT,
+                created_at REAL,
+                last_access REAL
+            )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+            conn.commit()
+            self._table_ready = True
+        return conn
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        """Returns the cached response for `key`, or None on a miss or expired entry."""
+        now = time.time()
+        conn = self._connect()
+        with sqlite_query_seconds.time(query="response_cache"):
+            row = conn.execute(
+                "SELECT response, created_at FROM responses WHERE cache_key = ?", (key,)
+            ).fetchone()
+        if row and now - row[1] <= self.ttl:
+            with transaction(self.db_path):
+                conn.execute("UPDATE responses SET last_access = ? WHERE cache_key = ?", (now, key))
+            self._count(hit=True)
+            return row[0]
+        if row:
+            with transaction(self.db_path):
+                conn.execute("DELETE FROM responses WHERE cache_key = ?", (key,))
+        self._count(hit=False)
+        return None
+
+    def put(self, key, response):
+        """Stores a response and evicts expired and least recently used entries."""
+        now = time.time()
+        conn = self._connect()
+        with transaction(self.db_path):
+            conn.execute("""
+            INSERT OR REPLACE INTO responses (cache_key, response, created_at, last_access)
+            VALUES (?, ?, ?, ?)
+            """, (key, response, now, now))
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            conn.execute("""
+            DELETE FROM responses WHERE cache_key IN (
+                SELECT cache_key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+            """, (self.max_entries,))
+
+    def clear(self):
+        conn = self._connect()
+        with transaction(self.db_path):
+            conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        """Hit/miss counters since process start."""
+        total = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
+
+
+response_cache = ResponseCache()
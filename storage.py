@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from itertools import islice
+
+# Seconds a writer waits for another connection's lock before failing
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+# Rows per executemany()/commit in bulk writes
+SQLITE_WRITE_BATCH = int(os.getenv("SQLITE_WRITE_BATCH", "500"))
+# NORMAL is durable across application crashes in WAL mode; FULL also survives power loss
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+# Page cache per connection (KiB)
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "16384"))
+
+_local = threading.local()
+
+
+def _open(db_path):
+    conn = sqlite3.connect(db_path, timeout=SQLITE_BUSY_TIMEOUT)
+    # WAL lets readers run alongside the writer and turns each commit into an append
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def get_connection(db_path):
+    """Returns this thread's long-lived connection to `db_path`, opening it on first use."""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+        _local.depth = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = connections[db_path] = _open(db_path)
+    return conn
+
+
+def close_connections():
+    """Closes every connection opened by the calling thread."""
+    for conn in getattr(_local, "connections", {}).values():
+        conn.close()
+    _local.connections = {}
+    _local.depth = {}
+
+
+@contextmanager
+def transaction(db_path):
+    """
+    Commits everything written inside the block at once (rolls back on error).
+
+    Blocks nest: only the outermost one commits, so a loop of single-row writes
+    wrapped in `with transaction(...)` costs one fsync instead of one per row.
+    """
+    conn = get_connection(db_path)
+    depth = _local.depth
+    depth[db_path] = depth.get(db_path, 0) + 1
+    try:
+        yield conn
+    except BaseException:
+        depth[db_path] -= 1
+        if not depth[db_path]:
+            conn.rollback()
+        raise
+    depth[db_path] -= 1
+    if not depth[db_path]:
+        conn.commit()
+
+
+def executemany_batched(db_path, sql, rows, batch_size=SQLITE_WRITE_BATCH):
+    """
+    Runs `sql` for every row of an iterable, one executemany() and commit per batch.
+
+    Returns:
+        int: Rows changed (ignored conflicts are not counted)
+    """
+    changed = 0
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return changed
+        with transaction(db_path) as conn:
+            changed += conn.executemany(sql, batch).rowcount
+
+
+class BatchWriter:
+    """
+    Buffers rows for one statement and writes them with executemany_batched().
+
+    For producers that emit rows one at a time; use as a context manager so the
+    last partial batch is flushed.
+    """
+
+    def __init__(self, db_path, sql, batch_size=SQLITE_WRITE_BATCH):
+        self.db_path = db_path
+        self.sql = sql
+        self.batch_size = batch_size
+        self.pending = []
+        self.written = 0
+
+    def add(self, row):
+        self.pending.append(row)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.written += executemany_batched(self.db_path, self.sql, self.pending, self.batch_size)
+            self.pending = []
+        return self.written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        return False
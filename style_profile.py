@@ -0,0 +1,290 @@
+import heapq
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from database import DB_NAME, ensure_schema, parse_address
+from storage import get_connection, transaction
+
+# Distinct trigrams the heavy-hitters sketch keeps (memory bound, independent of corpus size)
+STYLE_TRIGRAM_CAPACITY = int(os.getenv("STYLE_TRIGRAM_CAPACITY", "1000"))
+# Sent emails analyzed per transaction
+STYLE_BATCH_SIZE = int(os.getenv("STYLE_BATCH_SIZE", "200"))
+# Share of emails that must use emojis / bullets before the profile says so
+STYLE_FLAG_SHARE = float(os.getenv("STYLE_FLAG_SHARE", "0.2"))
+# Profiles built from fewer sent emails aren't used to personalize drafts
+STYLE_PROFILE_MIN_EMAILS = int(os.getenv("STYLE_PROFILE_MIN_EMAILS", "5"))
+# Seconds a cached profile is served before checking whether another process updated it
+STYLE_PROFILE_RECHECK = float(os.getenv("STYLE_PROFILE_RECHECK", "30"))
+
+_EMOJI = re.compile("[\U0001F300-\U0001FAFF\u2600-\u27BF]")
+_BULLET = re.compile(r"(?m)^\s*(?:[•*-]|\d+[.)])\s+")
+
+
+def default_owner():
+    """The address whose sent mail defines "my" style."""
+    return parse_address(os.getenv("USER_EMAIL") or os.getenv("EMAIL_USER"))
+
+
+class TrigramSketch:
+    """
+    Bounded heavy-hitters counter (Space-Saving, merged one email at a time).
+
+    Holds at most `capacity` trigrams. A trigram first seen once the sketch is full
+    starts at the smallest evicted count (`floor`), so counts may be overestimated
+    by at most their recorded error, and any trigram more frequent than the floor
+    is guaranteed to be present.
+    """
+
+    def __init__(self, capacity=STYLE_TRIGRAM_CAPACITY, counts=None, errors=None, floor=0):
+        self.capacity = capacity
+        self.counts = counts or {}
+        self.errors = errors or {}
+        self.floor = floor
+
+    def update(self, counter):
+        for item, count in counter.items():
+            if item in self.counts:
+                self.counts[item] += count
+            else:
+                self.counts[item] = self.floor + count
+                self.errors[item] = self.floor
+        if len(self.counts) > self.capacity:
+            keep = heapq.nlargest(self.capacity, self.counts.items(), key=lambda kv: kv[1])
+            kept = dict(keep)
+            self.floor = max(self.floor, max(c for item, c in self.counts.items() if item not in kept))
+            self.errors = {item: self.errors[item] for item in kept}
+            self.counts = kept
+
+    def most_common(self, n):
+        return heapq.nlargest(n, self.counts.items(), key=lambda kv: kv[1])
+
+    def to_json(self):
+        return json.dumps({
+            "floor": self.floor,
+            "items": {item: [count, self.errors[item]] for item, count in self.counts.items()},
+        })
+
+    @classmethod
+    def from_json(cls, text, capacity=STYLE_TRIGRAM_CAPACITY):
+        if not text:
+            return cls(capacity)
+        data = json.loads(text)
+        items = data.get("items", {})
+        return cls(capacity, {k: v[0] for k, v in items.items()}, {k: v[1] for k, v in items.items()},
+                   data.get("floor", 0))
+
+
+def email_style_stats(body):
+    """Statistics for one email body; returns (stats dict, trigram Counter)."""
+    from textblob import TextBlob
+
+    words = re.findall(r"\b\w+\b", body.lower())
+    sentences = [s for s in re.split(r"[.!?]", body) if s.strip()]
+    stats = {
+        "polarity": TextBlob(body).sentiment.polarity,
+        "words": len(words),
+        "sentences": len(sentences),
+        "has_emoji": int(bool(_EMOJI.search(body))),
+        "has_bullets": int(bool(_BULLET.search(body))),
+    }
+    trigrams = Counter(" ".join(words[i:i + 3]) for i in range(len(words) - 2))
+    return stats, trigrams
+
+
+class StyleAggregate:
+    """Running totals behind a style profile."""
+
+    def __init__(self, row=None):
+        row = row or {}
+        self.watermark = row.get("watermark") or 0
+        self.emails = row.get("emails") or 0
+        self.polarity_sum = row.get("polarity_sum") or 0.0
+        self.words = row.get("words") or 0
+        self.sentences = row.get("sentences") or 0
+        self.emoji_emails = row.get("emoji_emails") or 0
+        self.bullet_emails = row.get("bullet_emails") or 0
+        self.trigrams = TrigramSketch.from_json(row.get("trigrams"))
+        self.updated_at = row.get("updated_at")
+
+    def add(self, stats, trigrams):
+        self.emails += 1
+        # Word-weighted, like scoring all mail as one text
+        self.polarity_sum += stats["polarity"] * stats["words"]
+        self.words += stats["words"]
+        self.sentences += stats["sentences"]
+        self.emoji_emails += stats["has_emoji"]
+        self.bullet_emails += stats["has_bullets"]
+        self.trigrams.update(trigrams)
+
+    def summary(self):
+        """The profile in analyze_writing_style()'s format."""
+        sentiment = self.polarity_sum / self.words if self.words else 0.0
+        if sentiment > 0.3:
+            tone = "Positive & Friendly"
+        elif sentiment < -0.3:
+            tone = "Serious & Formal"
+        else:
+            tone = "Neutral & Professional"
+        return {
+            "tone": tone,
+            "avg_sentence_length": self.words / self.sentences if self.sentences else 0,
+            "common_phrases": [phrase for phrase, _ in self.trigrams.most_common(5)],
+            "uses_emojis": bool(self.emails) and self.emoji_emails / self.emails >= STYLE_FLAG_SHARE,
+            "uses_bullets": bool(self.emails) and self.bullet_emails / self.emails >= STYLE_FLAG_SHARE,
+            "emails_analyzed": self.emails,
+            "updated_at": self.updated_at,
+        }
+
+
+_PROFILE_COLUMNS = ("watermark", "emails", "polarity_sum", "words", "sentences", "emoji_emails",
+                    "bullet_emails", "trigrams", "updated_at")
+
+
+def _load_aggregate(conn, owner):
+    row = conn.execute(
+        f"SELECT {', '.join(_PROFILE_COLUMNS)} FROM style_profiles WHERE owner = ?", (owner,)
+    ).fetchone()
+    return StyleAggregate(dict(zip(_PROFILE_COLUMNS, row)) if row else None)
+
+
+def _save_aggregate(conn, owner, aggregate):
+    conn.execute(f"""
+    INSERT OR REPLACE INTO style_profiles (owner, {', '.join(_PROFILE_COLUMNS)})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (owner, aggregate.watermark, aggregate.emails, aggregate.polarity_sum, aggregate.words,
+          aggregate.sentences, aggregate.emoji_emails, aggregate.bullet_emails, aggregate.trigrams.to_json(),
+          aggregate.updated_at))
+
+
+def update_style_profile(owner=None, db_path=DB_NAME, batch_size=STYLE_BATCH_SIZE):
+    """
+    Folds sent mail newer than the profile's watermark into the stored profile.
+
+    Each email is analyzed once; its statistics go to `email_style_stats` and into the
+    running totals in the same transaction. The watermark stops before the first sent
+    email whose body hasn't been fetched yet, so it is picked up by a later run.
+
+    Returns:
+        dict: The updated profile summary (None if no owner address is configured)
+    """
+    owner = parse_address(owner) if owner else default_owner()
+    if not owner:
+        return None
+    ensure_schema(db_path)
+    conn = get_connection(db_path)
+    aggregate = _load_aggregate(conn, owner)
+
+    last_seen = aggregate.watermark
+    waiting_for_body = False
+    while True:
+        rows = conn.execute("""
+        SELECT e.id, e.body, s.email_id IS NOT NULL
+        FROM emails e LEFT JOIN email_style_stats s ON s.email_id = e.id
+        WHERE e.sender_address = ? AND e.id > ? AND e.label NOT IN ('Trash', 'Spam')
+        ORDER BY e.id
+        LIMIT ?
+        """, (owner, last_seen, batch_size)).fetchall()
+        if not rows:
+            break
+
+        with transaction(db_path):
+            for email_id, body, analyzed in rows:
+                last_seen = email_id
+                if body is None:
+                    waiting_for_body = True
+                    continue
+                if not analyzed and body != "No Body":
+                    stats, trigrams = email_style_stats(body)
+                    conn.execute("""
+                    INSERT INTO email_style_stats (email_id, polarity, words, sentences, has_emoji, has_bullets)
+                    VALUES (:email_id, :polarity, :words, :sentences, :has_emoji, :has_bullets)
+                    """, {"email_id": email_id, **stats})
+                    aggregate.add(stats, trigrams)
+                if not waiting_for_body:
+                    aggregate.watermark = email_id
+            aggregate.updated_at = time.time()
+            _save_aggregate(conn, owner, aggregate)
+
+    style_profile_cache.invalidate(owner)
+    return aggregate.summary()
+
+
+def load_style_profile(owner=None, db_path=DB_NAME):
+    """Returns the stored profile summary without analyzing anything (None if there is none)."""
+    owner = parse_address(owner) if owner else default_owner()
+    if not owner:
+        return None
+    ensure_schema(db_path)
+    aggregate = _load_aggregate(get_connection(db_path), owner)
+    return aggregate.summary() if aggregate.emails else None
+
+
+def prompt_profile(profile):
+    """The compact part of a profile that goes into generation prompts."""
+    return {
+        "tone": profile["tone"],
+        "avg_sentence_length": round(profile["avg_sentence_length"]),
+        "common_phrases": profile["common_phrases"][:3],
+        "uses_emojis": profile["uses_emojis"],
+        "uses_bullets": profile["uses_bullets"],
+    }
+
+
+class StyleProfileCache:
+    """
+    In-memory prompt profiles, so drafting never analyzes or scans mail.
+
+    update_style_profile() invalidates the entry in this process; profiles updated by
+    another process (e.g. a fetch_emails run) are noticed within STYLE_PROFILE_RECHECK
+    seconds through a primary-key lookup of their `updated_at`.
+    """
+
+    def __init__(self, db_path=DB_NAME, recheck=STYLE_PROFILE_RECHECK):
+        self.db_path = db_path
+        self.recheck = recheck
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, owner=None):
+        """Returns prompt_profile() for `owner` (default: this user), or None if there is none."""
+        owner = parse_address(owner) if owner else default_owner()
+        if not owner:
+            return None
+        now = time.monotonic()
+        entry = self._entries.get(owner)
+        if entry and now - entry["checked_at"] < self.recheck:
+            return entry["profile"]
+
+        try:
+            ensure_schema(self.db_path)
+            row = get_connection(self.db_path).execute(
+                "SELECT updated_at FROM style_profiles WHERE owner = ?", (owner,)
+            ).fetchone()
+            updated_at = row[0] if row else None
+            if entry and entry["updated_at"] == updated_at:
+                profile = entry["profile"]
+            else:
+                summary = load_style_profile(owner, self.db_path)
+                usable = summary and summary["emails_analyzed"] >= STYLE_PROFILE_MIN_EMAILS
+                profile = prompt_profile(summary) if usable else None
+        except sqlite3.Error:
+            # Personalization is optional; never fail a draft over it
+            return entry["profile"] if entry else None
+
+        with self._lock:
+            self._entries[owner] = {"profile": profile, "updated_at": updated_at, "checked_at": now}
+        return profile
+
+    def invalidate(self, owner=None):
+        with self._lock:
+            if owner is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(parse_address(owner), None)
+
+
+style_profile_cache = StyleProfileCache()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules live at the repository root; benchmarks/ holds the fake IMAP server
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
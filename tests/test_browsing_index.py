@@ -0,0 +1,52 @@
+import hashlib
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("faiss")
+
+from browsing_index import BrowsingIndexManager
+from storage import get_connection
+
+DIM = 16
+
+
+def fake_embed(titles):
+    vectors = np.zeros((len(titles), DIM), dtype="float32")
+    for row, title in enumerate(titles):
+        vectors[row, int(hashlib.md5(title.encode("utf-8")).hexdigest(), 16) % DIM] = 1.0
+    return vectors
+
+
+def make_manager(tmp_path):
+    manager = BrowsingIndexManager(db_path=str(tmp_path / "history.db"),
+                                   index_path=str(tmp_path / "history.index"), backend="flat")
+    manager._embed = fake_embed
+    return manager
+
+
+def test_deletes_are_removed_after_reload(tmp_path):
+    db_path = str(tmp_path / "history.db")
+    conn = get_connection(db_path)
+    conn.execute("CREATE TABLE history (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT UNIQUE, "
+                 "title TEXT, timestamp TEXT)")
+    conn.executemany("INSERT INTO history (url, title, timestamp) VALUES (?, ?, ?)",
+                     [(f"https://example.com/{i}", f"page {i}", "2024-01-01 00:00:00") for i in range(10)])
+    conn.commit()
+
+    assert make_manager(tmp_path).sync()["total"] == 10
+
+    conn.execute("DELETE FROM history WHERE id IN (2, 5, 7)")
+    conn.commit()
+
+    # A fresh manager (new process) only knows the surviving titles
+    manager = make_manager(tmp_path)
+    stats = manager.sync()
+    assert stats["removed"] == 3
+    assert manager.index.ntotal == 7
+    assert conn.execute("SELECT COUNT(*) FROM history_deleted").fetchone()[0] == 0
+
+    reloaded = make_manager(tmp_path)
+    reloaded.ensure_loaded()
+    assert reloaded.index.ntotal == 7
+    _, ids = reloaded.search(fake_embed(["page 5"]), 10)
+    assert not {2, 5, 7} & set(ids[0].tolist())
@@ -0,0 +1,127 @@
+import sqlite3
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("faiss")
+
+import chrome_history
+import extract_browsing_history
+from chrome_history import import_chrome_history, iter_visits, webkit_to_timestamp
+from storage import close_connections, get_connection
+
+# 2024-01-01 00:00:00 UTC as a WebKit timestamp, one hour apart per step
+BASE = (1_704_067_200 + 11_644_473_600) * 1_000_000
+HOUR = 3_600 * 1_000_000
+
+
+class RecordingIndex:
+    """Stands in for the FAISS index manager (no embedding model in tests)."""
+
+    def __init__(self):
+        self.added = []
+
+    def add(self, rows):
+        self.added.extend(rows)
+        return len(rows)
+
+    def save(self):
+        pass
+
+
+def make_history(path, urls, visits):
+    source = sqlite3.connect(path)
+    source.execute("CREATE TABLE urls (id INTEGER PRIMARY KEY, url TEXT, title TEXT, visit_count INTEGER, "
+                   "last_visit_time INTEGER)")
+    source.execute("CREATE TABLE visits (id INTEGER PRIMARY KEY, url INTEGER, visit_time INTEGER)")
+    source.executemany("INSERT INTO urls (id, url, title) VALUES (?, ?, ?)", urls)
+    source.executemany("INSERT INTO visits (id, url, visit_time) VALUES (?, ?, ?)", visits)
+    source.commit()
+    source.close()
+
+
+def add_visits(path, visits):
+    source = sqlite3.connect(path)
+    source.executemany("INSERT INTO visits (id, url, visit_time) VALUES (?, ?, ?)", visits)
+    source.commit()
+    source.close()
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    # browsing_history.db is opened relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    index = RecordingIndex()
+    monkeypatch.setattr(chrome_history, "get_index_manager", lambda: index)
+    monkeypatch.setattr(extract_browsing_history, "get_index_manager", lambda: index)
+    path = str(tmp_path / "History")
+    make_history(path, [
+        (1, "https://example.com/python", "Python tutorial"),
+        (2, "https://example.com/react", "React docs"),
+        (3, "chrome://settings", "Settings"),
+        (4, "https://example.com/rust", "Rust book"),
+    ], [
+        (1, 1, BASE),
+        (2, 2, BASE + HOUR),
+        (3, 3, BASE + 2 * HOUR),
+        (4, 1, BASE + 3 * HOUR),  # Second visit to a URL stored by an earlier chunk
+        (5, 4, BASE + 4 * HOUR),
+    ])
+    yield path
+    # Connections are cached by the relative path, which the next test points elsewhere
+    close_connections()
+
+
+def stored(url):
+    return get_connection(extract_browsing_history.DB_NAME).execute(
+        "SELECT title, timestamp FROM history WHERE url = ?", (url,)).fetchone()
+
+
+def test_keyset_pagination(history):
+    chunks = list(iter_visits(history, batch_size=2))
+    assert [[visit[0] for visit in chunk] for chunk in chunks] == [[1, 2], [3, 4], [5]]
+    assert [visit[0] for chunk in iter_visits(history, after_visit_id=3, batch_size=2) for visit in chunk] == [4, 5]
+
+
+def test_import_resumes_from_watermark(history):
+    stats = import_chrome_history(history, batch_size=2)
+    assert stats == {"visits": 5, "added": 3, "last_visit_id": 5}
+    assert stored("chrome://settings") is None
+    # The later visit in another chunk moved the timestamp forward
+    assert stored("https://example.com/python") == ("Python tutorial", webkit_to_timestamp(BASE + 3 * HOUR))
+
+    assert import_chrome_history(history, batch_size=2) == {"visits": 0, "added": 0, "last_visit_id": 5}
+
+    add_visits(history, [(6, 2, BASE + 5 * HOUR)])
+    assert import_chrome_history(history, batch_size=2) == {"visits": 1, "added": 0, "last_visit_id": 6}
+    assert stored("https://example.com/react") == ("React docs", webkit_to_timestamp(BASE + 5 * HOUR))
+    assert get_connection(extract_browsing_history.DB_NAME).execute(
+        "SELECT COUNT(*) FROM history").fetchone()[0] == 3
+
+
+def test_older_visit_keeps_newest_timestamp(history):
+    import_chrome_history(history, batch_size=10)
+    # A visit with a higher id but an older time (e.g. synced from another device)
+    add_visits(history, [(6, 4, BASE)])
+    import_chrome_history(history, batch_size=10)
+    assert stored("https://example.com/rust")[1] == webkit_to_timestamp(BASE + 4 * HOUR)
+
+
+def test_newest_visit_wins_within_a_chunk(history):
+    # Both visits land in the first chunk; the older one has the higher id
+    add_visits(history, [(6, 4, BASE + 6 * HOUR), (7, 4, BASE + HOUR)])
+    import_chrome_history(history, batch_size=10)
+    assert stored("https://example.com/rust")[1] == webkit_to_timestamp(BASE + 6 * HOUR)
+
+
+def test_rolled_back_chunk_is_not_indexed(history, monkeypatch):
+    store = chrome_history.store_browsing_batch
+
+    def failing_store(rows):
+        store(rows)
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(chrome_history, "store_browsing_batch", failing_store)
+    with pytest.raises(sqlite3.OperationalError):
+        import_chrome_history(history, batch_size=10)
+    assert stored("https://example.com/python") is None
+    assert chrome_history.get_index_manager().added == []
@@ -0,0 +1,56 @@
+import os
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import embedding_service as service_module
+from embedding_service import EmbeddingService
+
+
+class CountingEncoder:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=True):
+        self.encoded.extend(texts)
+        vectors = np.ones((len(texts), 4), dtype="float32")
+        vectors[:, 0] = [len(text) for text in texts]
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    encoder = CountingEncoder()
+    monkeypatch.setattr(service_module.registry, "get", lambda name: encoder)
+    monkeypatch.setattr(service_module, "EMBEDDING_QUERY_CACHE_SIZE", 2)
+    service = EmbeddingService(db_path=str(tmp_path / "embeddings.db"))
+    service.encoder = encoder
+    return service
+
+
+def stored_rows(service):
+    if not os.path.exists(service.db_path):
+        return 0
+    return service._connect().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+def test_queries_stay_out_of_sqlite(service):
+    service.embed("first query")
+    service.embed_queries(["second query", "first query"])
+    assert stored_rows(service) == 0
+    assert service.encoder.encoded == ["first query", "second query"]
+    assert (service.cache_hits, service.cache_misses) == (1, 2)
+
+
+def test_query_cache_is_bounded(service):
+    service.embed_queries(["a", "bb", "ccc"])
+    assert service.stats()["query_cache_size"] == 2
+    service.embed_queries(["a"])  # Evicted as least recently used
+    assert service.encoder.encoded == ["a", "bb", "ccc", "a"]
+
+
+def test_corpus_embeddings_are_persisted(service):
+    service.embed_many(["title one", "title two"])
+    assert stored_rows(service) == 2
+    service.embed_many(["title one"])
+    assert service.encoder.encoded == ["title one", "title two"]
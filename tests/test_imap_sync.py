@@ -0,0 +1,112 @@
+import imaplib
+import pytest
+
+from fake_imap_server import FakeImapServer, synthetic_mailboxes
+from imap_sync import ImapSyncEngine
+from storage import get_connection, transaction
+
+ACCOUNT = "me@example.com"
+
+
+@pytest.fixture
+def server():
+    server = FakeImapServer(synthetic_mailboxes(60, owner=ACCOUNT, attachment_kb=4)).start()
+    yield server
+    server.stop()
+
+
+def connector(server, fail_on_fetch=None):
+    """Logged-in imaplib connections; `fail_on_fetch` makes the Nth UID FETCH drop the connection."""
+    fetches = [0]
+
+    def connect():
+        imap = imaplib.IMAP4("127.0.0.1", server.port)
+        imap.login(ACCOUNT, "secret")
+        uid = imap.uid
+
+        def failing_uid(command, *args):
+            if command == "FETCH":
+                fetches[0] += 1
+                if fetches[0] == fail_on_fetch:
+                    raise imaplib.IMAP4.abort("connection lost")
+            return uid(command, *args)
+
+        imap.uid = failing_uid
+        return imap
+
+    return connect
+
+
+def folder_state(db_path, folder):
+    conn = get_connection(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM emails WHERE account = ? AND folder = ?",
+                         (ACCOUNT, folder)).fetchone()[0]
+    state = conn.execute("SELECT uidvalidity, last_uid FROM sync_state WHERE account = ? AND folder = ?",
+                         (ACCOUNT, folder)).fetchone()
+    return count, tuple(state) if state else None
+
+
+def make_engine(server, db_path, **kwargs):
+    return ImapSyncEngine(connector(server, kwargs.pop("fail_on_fetch", None)), ACCOUNT, db_path=db_path,
+                          folders=["INBOX"], batch_size=10, **kwargs)
+
+
+def test_watermark_only_fetches_new_uids(server, tmp_path):
+    db_path = str(tmp_path / "emails.db")
+    inbox = server.mailboxes["INBOX"]
+    total = len(inbox.messages)
+
+    stats = make_engine(server, db_path).sync()
+    assert stats["INBOX"]["headers"] == total
+    assert stats["INBOX"]["bodies"] == total
+    assert folder_state(db_path, "INBOX") == (total, (1, total))
+
+    assert make_engine(server, db_path).sync()["INBOX"] == {"headers": 0, "bodies": 0}
+
+    inbox.append(synthetic_mailboxes(3, owner=ACCOUNT, sent_share=0, seed=1)["INBOX"])
+    assert make_engine(server, db_path).sync()["INBOX"]["headers"] == 3
+    assert folder_state(db_path, "INBOX") == (total + 3, (1, total + 3))
+
+
+def test_uidvalidity_change_resets_folder(server, tmp_path):
+    db_path = str(tmp_path / "emails.db")
+    inbox = server.mailboxes["INBOX"]
+    make_engine(server, db_path).sync(fetch_bodies=False)
+
+    # The server renumbered the mailbox: keep only the first five messages under a new UIDVALIDITY
+    inbox.uidvalidity = 2
+    raws = [message.raw for message in inbox.messages[:5]]
+    inbox.messages, inbox.by_uid = [], {}
+    inbox.append(raws)
+
+    assert make_engine(server, db_path).sync(fetch_bodies=False)["INBOX"]["headers"] == 5
+    assert folder_state(db_path, "INBOX") == (5, (2, 5))
+
+
+def test_resumes_after_interrupted_batch(server, tmp_path):
+    db_path = str(tmp_path / "emails.db")
+    total = len(server.mailboxes["INBOX"].messages)
+
+    # The third header batch fails: the first two batches and their watermark are kept
+    with pytest.raises(imaplib.IMAP4.abort):
+        make_engine(server, db_path, fail_on_fetch=3).sync()
+    uids = [message.uid for message in server.mailboxes["INBOX"].messages]
+    assert folder_state(db_path, "INBOX") == (20, (1, uids[19]))
+
+    stats = make_engine(server, db_path).sync()
+    assert stats["INBOX"]["headers"] == total - 20
+    assert stats["INBOX"]["bodies"] == total
+    assert folder_state(db_path, "INBOX") == (total, (1, total))
+    duplicates = get_connection(db_path).execute(
+        "SELECT COUNT(*) - COUNT(DISTINCT uid) FROM emails WHERE folder = 'INBOX'").fetchone()[0]
+    assert duplicates == 0
+
+
+def test_sync_inside_callers_transaction_keeps_their_writes(server, tmp_path):
+    db_path = str(tmp_path / "emails.db")
+    make_engine(server, db_path).sync()
+    with transaction(db_path) as conn:
+        conn.execute("CREATE TABLE caller_work (id INTEGER)")
+        conn.execute("INSERT INTO caller_work VALUES (1)")
+        make_engine(server, db_path).sync()
+    assert get_connection(db_path).execute("SELECT COUNT(*) FROM caller_work").fetchone()[0] == 1
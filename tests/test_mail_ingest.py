@@ -0,0 +1,63 @@
+import threading
+import time
+import pytest
+
+pytest.importorskip("dotenv")
+
+from mail_ingest import ImapConnectionPool
+
+
+class Connection:
+    def __init__(self, number):
+        self.number = number
+
+    def logout(self):
+        pass
+
+
+def test_waiter_reconnects_when_a_connection_is_dropped():
+    opened = []
+
+    def connect():
+        opened.append(Connection(len(opened) + 1))
+        return opened[-1]
+
+    pool = ImapConnectionPool(connect, size=1)
+    holding = threading.Event()
+    got = []
+
+    def waiter():
+        holding.wait()
+        with pool.checkout() as conn:
+            got.append(conn.number)
+
+    thread = threading.Thread(target=waiter, daemon=True)
+    thread.start()
+    with pytest.raises(RuntimeError):
+        with pool.checkout():
+            holding.set()
+            # Let the waiter block on the full pool before the connection breaks
+            time.sleep(0.2)
+            raise RuntimeError("connection lost")
+
+    thread.join(5)
+    assert not thread.is_alive(), "waiter never woke up after the connection was dropped"
+    assert got == [2]
+    pool.close()
+
+
+def test_connect_failure_frees_the_slot():
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("refused")
+        return Connection(len(attempts))
+
+    pool = ImapConnectionPool(connect, size=1)
+    with pytest.raises(OSError):
+        with pool.checkout():
+            pass
+    with pool.checkout() as conn:
+        assert conn.number == 2
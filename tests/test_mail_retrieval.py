@@ -0,0 +1,22 @@
+from mail_retrieval import clean_body
+
+
+def test_keeps_lines_that_only_look_like_attributions():
+    body = ("Hi Tom,\nOn Friday the team will ship the release.\nAnna wrote: the numbers look fine.\n"
+            "Let me know if anything is missing.")
+    assert clean_body(body) == ("Hi Tom, On Friday the team will ship the release. Anna wrote: the numbers "
+                                "look fine. Let me know if anything is missing.")
+
+
+def test_cuts_gmail_style_quote():
+    body = "Sounds good, see you then.\n\nOn Mon, 3 Jun 2024 at 10:02, Anna <anna@example.com> wrote:\n> Dinner?\n"
+    assert clean_body(body) == "Sounds good, see you then."
+
+
+def test_cuts_outlook_style_quote():
+    assert clean_body("Approved.\n-----Original Message-----\nFrom: Anna\nBudget attached") == "Approved."
+    assert clean_body("Approved.\n\nFrom: Anna Berg\nSent: Monday, June 3, 2024\nTo: me\n\nBudget") == "Approved."
+
+
+def test_drops_signature_and_quoted_lines():
+    assert clean_body("Thanks!\n> earlier text\nSee below.\n-- \nTom\nACME Corp") == "Thanks! See below."
@@ -0,0 +1,83 @@
+import base64
+import tracemalloc
+
+from mime_stream import StreamingBodyExtractor, extract_body
+
+
+def message(content_type, body, headers=""):
+    return f"From: a@example.com\r\nSubject: test\r\n{headers}Content-Type: {content_type}\r\n\r\n".encode() + body
+
+
+def large_attachment_chunks(attachment_bytes):
+    """A text part plus a base64 attachment, produced in chunks (never built in memory)."""
+    yield (b"From: a@example.com\r\nContent-Type: multipart/mixed; boundary=\"outer\"\r\n\r\n"
+           b"--outer\r\nContent-Type: text/plain; charset=utf-8\r\n\r\nSee the attached report.\r\n"
+           b"--outer\r\nContent-Type: application/pdf\r\nContent-Transfer-Encoding: base64\r\n"
+           b"Content-Disposition: attachment; filename=\"report.pdf\"\r\n\r\n")
+    line = base64.b64encode(bytes(range(57))) + b"\r\n"  # 76 characters, as MIME wraps them
+    lines_per_chunk = 1000
+    for _ in range(attachment_bytes // (57 * lines_per_chunk)):
+        yield line * lines_per_chunk
+    yield b"--outer--\r\n"
+
+
+def test_large_base64_attachment_is_skipped_in_flat_memory():
+    tracemalloc.start()
+    try:
+        extractor = StreamingBodyExtractor()
+        for chunk in large_attachment_chunks(20 * 1024 * 1024):
+            extractor.feed(chunk)
+        body = extractor.close()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert body == "See the attached report.\r\n"
+    assert extractor.skipped_bytes > 20 * 1024 * 1024
+    # A chunk is ~78 KB; nothing close to the 27 MB encoded attachment is ever held
+    assert peak < 2 * 1024 * 1024
+
+
+def test_nested_multipart_prefers_plain_text():
+    raw = message("multipart/mixed; boundary=\"outer\"", (
+        b"--outer\r\nContent-Type: multipart/alternative; boundary=\"inner\"\r\n\r\n"
+        b"--inner\r\nContent-Type: text/html; charset=utf-8\r\n\r\n<p>HTML <b>version</b></p>\r\n"
+        b"--inner\r\nContent-Type: text/plain; charset=utf-8\r\n\r\nPlain version\r\n"
+        b"--inner--\r\n"
+        b"--outer\r\nContent-Type: message/rfc822\r\n\r\n"
+        b"Content-Type: text/plain\r\n\r\nForwarded text must not win\r\n"
+        b"--outer--\r\n"
+    ))
+    assert extract_body(raw, chunk_size=7) == "Plain version\r\n"
+
+
+def test_html_only_is_converted():
+    raw = message("multipart/alternative; boundary=\"b\"", (
+        b"--b\r\nContent-Type: text/html\r\n\r\n<html><head><title>x</title></head>"
+        b"<body><p>Hello&nbsp;there</p><ul><li>one</li></ul></body></html>\r\n--b--\r\n"
+    ))
+    # Title dropped, &nbsp; unescaped and collapsed like any other space, list items bulleted
+    assert extract_body(raw) == "Hello there\n\n• one"
+
+
+def test_aliased_and_unknown_charsets():
+    chinese = "你好，预算已批准".encode("gb18030")
+    assert extract_body(message("text/plain; charset=gb2312", chinese)) == "你好，预算已批准"
+    # "us-ascii" mail with Windows-1252 bytes (smart quotes)
+    assert extract_body(message("text/plain; charset=us-ascii", b"\x93Quoted\x94")) == "“Quoted”"
+    # Unknown charsets fall back to UTF-8, replacing invalid bytes
+    assert extract_body(message("text/plain; charset=x-bogus", "café".encode() + b"\xff")) == "café�"
+
+
+def test_text_part_is_truncated_at_the_cap():
+    text = ("word " * 1000).encode()
+    assert extract_body(message("text/plain", text), max_part_bytes=100) == text[:100].decode()
+
+    # A cap that cuts a base64 quantum still decodes the complete quanta before it
+    encoded = base64.encodebytes(text)
+    body = extract_body(message("text/plain", encoded, "Content-Transfer-Encoding: base64\r\n"), max_part_bytes=102)
+    assert text.decode().startswith(body) and 70 <= len(body) <= 75
+
+    extractor = StreamingBodyExtractor(max_part_bytes=100)
+    extractor.feed(message("text/plain", text))
+    extractor.close()
+    assert extractor.skipped_bytes == len(text) - 100
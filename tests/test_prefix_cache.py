@@ -0,0 +1,68 @@
+import sys
+import types
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from prefix_cache import read_state, write_state
+
+
+class StubLlamaState:
+    """Same constructor as llama_cpp.LlamaState (0.3.x), for machines without llama-cpp-python."""
+
+    def __init__(self, input_ids, scores, n_tokens, llama_state, llama_state_size, seed):
+        self.input_ids = input_ids
+        self.scores = scores
+        self.n_tokens = n_tokens
+        self.llama_state = llama_state
+        self.llama_state_size = llama_state_size
+        self.seed = seed
+
+
+@pytest.fixture
+def LlamaState(monkeypatch):
+    try:
+        from llama_cpp import LlamaState
+    except ImportError:
+        monkeypatch.setitem(sys.modules, "llama_cpp", types.SimpleNamespace(LlamaState=StubLlamaState))
+        LlamaState = StubLlamaState
+    return LlamaState
+
+
+def make_state(LlamaState):
+    return LlamaState(
+        input_ids=np.arange(8, dtype=np.intc),
+        scores=np.linspace(0, 1, 8 * 3, dtype=np.single).reshape(8, 3),
+        n_tokens=5,
+        llama_state=bytes(range(40)),
+        llama_state_size=40,
+        seed=1234,
+    )
+
+
+def test_state_round_trip(tmp_path, LlamaState):
+    path = str(tmp_path / "prefix.state")
+    state = make_state(LlamaState)
+    write_state(path, state, "abc")
+
+    loaded = read_state(path, "abc")
+    assert isinstance(loaded, LlamaState)
+    assert np.array_equal(loaded.input_ids, state.input_ids)
+    assert np.array_equal(loaded.scores, state.scores)
+    assert (loaded.n_tokens, bytes(loaded.llama_state), loaded.llama_state_size, loaded.seed) == (
+        5, bytes(range(40)), 40, 1234)
+
+
+def test_state_from_another_model_is_rejected(tmp_path, LlamaState):
+    path = str(tmp_path / "prefix.state")
+    write_state(path, make_state(LlamaState), "abc")
+    with pytest.raises(ValueError):
+        read_state(path, "other")
+
+
+def test_truncated_state_is_rejected(tmp_path, LlamaState):
+    path = tmp_path / "prefix.state"
+    write_state(str(path), make_state(LlamaState), "abc")
+    path.write_bytes(path.read_bytes()[:-1])
+    with pytest.raises(ValueError):
+        read_state(str(path), "abc")
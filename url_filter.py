@@ -0,0 +1,125 @@
+import json
+import os
+from urllib.parse import urlsplit
+
+# JSON config: {"deny": [...], "allow": [...], "deny_files": [...], "allow_files": [...]}
+URL_FILTER_CONFIG = os.getenv("URL_FILTER_CONFIG", "url_filter.json")
+
+# Trie key holding the path prefixes of rules that end at a node ("" = whole host)
+_END = "$"
+
+
+def parse_rule(rule):
+    """Splits "example.com/path" into ("example.com", "/path"); a leading "*." is ignored."""
+    rule = rule.strip().lower()
+    if "://" in rule:
+        rule = rule.split("://", 1)[1]
+    host, slash, path = rule.partition("/")
+    host = host.split(":", 1)[0].strip(".")
+    if host.startswith("*."):
+        host = host[2:]
+    return host, (slash + path).rstrip("/") if path else ""
+
+
+def _path_prefixes(path):
+    """"/a/b/c" → ["/a", "/a/b", "/a/b/c"]: the segment-boundary prefixes rules can match."""
+    prefixes = []
+    end = path.find("/", 1)
+    while end != -1:
+        prefixes.append(path[:end])
+        end = path.find("/", end + 1)
+    if path not in ("", "/"):
+        prefixes.append(path.rstrip("/"))
+    return prefixes
+
+
+class RuleTrie:
+    """
+    Host-suffix and path-prefix rules in a trie keyed by reversed host labels.
+
+    "facebook.com" matches facebook.com and any subdomain (not notfacebook.com);
+    "google.com/search" matches that host's /search and /search/... paths. A lookup
+    walks one trie node per host label and one set probe per path segment, so its
+    cost depends on the URL's length, not on the number of rules.
+    """
+
+    def __init__(self, rules=()):
+        self.root = {}
+        self.size = 0
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule):
+        host, path = parse_rule(rule)
+        if not host:
+            return
+        node = self.root
+        for label in reversed(host.split(".")):
+            node = node.setdefault(label, {})
+        node.setdefault(_END, set()).add(path)
+        self.size += 1
+
+    def matches(self, host, path):
+        path_prefixes = None
+        node = self.root
+        for label in reversed(host.split(".")):
+            node = node.get(label)
+            if node is None:
+                return False
+            prefixes = node.get(_END)
+            if prefixes:
+                if "" in prefixes:
+                    return True
+                if path_prefixes is None:
+                    path_prefixes = _path_prefixes(path)
+                if any(prefix in prefixes for prefix in path_prefixes):
+                    return True
+        return False
+
+
+def _read_rule_file(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+class UrlFilter:
+    """Deny rules with allow-rule exceptions (an allow match always wins)."""
+
+    def __init__(self, deny=(), allow=()):
+        self.deny = RuleTrie(deny)
+        self.allow = RuleTrie(allow)
+
+    @classmethod
+    def from_config(cls, default_deny=(), path=URL_FILTER_CONFIG):
+        """Default deny rules plus the lists (and rule files) named in the JSON config."""
+        deny, allow = list(default_deny), []
+        if path and os.path.exists(path):
+            with open(path) as f:
+                config = json.load(f)
+            base = os.path.dirname(os.path.abspath(path))
+            deny += config.get("deny", [])
+            allow += config.get("allow", [])
+            for name in config.get("deny_files", []):
+                deny += _read_rule_file(os.path.join(base, name))
+            for name in config.get("allow_files", []):
+                allow += _read_rule_file(os.path.join(base, name))
+        return cls(deny, allow)
+
+    def is_blocked(self, url):
+        try:
+            parts = urlsplit(url)
+            host = (parts.hostname or "").rstrip(".")
+        except ValueError:
+            return True  # Unparseable URLs are never worth storing
+        if not host:
+            return False
+        path = parts.path.lower()
+        return self.deny.matches(host, path) and not self.allow.matches(host, path)
+
+    def blocked_mask(self, urls):
+        """One bool per URL (True = drop), for filtering whole batches."""
+        return [self.is_blocked(url) for url in urls]
+
+    def filter(self, urls):
+        """The URLs that pass the filter, in order."""
+        return [url for url in urls if not self.is_blocked(url)]